@@ -0,0 +1,209 @@
+-- Migration 033: Materialized Cleaning Frequency Surcharge Matrix
+-- Purpose: Precompute the interval × paint_condition surcharge matrix so the
+--          Estimator fetches one versioned snapshot instead of joining and
+--          evaluating formulas + overrides on every quote
+-- Date: 2025-11-15
+-- Depends on: 027_add_cleaning_frequency_config.sql
+
+BEGIN;
+
+-- ============================================================================
+-- Table 1: Matrix versions (one row per rebuild that changed the matrix)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS cleaning_frequency_matrix_versions (
+    version BIGSERIAL PRIMARY KEY,
+    etag TEXT NOT NULL, -- md5 of the surcharge payload, used as cache validator
+    snapshot JSONB NOT NULL, -- Full matrix as served to clients
+    source_table TEXT, -- Table whose change triggered the rebuild
+    built_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_cleaning_matrix_versions_etag
+    ON cleaning_frequency_matrix_versions(etag);
+
+-- ============================================================================
+-- Table 2: Current matrix (flat rows for SQL consumers)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS cleaning_frequency_surcharge_matrix (
+    interval_key TEXT NOT NULL,
+    paint_condition TEXT NOT NULL,
+    min_months INTEGER NOT NULL,
+    max_months INTEGER,
+    display_label TEXT NOT NULL,
+    sort_order INTEGER NOT NULL,
+    surcharge_percentage NUMERIC(6,2) NOT NULL,
+    source TEXT NOT NULL, -- 'override' | 'formula'
+    version BIGINT NOT NULL REFERENCES cleaning_frequency_matrix_versions(version),
+    PRIMARY KEY (interval_key, paint_condition)
+);
+
+-- ============================================================================
+-- Rebuild function
+-- Evaluates cleaning_frequency_surcharges (formula capped at max_rate, then
+-- overrides) once and stores the result. A new version is only minted when
+-- the computed matrix actually differs from the latest one.
+-- ============================================================================
+CREATE OR REPLACE FUNCTION rebuild_cleaning_frequency_matrix(p_source_table TEXT DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    v_surcharges JSONB;
+    v_intervals JSONB;
+    v_etag TEXT;
+    v_latest_version BIGINT;
+    v_latest_etag TEXT;
+    v_version BIGINT;
+BEGIN
+    -- Serialize concurrent rebuilds (e.g. two staff saves at once)
+    PERFORM pg_advisory_xact_lock(hashtext('rebuild_cleaning_frequency_matrix'));
+
+    SELECT
+        COALESCE(jsonb_agg(jsonb_build_object(
+            'interval_key', interval_key,
+            'paint_condition', paint_condition,
+            'surcharge_percentage', surcharge_percentage,
+            'source', source
+        ) ORDER BY sort_order, paint_condition), '[]'::jsonb)
+    INTO v_surcharges
+    FROM cleaning_frequency_surcharges;
+
+    SELECT
+        COALESCE(jsonb_agg(jsonb_build_object(
+            'interval_key', interval_key,
+            'min_months', min_months,
+            'max_months', max_months,
+            'display_label', display_label,
+            'sort_order', sort_order
+        ) ORDER BY sort_order), '[]'::jsonb)
+    INTO v_intervals
+    FROM cleaning_time_intervals
+    WHERE is_active = true;
+
+    v_etag := md5(v_intervals::text || v_surcharges::text);
+
+    SELECT version, etag
+    INTO v_latest_version, v_latest_etag
+    FROM cleaning_frequency_matrix_versions
+    ORDER BY version DESC
+    LIMIT 1;
+
+    -- No effective change (e.g. an override re-saved with the same value)
+    IF v_latest_etag = v_etag THEN
+        RETURN v_latest_version;
+    END IF;
+
+    INSERT INTO cleaning_frequency_matrix_versions (etag, snapshot, source_table)
+    VALUES (v_etag, '{}'::jsonb, p_source_table)
+    RETURNING version INTO v_version;
+
+    UPDATE cleaning_frequency_matrix_versions
+    SET snapshot = jsonb_build_object(
+        'version', v_version,
+        'etag', v_etag,
+        'built_at', built_at,
+        'intervals', v_intervals,
+        'surcharges', v_surcharges
+    )
+    WHERE version = v_version;
+
+    DELETE FROM cleaning_frequency_surcharge_matrix;
+
+    INSERT INTO cleaning_frequency_surcharge_matrix (
+        interval_key, paint_condition, min_months, max_months, display_label,
+        sort_order, surcharge_percentage, source, version
+    )
+    SELECT
+        interval_key, paint_condition, min_months, max_months, display_label,
+        sort_order, surcharge_percentage, source, v_version
+    FROM cleaning_frequency_surcharges;
+
+    RETURN v_version;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION rebuild_cleaning_frequency_matrix IS 'Recomputes the cleaning frequency surcharge matrix; mints a new version only when the result changes';
+
+-- Mints matrix versions under an advisory lock: triggers (run as owner) and service_role only
+REVOKE EXECUTE ON FUNCTION rebuild_cleaning_frequency_matrix(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_cleaning_frequency_matrix(TEXT) TO service_role;
+
+-- ============================================================================
+-- Change-driven invalidation
+-- Statement-level triggers so a bulk edit of all 28 overrides rebuilds once
+-- ============================================================================
+CREATE OR REPLACE FUNCTION trigger_rebuild_cleaning_frequency_matrix()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM rebuild_cleaning_frequency_matrix(TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION trigger_rebuild_cleaning_frequency_matrix() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION trigger_rebuild_cleaning_frequency_matrix() TO service_role;
+
+DROP TRIGGER IF EXISTS rebuild_matrix_on_intervals_change ON cleaning_time_intervals;
+CREATE TRIGGER rebuild_matrix_on_intervals_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON cleaning_time_intervals
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_rebuild_cleaning_frequency_matrix();
+
+DROP TRIGGER IF EXISTS rebuild_matrix_on_formulas_change ON cleaning_frequency_formulas;
+CREATE TRIGGER rebuild_matrix_on_formulas_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON cleaning_frequency_formulas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_rebuild_cleaning_frequency_matrix();
+
+DROP TRIGGER IF EXISTS rebuild_matrix_on_overrides_change ON cleaning_frequency_overrides;
+CREATE TRIGGER rebuild_matrix_on_overrides_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON cleaning_frequency_overrides
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_rebuild_cleaning_frequency_matrix();
+
+-- ============================================================================
+-- Client RPC: fetch the current snapshot
+-- Pass the version the client already holds; if it is still current only
+-- {version, etag, unchanged: true} is returned.
+-- ============================================================================
+CREATE OR REPLACE FUNCTION get_cleaning_frequency_matrix(p_known_version BIGINT DEFAULT NULL)
+RETURNS JSONB AS $$
+    SELECT CASE
+        WHEN p_known_version IS NOT NULL AND p_known_version = v.version THEN
+            jsonb_build_object('version', v.version, 'etag', v.etag, 'unchanged', true)
+        ELSE
+            v.snapshot
+    END
+    FROM cleaning_frequency_matrix_versions v
+    ORDER BY v.version DESC
+    LIMIT 1;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION get_cleaning_frequency_matrix IS 'Returns the latest versioned cleaning frequency surcharge matrix snapshot (or unchanged marker)';
+
+-- ============================================================================
+-- RLS and grants (public read, writes only through rebuild function)
+-- ============================================================================
+ALTER TABLE cleaning_frequency_matrix_versions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cleaning_frequency_surcharge_matrix ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow public read of cleaning matrix versions"
+    ON cleaning_frequency_matrix_versions FOR SELECT
+    USING (true);
+
+CREATE POLICY "Allow public read of cleaning surcharge matrix"
+    ON cleaning_frequency_surcharge_matrix FOR SELECT
+    USING (true);
+
+GRANT SELECT ON cleaning_frequency_matrix_versions TO anon, authenticated;
+GRANT SELECT ON cleaning_frequency_surcharge_matrix TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_cleaning_frequency_matrix(BIGINT) TO anon, authenticated;
+
+-- Initial build
+SELECT rebuild_cleaning_frequency_matrix('migration_033');
+
+COMMENT ON TABLE cleaning_frequency_matrix_versions IS 'Versioned snapshots of the cleaning frequency surcharge matrix, rebuilt when intervals, formulas or overrides change';
+COMMENT ON TABLE cleaning_frequency_surcharge_matrix IS 'Materialized interval × paint_condition surcharge percentages (current version)';
+
+COMMIT;
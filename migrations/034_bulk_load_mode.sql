@@ -0,0 +1,267 @@
+-- Migration 034: Deferred-Trigger Bulk Load Mode
+-- Purpose: Let large service_logs / service_orders imports skip the per-row
+--          triggers and apply their effects set-based afterwards
+-- Date: 2025-11-15
+-- Depends on: 023_time_tracking_metrics_views.sql (auto_calculate_total_hours)
+--             032_boat_status_automation_triggers.sql (trigger_auto_activate_boat)
+--
+-- Usage:
+--   1. COPY rows into service_logs_staging / service_orders_staging
+--   2. SELECT bulk_load_service_logs();   -- or bulk_load_service_orders()
+--
+-- Both functions run inside the caller's transaction between
+-- begin_bulk_load() and end_bulk_load(), which the row triggers below check
+-- in their WHEN clause, so the trigger functions are never invoked.
+-- The sailorskills.bulk_load setting alone is not enough: any session can
+-- set a custom GUC, so the transaction must also be registered in
+-- bulk_load_transactions, which only begin_bulk_load() (service_role /
+-- owner) writes.
+
+BEGIN;
+
+-- ============================================================================
+-- Staging tables (unlogged, same shape as targets)
+-- Re-create after adding columns to service_logs / service_orders:
+--   DROP TABLE service_logs_staging; then rerun this section
+-- ============================================================================
+CREATE UNLOGGED TABLE IF NOT EXISTS service_logs_staging
+    (LIKE service_logs INCLUDING DEFAULTS);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS service_orders_staging
+    (LIKE service_orders INCLUDING DEFAULTS);
+
+COMMENT ON TABLE service_logs_staging IS 'Bulk load staging for service_logs - see bulk_load_service_logs()';
+COMMENT ON TABLE service_orders_staging IS 'Bulk load staging for service_orders - see bulk_load_service_orders()';
+
+-- Import-only: no API access (RLS on with no policies; service_role bypasses)
+ALTER TABLE service_logs_staging ENABLE ROW LEVEL SECURITY;
+ALTER TABLE service_orders_staging ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON service_logs_staging, service_orders_staging FROM PUBLIC, anon, authenticated;
+
+-- ============================================================================
+-- Bulk load mode, registered per transaction
+-- Rows are never visible outside the loader's transaction (inserted and
+-- deleted inside it, or rolled back with it)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS bulk_load_transactions (
+    txid BIGINT PRIMARY KEY,
+    started_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE bulk_load_transactions ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON bulk_load_transactions FROM PUBLIC, anon, authenticated;
+
+COMMENT ON TABLE bulk_load_transactions IS 'Transactions currently in bulk load mode - written only by begin_bulk_load() / end_bulk_load()';
+
+CREATE OR REPLACE FUNCTION begin_bulk_load()
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO bulk_load_transactions (txid)
+    VALUES (txid_current())
+    ON CONFLICT (txid) DO NOTHING;
+    PERFORM set_config('sailorskills.bulk_load', 'on', true);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION end_bulk_load()
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM bulk_load_transactions WHERE txid = txid_current();
+    PERFORM set_config('sailorskills.bulk_load', 'off', true);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Checked by the trigger WHEN clauses; only true between begin/end_bulk_load()
+CREATE OR REPLACE FUNCTION bulk_load_active()
+RETURNS BOOLEAN AS $$
+    SELECT current_setting('sailorskills.bulk_load', true) = 'on'
+       AND EXISTS (SELECT 1 FROM bulk_load_transactions WHERE txid = txid_current());
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION begin_bulk_load IS 'Enter bulk load mode for the current transaction (row triggers on service_logs / service_orders are skipped)';
+COMMENT ON FUNCTION end_bulk_load IS 'Leave bulk load mode for the current transaction';
+
+REVOKE EXECUTE ON FUNCTION begin_bulk_load() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION end_bulk_load() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION begin_bulk_load() TO service_role;
+GRANT EXECUTE ON FUNCTION end_bulk_load() TO service_role;
+
+-- ============================================================================
+-- Gate row-level triggers fired by INSERT on bulk load mode
+-- (set_one_time_active_on_completion only fires on UPDATE and is unchanged)
+-- The setting is tested first so ordinary writes never reach the lookup
+-- ============================================================================
+DROP TRIGGER IF EXISTS auto_calculate_total_hours ON service_logs;
+CREATE TRIGGER auto_calculate_total_hours
+    BEFORE INSERT OR UPDATE ON service_logs
+    FOR EACH ROW
+    WHEN (current_setting('sailorskills.bulk_load', true) IS DISTINCT FROM 'on' OR NOT bulk_load_active())
+    EXECUTE FUNCTION calculate_total_hours();
+
+DROP TRIGGER IF EXISTS trigger_auto_activate_boat ON service_orders;
+CREATE TRIGGER trigger_auto_activate_boat
+    BEFORE INSERT OR UPDATE OF status
+    ON service_orders
+    FOR EACH ROW
+    WHEN (current_setting('sailorskills.bulk_load', true) IS DISTINCT FROM 'on' OR NOT bulk_load_active())
+    EXECUTE FUNCTION auto_activate_boat_on_recurring_order();
+
+-- ============================================================================
+-- Helper: column list shared by a staging table and its target
+-- ============================================================================
+CREATE OR REPLACE FUNCTION bulk_load_column_list(p_table REGCLASS)
+RETURNS TEXT AS $$
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum)
+    FROM pg_attribute
+    WHERE attrelid = p_table
+      AND attnum > 0
+      AND NOT attisdropped
+      AND attgenerated = '';
+$$ LANGUAGE sql STABLE;
+
+-- ============================================================================
+-- Bulk load: service_logs
+-- total_hours is computed once over the staging table (same rule as
+-- calculate_total_hours), then all rows are moved in one INSERT
+-- ============================================================================
+CREATE OR REPLACE FUNCTION bulk_load_service_logs()
+RETURNS INTEGER AS $$
+DECLARE
+    v_columns TEXT := bulk_load_column_list('service_logs_staging'::regclass);
+    v_count INTEGER;
+BEGIN
+    PERFORM begin_bulk_load();
+
+    UPDATE service_logs_staging
+    SET total_hours = EXTRACT(EPOCH FROM (service_ended_at - service_started_at)) / 3600
+    WHERE service_started_at IS NOT NULL
+      AND service_ended_at IS NOT NULL
+      AND total_hours IS NULL;
+
+    EXECUTE format(
+        'INSERT INTO service_logs (%1$s) SELECT %1$s FROM service_logs_staging',
+        v_columns
+    );
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    TRUNCATE service_logs_staging;
+    PERFORM end_bulk_load();
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION bulk_load_service_logs IS 'Moves service_logs_staging into service_logs without per-row triggers; total_hours computed set-based';
+
+-- ============================================================================
+-- Bulk load: service_orders
+-- Applies auto_activate_boat_on_recurring_order semantics set-based:
+--   - confirmed recurring orders for cancelled boats → pending_approval
+--     (one pending_reactivation history row per order)
+--   - other inactive boats with a confirmed recurring order → activated once,
+--     attributed to their earliest staged order, schedules re-activated
+-- ============================================================================
+CREATE OR REPLACE FUNCTION bulk_load_service_orders()
+RETURNS TABLE (orders_loaded INTEGER, boats_activated INTEGER, reactivations_pending INTEGER) AS $$
+DECLARE
+    v_columns TEXT := bulk_load_column_list('service_orders_staging'::regclass);
+BEGIN
+    PERFORM begin_bulk_load();
+
+    -- Reactivation of cancelled boats requires approval
+    WITH pending AS (
+        UPDATE service_orders_staging s
+        SET status = 'pending_approval'
+        FROM boats b
+        WHERE b.id = s.boat_id
+          AND s.status = 'confirmed'
+          AND s.service_interval IN ('1-mo', '2-mo', '3-mo')
+          AND b.plan_status::text = 'cancelled'
+        RETURNING s.id, s.boat_id, b.is_active
+    )
+    INSERT INTO boat_status_history (
+        boat_id, old_status, new_status, old_is_active, new_is_active,
+        changed_at, changed_by, reason, related_order_id, notes
+    )
+    SELECT
+        boat_id, 'cancelled', 'pending_reactivation', is_active, is_active,
+        NOW(), auth.uid(),
+        'Reactivation pending approval - boat was previously cancelled',
+        id,
+        'Order set to pending_approval status - admin must approve before boat reactivates'
+    FROM pending;
+
+    GET DIAGNOSTICS reactivations_pending = ROW_COUNT;
+
+    EXECUTE format(
+        'INSERT INTO service_orders (%1$s) SELECT %1$s FROM service_orders_staging',
+        v_columns
+    );
+    GET DIAGNOSTICS orders_loaded = ROW_COUNT;
+
+    -- Snapshot each boat's pre-update status (earliest staged order wins,
+    -- matching the first row the per-row trigger would have processed)
+    CREATE TEMP TABLE bulk_load_activations ON COMMIT DROP AS
+    SELECT DISTINCT ON (s.boat_id)
+        s.boat_id,
+        s.id AS order_id,
+        s.service_interval,
+        s.created_at,
+        b.plan_status::text AS old_status,
+        b.is_active AS old_is_active
+    FROM service_orders_staging s
+    JOIN boats b ON b.id = s.boat_id
+    WHERE s.status = 'confirmed'
+      AND s.service_interval IN ('1-mo', '2-mo', '3-mo')
+      AND (b.is_active = FALSE OR b.plan_status != 'active')
+    ORDER BY s.boat_id, s.created_at, s.id;
+
+    UPDATE boats b
+    SET
+        is_active = TRUE,
+        plan_status = 'active'::boat_plan_status,
+        last_order_date = a.created_at::date,
+        status_changed_at = NOW(),
+        status_changed_by = auth.uid(),
+        status_change_reason = 'Auto-activated by recurring service order',
+        updated_at = NOW()
+    FROM bulk_load_activations a
+    WHERE b.id = a.boat_id;
+
+    GET DIAGNOSTICS boats_activated = ROW_COUNT;
+
+    UPDATE service_schedules ss
+    SET is_active = TRUE, updated_at = NOW()
+    FROM bulk_load_activations a
+    WHERE ss.boat_id = a.boat_id
+      AND ss.is_active = FALSE;
+
+    INSERT INTO boat_status_history (
+        boat_id, old_status, new_status, old_is_active, new_is_active,
+        changed_at, changed_by, reason, related_order_id, notes
+    )
+    SELECT
+        boat_id, old_status, 'active', old_is_active, TRUE,
+        NOW(), auth.uid(),
+        'Auto-activated by recurring service order',
+        order_id,
+        'Boat activated with ' || service_interval || ' recurring service'
+    FROM bulk_load_activations;
+
+    DROP TABLE bulk_load_activations;
+    TRUNCATE service_orders_staging;
+    PERFORM end_bulk_load();
+
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION bulk_load_service_orders IS 'Moves service_orders_staging into service_orders without per-row triggers; boat activation and status history applied set-based';
+
+-- Imports run as the owner / service_role only, never through the API
+REVOKE EXECUTE ON FUNCTION bulk_load_service_logs() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION bulk_load_service_orders() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_load_service_logs() TO service_role;
+GRANT EXECUTE ON FUNCTION bulk_load_service_orders() TO service_role;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Migration 035: Add notion_source_key to service_logs
+-- Purpose: Stable identity for Notion-imported rows ("<notion_db_id>:<row #>")
+--          so re-imports can replace or update rows instead of duplicating them
+-- Date: 2025-11-15
+-- Used by: scripts/notion-import/
+
+ALTER TABLE service_logs
+  ADD COLUMN IF NOT EXISTS notion_source_key TEXT;
+
+-- Keep the bulk load staging table (migration 034) in step with service_logs
+ALTER TABLE service_logs_staging
+  ADD COLUMN IF NOT EXISTS notion_source_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_service_logs_notion_source_key
+  ON service_logs(notion_source_key)
+  WHERE notion_source_key IS NOT NULL;
+
+COMMENT ON COLUMN service_logs.notion_source_key IS 'Notion import identity: <conditions/admin database id>:<row number>. NULL for app-created logs';
@@ -0,0 +1,119 @@
+-- Migration 036: Evaluate staff RLS checks once per statement
+-- Purpose: Wrap get_user_metadata() / get_user_role(auth.uid()) in scalar
+--          subqueries so the planner runs them as InitPlans (once per
+--          statement) instead of calling them for every row scanned
+-- Date: 2025-11-15
+-- Depends on: 018_fix_service_orders_rls.sql
+--             026_add_staff_access_to_customer_tables.sql
+--             027_add_cleaning_frequency_config.sql
+--
+-- Same predicates and roles as before - only the evaluation changes.
+-- Measure with: python scripts/benchmarks/rls_profile.py (before and after)
+
+BEGIN;
+
+-- ============================================================================
+-- customer_messages / service_requests (migration 026)
+-- ============================================================================
+DROP POLICY IF EXISTS "Staff can view all customer messages" ON customer_messages;
+CREATE POLICY "Staff can view all customer messages"
+ON customer_messages
+FOR SELECT
+TO public
+USING (
+  ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+  AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin', 'viewer'])
+);
+
+DROP POLICY IF EXISTS "Staff can view all service requests" ON service_requests;
+CREATE POLICY "Staff can view all service requests"
+ON service_requests
+FOR SELECT
+TO public
+USING (
+  ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+  AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin', 'viewer'])
+);
+
+DROP POLICY IF EXISTS "Staff can update customer messages" ON customer_messages;
+CREATE POLICY "Staff can update customer messages"
+ON customer_messages
+FOR UPDATE
+TO public
+USING (
+  ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+  AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin'])
+);
+
+DROP POLICY IF EXISTS "Staff can update service requests" ON service_requests;
+CREATE POLICY "Staff can update service requests"
+ON service_requests
+FOR UPDATE
+TO public
+USING (
+  ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+  AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin'])
+);
+
+-- ============================================================================
+-- service_orders (migration 018)
+-- ============================================================================
+DROP POLICY IF EXISTS service_orders_select ON service_orders;
+CREATE POLICY service_orders_select ON service_orders
+  FOR SELECT
+  USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin', 'technician', 'contractor', 'viewer')
+  );
+
+DROP POLICY IF EXISTS service_orders_update ON service_orders;
+CREATE POLICY service_orders_update ON service_orders
+  FOR UPDATE
+  USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  )
+  WITH CHECK (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  );
+
+DROP POLICY IF EXISTS service_orders_delete ON service_orders;
+CREATE POLICY service_orders_delete ON service_orders
+  FOR DELETE
+  USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  );
+
+-- ============================================================================
+-- Cleaning frequency config (migration 027)
+-- ============================================================================
+DROP POLICY IF EXISTS "Allow staff to manage cleaning intervals" ON cleaning_time_intervals;
+CREATE POLICY "Allow staff to manage cleaning intervals"
+    ON cleaning_time_intervals FOR ALL
+    TO public
+    USING (
+        ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+        AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin'])
+    );
+
+DROP POLICY IF EXISTS "Allow staff to manage cleaning formulas" ON cleaning_frequency_formulas;
+CREATE POLICY "Allow staff to manage cleaning formulas"
+    ON cleaning_frequency_formulas FOR ALL
+    TO public
+    USING (
+        ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+        AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin'])
+    );
+
+DROP POLICY IF EXISTS "Allow staff to manage cleaning overrides" ON cleaning_frequency_overrides;
+CREATE POLICY "Allow staff to manage cleaning overrides"
+    ON cleaning_frequency_overrides FOR ALL
+    TO public
+    USING (
+        ((SELECT get_user_metadata()) ->> 'user_type') = 'staff'
+        AND (SELECT get_user_role(auth.uid())) = ANY(ARRAY['owner', 'admin'])
+    );
+
+COMMIT;
+
+-- Verification (as an authenticated staff user, the plan should show
+-- "InitPlan" nodes and no get_user_role(...) in the scan's Filter):
+-- EXPLAIN SELECT * FROM customer_messages;
@@ -0,0 +1,289 @@
+-- Migration 037: Asynchronous, batched audit trail
+-- Purpose: Record only changed columns, buffer audit entries in a queue
+--          drained in batches, and partition audit_logs by month
+-- Date: 2025-11-15
+-- Depends on: 022_fix_audit_logs_security.sql (log_audit_trail)
+--             036_initplan_staff_rls_policies.sql (policy style)
+--
+-- Changes:
+--   1. log_audit_trail() writes a diff: UPDATE stores only columns whose
+--      value changed ({before: {col: old}, after: {col: new}}), INSERT/DELETE
+--      store the row without NULL columns. Updates that change nothing but
+--      updated_at are not logged.
+--   2. Entries go to audit_log_queue; drain_audit_log_queue() moves them into
+--      audit_logs in batches (pg_cron every minute when available, otherwise
+--      scripts/drain-audit-queue.mjs). SET sailorskills.audit_mode = 'sync'
+--      writes straight to audit_logs for the current session.
+--   3. audit_logs is range-partitioned by month on timestamp. Retention is
+--      drop_audit_log_partitions(months) instead of DELETE.
+--
+-- Existing rows are copied into the partitioned table inside this
+-- transaction; on a very large audit_logs run it in a maintenance window.
+
+BEGIN;
+
+-- ============================================================================
+-- Monthly partitioned audit_logs
+-- ============================================================================
+ALTER TABLE audit_logs RENAME TO audit_logs_legacy;
+ALTER INDEX audit_logs_pkey RENAME TO audit_logs_legacy_pkey;
+
+CREATE TABLE audit_logs (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  user_id uuid REFERENCES users(id) ON DELETE SET NULL,
+  entity_type text NOT NULL,
+  entity_id uuid NOT NULL,
+  action text NOT NULL CHECK (action IN ('INSERT', 'UPDATE', 'DELETE')),
+  changes jsonb,
+  ip_address text,
+  service_name text,
+  timestamp timestamptz NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+COMMENT ON TABLE audit_logs IS 'Audit trail of data changes, partitioned by month (audit_logs_YYYYMM)';
+COMMENT ON COLUMN audit_logs.changes IS 'JSONB diff: UPDATE {before: {changed cols}, after: {changed cols}}; INSERT {after: row}; DELETE {before: row}';
+
+-- Creates monthly partitions from p_from's month for p_months months
+CREATE OR REPLACE FUNCTION ensure_audit_log_partitions(p_from DATE, p_months INTEGER DEFAULT 3)
+RETURNS INTEGER
+SECURITY DEFINER
+SET search_path = public
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_month DATE;
+  v_name TEXT;
+  v_created INTEGER := 0;
+BEGIN
+  FOR i IN 0 .. p_months - 1 LOOP
+    v_month := (date_trunc('month', p_from) + make_interval(months => i))::date;
+    v_name := 'audit_logs_' || to_char(v_month, 'YYYYMM');
+    IF to_regclass(v_name) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_month, (v_month + INTERVAL '1 month')::date
+      );
+      v_created := v_created + 1;
+    END IF;
+  END LOOP;
+  RETURN v_created;
+END;
+$$;
+
+COMMENT ON FUNCTION ensure_audit_log_partitions IS 'Create audit_logs monthly partitions (idempotent)';
+
+-- Drops partitions entirely older than p_keep_months (retention)
+CREATE OR REPLACE FUNCTION drop_audit_log_partitions(p_keep_months INTEGER)
+RETURNS INTEGER
+SECURITY DEFINER
+SET search_path = public
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_cutoff TEXT := to_char(date_trunc('month', NOW()) - make_interval(months => p_keep_months), 'YYYYMM');
+  v_partition RECORD;
+  v_dropped INTEGER := 0;
+BEGIN
+  FOR v_partition IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'audit_logs'::regclass
+      AND c.relname ~ '^audit_logs_[0-9]{6}$'
+      AND substring(c.relname FROM 12) < v_cutoff
+  LOOP
+    EXECUTE format('DROP TABLE %I', v_partition.relname);
+    v_dropped := v_dropped + 1;
+  END LOOP;
+  RETURN v_dropped;
+END;
+$$;
+
+COMMENT ON FUNCTION drop_audit_log_partitions IS 'Drop audit_logs partitions older than N months';
+
+-- Partitions for existing rows through three months ahead, then copy
+SELECT ensure_audit_log_partitions(
+  first_month,
+  ((EXTRACT(YEAR FROM NOW()) - EXTRACT(YEAR FROM first_month)) * 12
+    + EXTRACT(MONTH FROM NOW()) - EXTRACT(MONTH FROM first_month))::int + 3
+)
+FROM (SELECT COALESCE(MIN(timestamp), NOW())::date AS first_month FROM audit_logs_legacy) legacy;
+
+INSERT INTO audit_logs (id, user_id, entity_type, entity_id, action, changes, ip_address, service_name, timestamp)
+SELECT id, user_id, entity_type, entity_id, action, changes, ip_address, service_name, COALESCE(timestamp, NOW())
+FROM audit_logs_legacy;
+
+DROP TABLE audit_logs_legacy;
+
+CREATE INDEX idx_audit_logs_user_id ON audit_logs(user_id);
+CREATE INDEX idx_audit_logs_entity_type ON audit_logs(entity_type);
+CREATE INDEX idx_audit_logs_entity_id ON audit_logs(entity_id);
+CREATE INDEX idx_audit_logs_timestamp ON audit_logs(timestamp DESC);
+CREATE INDEX idx_audit_logs_service_name ON audit_logs(service_name);
+
+ALTER TABLE audit_logs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "audit_logs_select_admin" ON audit_logs
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  );
+
+CREATE POLICY "audit_logs_no_manual_changes" ON audit_logs
+  FOR ALL USING (false);
+
+GRANT SELECT ON audit_logs TO authenticated;
+
+-- ============================================================================
+-- Queue
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS audit_log_queue (
+  id BIGSERIAL PRIMARY KEY,
+  user_id uuid,
+  entity_type text NOT NULL,
+  entity_id uuid NOT NULL,
+  action text NOT NULL,
+  changes jsonb,
+  ip_address text,
+  service_name text,
+  timestamp timestamptz NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE audit_log_queue ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "audit_log_queue_no_access" ON audit_log_queue
+  FOR ALL USING (false);
+
+COMMENT ON TABLE audit_log_queue IS 'Pending audit entries - moved to audit_logs by drain_audit_log_queue()';
+
+-- ============================================================================
+-- Diffing trigger function (same triggers as before)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION log_audit_trail()
+RETURNS TRIGGER
+SECURITY DEFINER
+SET search_path = public
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_old jsonb;
+  v_new jsonb;
+  v_changes jsonb;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    v_changes := jsonb_build_object('after', jsonb_strip_nulls(to_jsonb(NEW)));
+  ELSIF TG_OP = 'DELETE' THEN
+    v_changes := jsonb_build_object('before', jsonb_strip_nulls(to_jsonb(OLD)));
+  ELSE
+    v_old := to_jsonb(OLD);
+    v_new := to_jsonb(NEW);
+    SELECT
+      jsonb_build_object(
+        'before', jsonb_object_agg(n.key, v_old -> n.key),
+        'after', jsonb_object_agg(n.key, n.value)
+      )
+    INTO v_changes
+    FROM jsonb_each(v_new) n
+    WHERE n.value IS DISTINCT FROM v_old -> n.key
+      AND n.key <> 'updated_at'
+    HAVING COUNT(*) > 0;
+
+    IF v_changes IS NULL THEN
+      RETURN NEW;
+    END IF;
+  END IF;
+
+  IF current_setting('sailorskills.audit_mode', true) = 'sync' THEN
+    PERFORM ensure_audit_log_partitions(CURRENT_DATE, 1);
+    INSERT INTO audit_logs (user_id, entity_type, entity_id, action, changes, ip_address, service_name, timestamp)
+    VALUES (
+      auth.uid(), TG_TABLE_NAME, COALESCE(NEW.id, OLD.id), TG_OP, v_changes,
+      current_setting('request.headers', true)::json->>'x-real-ip',
+      current_setting('app.service_name', true),
+      NOW()
+    );
+  ELSE
+    INSERT INTO audit_log_queue (user_id, entity_type, entity_id, action, changes, ip_address, service_name, timestamp)
+    VALUES (
+      auth.uid(), TG_TABLE_NAME, COALESCE(NEW.id, OLD.id), TG_OP, v_changes,
+      current_setting('request.headers', true)::json->>'x-real-ip',
+      current_setting('app.service_name', true),
+      NOW()
+    );
+  END IF;
+
+  RETURN COALESCE(NEW, OLD);
+END;
+$$;
+
+COMMENT ON FUNCTION log_audit_trail() IS 'Queue a changed-columns diff of each table change for audit_logs (sailorskills.audit_mode = sync writes directly)';
+
+-- ============================================================================
+-- Drain
+-- ============================================================================
+CREATE OR REPLACE FUNCTION drain_audit_log_queue(p_batch_size INTEGER DEFAULT 5000)
+RETURNS INTEGER
+SECURITY DEFINER
+SET search_path = public
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_from DATE := LEAST(CURRENT_DATE, (SELECT MIN(timestamp)::date FROM audit_log_queue));
+  v_moved INTEGER;
+BEGIN
+  -- Oldest queued month through next month (queue may lag if the drain stopped)
+  PERFORM ensure_audit_log_partitions(
+    v_from,
+    ((EXTRACT(YEAR FROM NOW()) - EXTRACT(YEAR FROM v_from)) * 12
+      + EXTRACT(MONTH FROM NOW()) - EXTRACT(MONTH FROM v_from))::int + 2
+  );
+
+  WITH batch AS (
+    DELETE FROM audit_log_queue
+    WHERE id IN (
+      SELECT id FROM audit_log_queue
+      ORDER BY id
+      LIMIT p_batch_size
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+  )
+  -- user_id of a since-deleted user becomes NULL (ON DELETE SET NULL semantics)
+  INSERT INTO audit_logs (user_id, entity_type, entity_id, action, changes, ip_address, service_name, timestamp)
+  SELECT u.id, b.entity_type, b.entity_id, b.action, b.changes, b.ip_address, b.service_name, b.timestamp
+  FROM batch b
+  LEFT JOIN users u ON u.id = b.user_id;
+
+  GET DIAGNOSTICS v_moved = ROW_COUNT;
+  RETURN v_moved;
+END;
+$$;
+
+COMMENT ON FUNCTION drain_audit_log_queue IS 'Move up to N queued audit entries into audit_logs; safe to run concurrently';
+
+-- Maintenance only: not callable through the API (pg_cron runs as the owner)
+REVOKE EXECUTE ON FUNCTION ensure_audit_log_partitions(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_audit_log_partitions(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drain_audit_log_queue(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_audit_log_partitions(DATE, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION drop_audit_log_partitions(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION drain_audit_log_queue(INTEGER) TO service_role;
+
+-- Background drain every minute where pg_cron is installed
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('drain-audit-log-queue', '* * * * *', 'SELECT drain_audit_log_queue(50000)');
+    PERFORM cron.schedule('audit-log-partitions', '0 3 1 * *', 'SELECT ensure_audit_log_partitions(CURRENT_DATE, 3)');
+  ELSE
+    RAISE NOTICE 'pg_cron not installed - run scripts/drain-audit-queue.mjs to drain audit_log_queue';
+  END IF;
+END $$;
+
+COMMIT;
+
+-- Verification:
+-- UPDATE service_orders SET status = status WHERE id = '<id>';  -- no entry (nothing changed)
+-- SELECT COUNT(*) FROM audit_log_queue;
+-- SELECT drain_audit_log_queue();
+-- SELECT tableoid::regclass, COUNT(*) FROM audit_logs GROUP BY 1;
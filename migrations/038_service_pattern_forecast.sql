@@ -0,0 +1,264 @@
+-- Migration 038: Closed-form service pattern forecast
+-- Purpose: Compute pattern occurrences arithmetically instead of looping,
+--          and keep a 12-month capacity forecast that updates incrementally
+--          when a schedule's pattern changes
+-- Date: 2025-11-15
+-- Depends on: 021_recalculate_pattern_dates.sql
+--
+-- A schedule with start_month S and interval I services in month M when
+--   MOD((M - S + 12) % 12, I) = 0
+-- i.e. the pattern re-anchors at S every year, exactly as the WHILE loop in
+-- calculate_current_pattern_date() and the UPDATE in migration 021 did.
+-- The most recent occurrence is therefore the reference month minus
+--   MOD((M - S + 12) % 12, I) months
+-- which replaces the loop. Results are identical for every input the
+-- loop accepted.
+--
+-- Tables:
+--   service_schedule_occurrences - one row per active schedule and month
+--                                  it services in the 12-month horizon
+--   service_capacity_forecast    - boats due per month (what the forecast
+--                                  page counts)
+-- A trigger on service_schedules replaces a schedule's occurrences, adjusts
+-- the affected months and sets pattern_date when start_month /
+-- interval_months / is_active / boat_id change. rebuild_service_forecast()
+-- rolls the horizon forward (monthly via pg_cron when installed) and
+-- supersedes the manual monthly reruns of migration 021.
+
+BEGIN;
+
+-- ============================================================================
+-- Closed-form pattern date (drop-in replacement, no loop)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION calculate_current_pattern_date(
+  p_start_month INTEGER,        -- 1-12
+  p_interval_months INTEGER,    -- 1, 2, 3, 6
+  p_reference_date DATE DEFAULT CURRENT_DATE
+) RETURNS DATE AS $$
+  SELECT CASE
+    WHEN p_start_month IS NULL OR p_interval_months IS NULL OR p_interval_months <= 0 THEN NULL
+    ELSE (
+      date_trunc('month', p_reference_date)
+      - make_interval(months => MOD((EXTRACT(MONTH FROM p_reference_date)::INTEGER - p_start_month + 12) % 12,
+                                    p_interval_months))
+    )::DATE
+  END;
+$$ LANGUAGE sql IMMUTABLE;
+
+COMMENT ON FUNCTION calculate_current_pattern_date IS 'Most recent pattern occurrence on or before the reference month (closed form)';
+
+-- ============================================================================
+-- Set-based occurrence projection
+-- ============================================================================
+CREATE OR REPLACE FUNCTION project_service_occurrences(
+  p_from DATE DEFAULT CURRENT_DATE,
+  p_months INTEGER DEFAULT 12
+) RETURNS TABLE (schedule_id UUID, boat_id UUID, service_month DATE, occurrence INTEGER) AS $$
+  SELECT
+    s.id,
+    s.boat_id,
+    m.month::DATE,
+    ROW_NUMBER() OVER (PARTITION BY s.id ORDER BY m.month)::INTEGER
+  FROM service_schedules s
+  CROSS JOIN generate_series(
+    date_trunc('month', p_from),
+    date_trunc('month', p_from) + make_interval(months => p_months - 1),
+    INTERVAL '1 month'
+  ) AS m(month)
+  WHERE s.is_active = TRUE
+    AND s.interval_months > 0
+    AND s.start_month IS NOT NULL
+    AND MOD((EXTRACT(MONTH FROM m.month)::INTEGER - s.start_month + 12) % 12, s.interval_months) = 0;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION project_service_occurrences IS 'Every active schedule''s service months over a horizon, one pass (occurrence = 1 for the next one)';
+
+-- ============================================================================
+-- Forecast tables
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS service_schedule_occurrences (
+  schedule_id UUID NOT NULL REFERENCES service_schedules(id) ON DELETE CASCADE,
+  boat_id UUID,
+  service_month DATE NOT NULL,
+  PRIMARY KEY (schedule_id, service_month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_service_schedule_occurrences_month
+  ON service_schedule_occurrences(service_month);
+
+CREATE TABLE IF NOT EXISTS service_capacity_forecast (
+  service_month DATE PRIMARY KEY,
+  boat_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE service_schedule_occurrences IS 'Projected service months per active schedule (12-month horizon) - maintained by trigger';
+COMMENT ON TABLE service_capacity_forecast IS 'Boats due per month over the forecast horizon - maintained incrementally';
+
+ALTER TABLE service_schedule_occurrences ENABLE ROW LEVEL SECURITY;
+ALTER TABLE service_capacity_forecast ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Staff can view schedule occurrences" ON service_schedule_occurrences
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin', 'technician', 'contractor', 'viewer')
+  );
+
+CREATE POLICY "Staff can view capacity forecast" ON service_capacity_forecast
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin', 'technician', 'contractor', 'viewer')
+  );
+
+-- ============================================================================
+-- Full rebuild (horizon roll-forward)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION rebuild_service_forecast(
+  p_from DATE DEFAULT CURRENT_DATE,
+  p_months INTEGER DEFAULT 12
+) RETURNS INTEGER AS $$
+DECLARE
+  v_count INTEGER;
+BEGIN
+  TRUNCATE service_schedule_occurrences, service_capacity_forecast;
+
+  INSERT INTO service_schedule_occurrences (schedule_id, boat_id, service_month)
+  SELECT schedule_id, boat_id, service_month
+  FROM project_service_occurrences(p_from, p_months);
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+
+  INSERT INTO service_capacity_forecast (service_month, boat_count)
+  SELECT m.month::DATE, COUNT(o.schedule_id)
+  FROM generate_series(
+    date_trunc('month', p_from),
+    date_trunc('month', p_from) + make_interval(months => p_months - 1),
+    INTERVAL '1 month'
+  ) AS m(month)
+  LEFT JOIN service_schedule_occurrences o ON o.service_month = m.month::DATE
+  GROUP BY m.month;
+
+  -- Keep service_schedules.pattern_date in step (what migration 021 did by hand)
+  UPDATE service_schedules s
+  SET pattern_date = o.service_month,
+      updated_at = NOW()
+  FROM (
+    SELECT schedule_id, MIN(service_month) AS service_month
+    FROM service_schedule_occurrences
+    GROUP BY schedule_id
+  ) o
+  WHERE s.id = o.schedule_id
+    AND s.pattern_date IS DISTINCT FROM o.service_month;
+
+  RETURN v_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION rebuild_service_forecast IS 'Recompute all schedule occurrences and the monthly capacity forecast for the horizon';
+
+-- Rewrites service_schedules.pattern_date: owner / pg_cron / service_role only
+REVOKE EXECUTE ON FUNCTION rebuild_service_forecast(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_service_forecast(DATE, INTEGER) TO service_role;
+
+-- ============================================================================
+-- Incremental maintenance on pattern changes
+-- ============================================================================
+CREATE OR REPLACE FUNCTION refresh_schedule_forecast()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_from DATE;
+  v_months INTEGER;
+BEGIN
+  -- Use the horizon currently in the forecast table
+  SELECT MIN(service_month), COUNT(*)
+  INTO v_from, v_months
+  FROM service_capacity_forecast;
+
+  IF v_from IS NULL THEN
+    RETURN NULL;  -- forecast not built yet
+  END IF;
+
+  -- Decrement from OLD's pattern rather than from the deleted occurrence
+  -- rows: on DELETE the FK cascade (an RI trigger, which sorts before this
+  -- one) has already removed them
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM service_schedule_occurrences
+    WHERE schedule_id = OLD.id;
+
+    UPDATE service_capacity_forecast f
+    SET boat_count = f.boat_count - 1,
+        updated_at = NOW()
+    FROM generate_series(v_from, v_from + make_interval(months => v_months - 1), INTERVAL '1 month') AS m(month)
+    WHERE f.service_month = m.month::DATE
+      AND OLD.is_active = TRUE
+      AND OLD.interval_months > 0
+      AND OLD.start_month IS NOT NULL
+      AND MOD((EXTRACT(MONTH FROM m.month)::INTEGER - OLD.start_month + 12) % 12, OLD.interval_months) = 0;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    WITH added AS (
+      INSERT INTO service_schedule_occurrences (schedule_id, boat_id, service_month)
+      SELECT NEW.id, NEW.boat_id, m.month::DATE
+      FROM generate_series(v_from, v_from + make_interval(months => v_months - 1), INTERVAL '1 month') AS m(month)
+      WHERE NEW.is_active = TRUE
+        AND NEW.interval_months > 0
+        AND NEW.start_month IS NOT NULL
+        AND MOD((EXTRACT(MONTH FROM m.month)::INTEGER - NEW.start_month + 12) % 12, NEW.interval_months) = 0
+      RETURNING service_month
+    )
+    UPDATE service_capacity_forecast f
+    SET boat_count = f.boat_count + 1,
+        updated_at = NOW()
+    FROM added a
+    WHERE f.service_month = a.service_month;
+
+    -- Same rule as rebuild_service_forecast(): next occurrence in the horizon
+    -- (pattern_date is not in the trigger's column list, so this does not re-fire)
+    UPDATE service_schedules s
+    SET pattern_date = o.service_month,
+        updated_at = NOW()
+    FROM (
+      SELECT MIN(service_month) AS service_month
+      FROM service_schedule_occurrences
+      WHERE schedule_id = NEW.id
+    ) o
+    WHERE s.id = NEW.id
+      AND o.service_month IS NOT NULL
+      AND s.pattern_date IS DISTINCT FROM o.service_month;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS service_schedules_forecast ON service_schedules;
+CREATE TRIGGER service_schedules_forecast
+  AFTER INSERT OR DELETE OR UPDATE OF start_month, interval_months, is_active, boat_id
+  ON service_schedules
+  FOR EACH ROW
+  EXECUTE FUNCTION refresh_schedule_forecast();
+
+-- ============================================================================
+-- Initial build and monthly roll-forward
+-- ============================================================================
+SELECT rebuild_service_forecast();
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('rebuild-service-forecast', '5 0 1 * *', 'SELECT rebuild_service_forecast()');
+  ELSE
+    RAISE NOTICE 'pg_cron not installed - run SELECT rebuild_service_forecast() at the start of each month';
+  END IF;
+END $$;
+
+COMMIT;
+
+-- Verification:
+-- SELECT * FROM service_capacity_forecast ORDER BY service_month;
+-- Next 3 services per boat:
+-- SELECT * FROM project_service_occurrences() WHERE occurrence <= 3 ORDER BY boat_id, occurrence;
+-- Consistency (should return no rows):
+-- SELECT f.service_month, f.boat_count, COUNT(o.schedule_id)
+-- FROM service_capacity_forecast f
+-- LEFT JOIN service_schedule_occurrences o USING (service_month)
+-- GROUP BY f.service_month, f.boat_count
+-- HAVING f.boat_count <> COUNT(o.schedule_id);
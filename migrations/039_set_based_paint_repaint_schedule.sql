@@ -0,0 +1,96 @@
+-- Migration 039: Set-based paint repaint schedule
+-- Purpose: Compute paint_repaint_schedule for all (or selected) boats in one
+--          windowed query and one upsert, instead of two round trips per boat
+-- Date: 2025-11-15
+-- Used by: scripts/populate-paint-schedules.mjs
+--
+-- Same rules as updatePaintRepaintSchedule() in api/service-complete.js:
+--   - last 5 service_logs with a paint_condition_overall, newest first
+--   - excellent=4, good=3, fair=2, poor=1 (exact match; other values count
+--     as 0 in the average and make the trend 'stable')
+--   - avg <= 1.5 overdue, <= 2 time_now, <= 2.5 consider_soon, else not_yet
+--   - trend from the two most recent values
+--   - boats without paint history are left untouched
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_service_logs_boat_paint_history
+  ON service_logs(boat_id, service_date DESC)
+  WHERE paint_condition_overall IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION refresh_paint_repaint_schedule(p_boat_ids UUID[] DEFAULT NULL)
+RETURNS TABLE (urgency_level TEXT, boats INTEGER) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  WITH history AS (
+    SELECT
+      sl.boat_id,
+      CASE sl.paint_condition_overall
+        WHEN 'excellent' THEN 4
+        WHEN 'good' THEN 3
+        WHEN 'fair' THEN 2
+        WHEN 'poor' THEN 1
+      END AS score,
+      ROW_NUMBER() OVER (
+        PARTITION BY sl.boat_id
+        ORDER BY sl.service_date DESC, sl.created_at DESC, sl.id
+      ) AS recency
+    FROM service_logs sl
+    JOIN boats b ON b.id = sl.boat_id
+    WHERE sl.paint_condition_overall IS NOT NULL
+      AND (p_boat_ids IS NULL OR sl.boat_id = ANY(p_boat_ids))
+  ),
+  schedules AS (
+    SELECT
+      boat_id,
+      AVG(COALESCE(score, 0)) AS avg_condition,
+      MAX(score) FILTER (WHERE recency = 1) AS recent_score,
+      MAX(score) FILTER (WHERE recency = 2) AS older_score
+    FROM history
+    WHERE recency <= 5
+    GROUP BY boat_id
+  ),
+  upserted AS (
+    INSERT INTO paint_repaint_schedule (boat_id, avg_paint_condition, trend, urgency_level, updated_at)
+    SELECT
+      boat_id,
+      ROUND(avg_condition, 2),
+      CASE
+        WHEN recent_score > older_score THEN 'improving'
+        WHEN recent_score < older_score THEN 'declining'
+        ELSE 'stable'
+      END,
+      CASE
+        WHEN avg_condition <= 1.5 THEN 'overdue'
+        WHEN avg_condition <= 2 THEN 'time_now'
+        WHEN avg_condition <= 2.5 THEN 'consider_soon'
+        ELSE 'not_yet'
+      END,
+      NOW()
+    FROM schedules
+    ON CONFLICT (boat_id) DO UPDATE SET
+      avg_paint_condition = EXCLUDED.avg_paint_condition,
+      trend = EXCLUDED.trend,
+      urgency_level = EXCLUDED.urgency_level,
+      updated_at = EXCLUDED.updated_at
+    RETURNING paint_repaint_schedule.urgency_level
+  )
+  SELECT u.urgency_level::TEXT, COUNT(*)::INTEGER
+  FROM upserted u
+  GROUP BY u.urgency_level
+  ORDER BY 2 DESC;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION refresh_paint_repaint_schedule IS 'Recompute paint_repaint_schedule for all boats (or p_boat_ids) in one pass; returns boats per urgency level';
+
+-- Upserts over every boat: service_role only (populate-paint-schedules.mjs uses the service key)
+REVOKE EXECUTE ON FUNCTION refresh_paint_repaint_schedule(UUID[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_paint_repaint_schedule(UUID[]) TO service_role;
+
+COMMIT;
+
+-- Verification:
+-- SELECT * FROM refresh_paint_repaint_schedule();
+-- SELECT * FROM refresh_paint_repaint_schedule(ARRAY['<boat_id>']::uuid[]);
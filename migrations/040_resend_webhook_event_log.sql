@@ -0,0 +1,166 @@
+-- Migration 040: Resend webhook event log and batched fold into email_logs
+-- Purpose: Let the resend-webhook function append events idempotently and
+--          apply them to email_logs in set-based batches
+-- Date: 2025-11-15
+-- Used by: supabase/functions/resend-webhook/index.ts
+--          scripts/benchmarks/replay_resend_webhooks.py
+--
+-- Each delivery is stored once in resend_webhook_events, keyed on the
+-- provider event ID (svix-id header), so retries and duplicate deliveries
+-- are no-ops. fold_resend_webhook_events() takes a batch of unprocessed
+-- events, aggregates them per email and applies them with one
+-- UPDATE ... FROM, with the same rules as the old per-event handler:
+--   opened     - opened_at set once (earliest)
+--   clicked    - first_click_at set once, click_count += clicks
+--   bounced    - bounced_at, status 'failed', error_message = reason
+--   complained - complained_at
+--   delivered  - status pending → sent
+-- Events whose email_logs row doesn't exist yet are retried every
+-- p_retry_interval until they are older than p_unmatched_grace, then marked
+-- processed and unmatched. Batches are taken in next-attempt order, so
+-- waiting unmatched events never hold back newer ones (no head-of-line
+-- blocking when more than a batch of them is waiting).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS resend_webhook_events (
+  event_id TEXT PRIMARY KEY,
+  event_type TEXT NOT NULL,
+  resend_id TEXT,
+  occurred_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  payload JSONB NOT NULL,
+  received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  processed_at TIMESTAMPTZ,
+  matched BOOLEAN,
+  next_attempt_at TIMESTAMPTZ
+);
+
+ALTER TABLE resend_webhook_events
+  ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN resend_webhook_events.next_attempt_at IS 'Unmatched events: when the fold retries them (NULL = not tried yet)';
+
+DROP INDEX IF EXISTS idx_resend_webhook_events_pending;
+CREATE INDEX idx_resend_webhook_events_pending
+  ON resend_webhook_events((COALESCE(next_attempt_at, received_at)))
+  WHERE processed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_email_logs_resend_id
+  ON email_logs(resend_id);
+
+ALTER TABLE resend_webhook_events ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Admins can view resend webhook events" ON resend_webhook_events
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  );
+
+COMMENT ON TABLE resend_webhook_events IS 'Raw Resend webhook deliveries (one row per provider event) - folded into email_logs by fold_resend_webhook_events()';
+
+DROP FUNCTION IF EXISTS fold_resend_webhook_events(INTEGER, INTERVAL);
+
+CREATE OR REPLACE FUNCTION fold_resend_webhook_events(
+  p_batch_size INTEGER DEFAULT 1000,
+  p_unmatched_grace INTERVAL DEFAULT INTERVAL '1 hour',
+  p_retry_interval INTERVAL DEFAULT INTERVAL '1 minute'
+) RETURNS TABLE (events INTEGER, emails_updated INTEGER, unmatched INTEGER) AS $$
+BEGIN
+  CREATE TEMP TABLE IF NOT EXISTS resend_fold_batch (
+    event_id TEXT,
+    event_type TEXT,
+    resend_id TEXT,
+    occurred_at TIMESTAMPTZ,
+    payload JSONB,
+    received_at TIMESTAMPTZ
+  ) ON COMMIT DROP;
+  TRUNCATE resend_fold_batch;
+
+  INSERT INTO resend_fold_batch
+  SELECT event_id, event_type, resend_id, occurred_at, payload, received_at
+  FROM resend_webhook_events
+  WHERE processed_at IS NULL
+    AND COALESCE(next_attempt_at, received_at) <= NOW()
+  ORDER BY COALESCE(next_attempt_at, received_at)
+  LIMIT p_batch_size
+  FOR UPDATE SKIP LOCKED;
+
+  GET DIAGNOSTICS events = ROW_COUNT;
+
+  WITH per_email AS (
+    SELECT
+      resend_id,
+      MIN(occurred_at) FILTER (WHERE event_type = 'email.opened') AS opened_at,
+      MIN(occurred_at) FILTER (WHERE event_type = 'email.clicked') AS first_click_at,
+      COUNT(*) FILTER (WHERE event_type = 'email.clicked') AS clicks,
+      MAX(occurred_at) FILTER (WHERE event_type = 'email.bounced') AS bounced_at,
+      (ARRAY_AGG(COALESCE(payload -> 'data' ->> 'reason', 'Email bounced') ORDER BY occurred_at DESC)
+        FILTER (WHERE event_type = 'email.bounced'))[1] AS bounce_reason,
+      MAX(occurred_at) FILTER (WHERE event_type = 'email.complained') AS complained_at,
+      BOOL_OR(event_type = 'email.delivered') AS delivered
+    FROM resend_fold_batch
+    WHERE resend_id IS NOT NULL
+    GROUP BY resend_id
+  )
+  UPDATE email_logs e
+  SET
+    opened_at = COALESCE(e.opened_at, a.opened_at),
+    first_click_at = COALESCE(e.first_click_at, a.first_click_at),
+    click_count = COALESCE(e.click_count, 0) + a.clicks,
+    bounced_at = COALESCE(a.bounced_at, e.bounced_at),
+    complained_at = COALESCE(a.complained_at, e.complained_at),
+    error_message = COALESCE(a.bounce_reason, e.error_message),
+    status = CASE
+      WHEN a.bounced_at IS NOT NULL THEN 'failed'
+      WHEN a.delivered AND e.status = 'pending' THEN 'sent'
+      ELSE e.status
+    END
+  FROM per_email a
+  WHERE e.resend_id = a.resend_id;
+
+  GET DIAGNOSTICS emails_updated = ROW_COUNT;
+
+  -- Matched events are done; unmatched ones wait for their email_logs row,
+  -- out of the way until their next attempt
+  UPDATE resend_webhook_events w
+  SET processed_at = CASE WHEN m.has_log OR m.expired THEN NOW() END,
+      matched = CASE WHEN m.has_log OR m.expired THEN m.has_log END,
+      next_attempt_at = CASE WHEN m.has_log OR m.expired THEN w.next_attempt_at
+                             ELSE NOW() + p_retry_interval END
+  FROM (
+    SELECT b.event_id,
+           EXISTS (SELECT 1 FROM email_logs e WHERE e.resend_id = b.resend_id) AS has_log,
+           b.received_at < NOW() - p_unmatched_grace AS expired
+    FROM resend_fold_batch b
+  ) m
+  WHERE w.event_id = m.event_id;
+
+  SELECT COUNT(*)::INTEGER INTO unmatched
+  FROM resend_fold_batch b
+  WHERE NOT EXISTS (SELECT 1 FROM email_logs e WHERE e.resend_id = b.resend_id);
+
+  DROP TABLE resend_fold_batch;
+  RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION fold_resend_webhook_events IS 'Apply a batch of due Resend webhook events to email_logs set-based; unmatched events are retried every p_retry_interval; safe to run concurrently';
+
+-- Called by the webhook function (service key) and pg_cron only
+REVOKE EXECUTE ON FUNCTION fold_resend_webhook_events(INTEGER, INTERVAL, INTERVAL) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION fold_resend_webhook_events(INTEGER, INTERVAL, INTERVAL) TO service_role;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('fold-resend-webhook-events', '* * * * *', 'SELECT fold_resend_webhook_events(5000)');
+  ELSE
+    RAISE NOTICE 'pg_cron not installed - the resend-webhook function folds events inline';
+  END IF;
+END $$;
+
+COMMIT;
+
+-- Verification:
+-- SELECT event_type, COUNT(*), COUNT(*) FILTER (WHERE processed_at IS NULL) AS pending
+-- FROM resend_webhook_events GROUP BY event_type;
+-- SELECT * FROM fold_resend_webhook_events();
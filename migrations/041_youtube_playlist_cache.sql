@@ -0,0 +1,95 @@
+-- Migration 041: YouTube playlist response cache
+-- Purpose: Shared cache for the get-playlist-videos edge function so portal
+--          page views stop calling the YouTube Data API every time
+-- Date: 2025-11-15
+-- Used by: supabase/functions/get-playlist-videos/index.ts
+--          scripts/benchmarks/playlist_cache_bench.py
+--
+-- One row per (playlist_id, max_results):
+--   fresh_until   - served as-is until then
+--   stale_until   - after fresh_until and before this, served immediately
+--                   while one caller refreshes it in the background
+--                   (also served if YouTube is failing)
+--   refresh_lease_until - set by claim_playlist_cache_refresh() so only one
+--                   function instance refreshes a key at a time (leases are
+--                   capped at 120 seconds)
+-- Rows are written by the edge function with the service role only.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS youtube_playlist_cache (
+  playlist_id TEXT NOT NULL,
+  max_results INTEGER NOT NULL,
+  videos JSONB NOT NULL DEFAULT '[]'::jsonb,
+  fetched_at TIMESTAMPTZ,
+  fresh_until TIMESTAMPTZ,
+  stale_until TIMESTAMPTZ,
+  refresh_lease_until TIMESTAMPTZ,
+  PRIMARY KEY (playlist_id, max_results)
+);
+
+CREATE INDEX IF NOT EXISTS idx_youtube_playlist_cache_stale_until
+  ON youtube_playlist_cache(stale_until);
+
+ALTER TABLE youtube_playlist_cache ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE youtube_playlist_cache IS 'get-playlist-videos responses by playlist and maxResults (TTL + stale-while-revalidate)';
+
+-- ============================================================================
+-- Refresh lease (one refresher per key across function instances)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION claim_playlist_cache_refresh(
+  p_playlist_id TEXT,
+  p_max_results INTEGER,
+  p_lease_seconds INTEGER DEFAULT 30
+) RETURNS BOOLEAN AS $$
+BEGIN
+  -- A lease never outlives one YouTube round trip by much (1-120s)
+  INSERT INTO youtube_playlist_cache (playlist_id, max_results, refresh_lease_until)
+  VALUES (
+    p_playlist_id,
+    p_max_results,
+    NOW() + make_interval(secs => LEAST(GREATEST(COALESCE(p_lease_seconds, 30), 1), 120))
+  )
+  ON CONFLICT (playlist_id, max_results) DO UPDATE
+    SET refresh_lease_until = EXCLUDED.refresh_lease_until
+    WHERE youtube_playlist_cache.refresh_lease_until IS NULL
+       OR youtube_playlist_cache.refresh_lease_until < NOW();
+
+  RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION claim_playlist_cache_refresh IS 'Take the refresh lease (at most 120s) for a playlist cache key; false if another caller holds it';
+
+-- Inserts rows for any playlist_id: get-playlist-videos (service role) only
+REVOKE EXECUTE ON FUNCTION claim_playlist_cache_refresh(TEXT, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_playlist_cache_refresh(TEXT, INTEGER, INTEGER) TO service_role;
+
+-- ============================================================================
+-- Cleanup of entries nobody has asked for since they went stale, and of
+-- lease-only placeholders whose fetch never completed (e.g. invalid
+-- playlist IDs), which have no stale_until
+-- ============================================================================
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule(
+      'purge-youtube-playlist-cache',
+      '30 3 * * *',
+      'DELETE FROM youtube_playlist_cache
+       WHERE stale_until < NOW()
+          OR (fetched_at IS NULL AND refresh_lease_until < NOW())'
+    );
+  ELSE
+    RAISE NOTICE 'pg_cron not installed - expired playlist cache rows are overwritten on the next request';
+  END IF;
+END $$;
+
+COMMIT;
+
+-- Verification:
+-- SELECT playlist_id, max_results, jsonb_array_length(videos), fetched_at, fresh_until, stale_until
+-- FROM youtube_playlist_cache ORDER BY fetched_at DESC;
+-- Force revalidation on the next request:
+-- UPDATE youtube_playlist_cache SET fresh_until = NOW() WHERE playlist_id = '<id>';
@@ -0,0 +1,209 @@
+-- Migration 042: Set-based one-time service expiration
+-- Purpose: Run the check-expiring-services alert and expire steps as two
+--          set-based statements that log boat_status_history in bulk
+-- Date: 2025-11-15
+-- Depends on: 029_create_boat_status_history_table.sql, 032_boat_status_automation_triggers.sql
+-- Used by: supabase/functions/check-expiring-services/index.ts
+--          scripts/benchmarks/expiration_bench.py
+--
+-- Same rules as the edge function, with open-ended windows so a missed or
+-- failed daily run is caught up on the next one:
+--   alert  - one_time_active boats 25-29 days past last_service that have
+--            no alert logged since that service (once per service, even if
+--            the day-25 run never happened)
+--   expire - one_time_active boats 30+ days past last_service: boat
+--            expired, active service schedules deactivated, history logged
+-- Both share an advisory lock so overlapping runs cannot double-log.
+--
+-- The RPCs the edge function calls take no arguments and always run for
+-- today; they are executable by service_role only. The *_as_of versions
+-- (replay a given day, e.g. from the benchmark) are owner-only, so no API
+-- caller can pick the date or the windows.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_boats_one_time_active_last_service
+  ON boats(last_service)
+  WHERE plan_status = 'one_time_active' AND is_active = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_boat_status_history_boat_reason
+  ON boat_status_history(boat_id, reason, changed_at);
+
+-- Earlier revisions exposed the parameterized signatures as the RPCs
+DROP FUNCTION IF EXISTS alert_expiring_one_time_boats(DATE, INTEGER, INTEGER);
+DROP FUNCTION IF EXISTS expire_one_time_boats(DATE, INTEGER);
+
+-- ============================================================================
+-- Step 1: Expiration alerts (5 days remaining)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION alert_expiring_one_time_boats_as_of(
+  p_as_of DATE,
+  p_alert_days INTEGER DEFAULT 25,
+  p_expire_days INTEGER DEFAULT 30
+) RETURNS TABLE (
+  boat_id UUID,
+  boat_name TEXT,
+  customer_name TEXT,
+  last_service DATE,
+  days_since_service INTEGER
+) AS $$
+#variable_conflict use_column
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('check_expiring_services'));
+
+  RETURN QUERY
+  WITH due AS (
+    SELECT
+      b.id,
+      COALESCE(b.boat_name, b.name, 'Unknown')::TEXT AS boat_name,
+      COALESCE(b.customer_name, 'Unknown')::TEXT AS customer_name,
+      b.last_service,
+      (p_as_of - b.last_service)::INTEGER AS days_since_service
+    FROM boats b
+    WHERE b.plan_status = 'one_time_active'
+      AND b.is_active = TRUE
+      AND b.last_service <= p_as_of - p_alert_days
+      AND b.last_service > p_as_of - p_expire_days
+      AND NOT EXISTS (
+        SELECT 1
+        FROM boat_status_history h
+        WHERE h.boat_id = b.id
+          AND h.reason = 'Expiration alert - 5 days remaining'
+          AND h.changed_at >= b.last_service
+      )
+  ),
+  logged AS (
+    INSERT INTO boat_status_history (
+      boat_id, old_status, new_status, old_is_active, new_is_active, reason, notes
+    )
+    SELECT
+      d.id,
+      'one_time_active',
+      'one_time_active',
+      TRUE,
+      TRUE,
+      'Expiration alert - 5 days remaining',
+      'Boat will expire in ' || (p_expire_days - d.days_since_service) || ' days. Last service: '
+        || d.last_service || ' (' || d.days_since_service || ' days ago)'
+    FROM due d
+  )
+  SELECT d.id, d.boat_name, d.customer_name, d.last_service, d.days_since_service
+  FROM due d
+  ORDER BY d.last_service;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+COMMENT ON FUNCTION alert_expiring_one_time_boats_as_of IS 'Log a 5-days-remaining alert once per one-time service as of a given day (catches up missed days); owner only';
+
+CREATE OR REPLACE FUNCTION alert_expiring_one_time_boats()
+RETURNS TABLE (
+  boat_id UUID,
+  boat_name TEXT,
+  customer_name TEXT,
+  last_service DATE,
+  days_since_service INTEGER
+) AS $$
+  SELECT * FROM alert_expiring_one_time_boats_as_of(CURRENT_DATE);
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION alert_expiring_one_time_boats IS 'Log a 5-days-remaining alert once per one-time service (catches up missed days); returns alerted boats';
+
+-- ============================================================================
+-- Step 2: Auto-expire after 30 days
+-- ============================================================================
+CREATE OR REPLACE FUNCTION expire_one_time_boats_as_of(
+  p_as_of DATE,
+  p_expire_days INTEGER DEFAULT 30
+) RETURNS TABLE (
+  boat_id UUID,
+  boat_name TEXT,
+  customer_name TEXT,
+  last_service DATE,
+  days_since_service INTEGER
+) AS $$
+#variable_conflict use_column
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('check_expiring_services'));
+
+  RETURN QUERY
+  WITH expired AS (
+    UPDATE boats b
+    SET
+      is_active = FALSE,
+      plan_status = 'expired'::boat_plan_status,
+      status_changed_at = NOW(),
+      status_change_reason = 'Auto-expired after 30 days from one-time service completion',
+      updated_at = NOW()
+    WHERE b.plan_status = 'one_time_active'
+      AND b.is_active = TRUE
+      AND b.last_service <= p_as_of - p_expire_days
+    RETURNING
+      b.id,
+      COALESCE(b.boat_name, b.name, 'Unknown')::TEXT AS boat_name,
+      COALESCE(b.customer_name, 'Unknown')::TEXT AS customer_name,
+      b.last_service,
+      (p_as_of - b.last_service)::INTEGER AS days_since_service
+  ),
+  schedules AS (
+    UPDATE service_schedules s
+    SET
+      is_active = FALSE,
+      updated_at = NOW()
+    FROM expired e
+    WHERE s.boat_id = e.id
+      AND s.is_active = TRUE
+  ),
+  logged AS (
+    INSERT INTO boat_status_history (
+      boat_id, old_status, new_status, old_is_active, new_is_active, reason, notes
+    )
+    SELECT
+      e.id,
+      'one_time_active',
+      'expired',
+      TRUE,
+      FALSE,
+      'Auto-expired after 30 days',
+      'One-time service completed ' || e.days_since_service || ' days ago on '
+        || e.last_service || '. No new orders received.'
+    FROM expired e
+  )
+  SELECT e.id, e.boat_name, e.customer_name, e.last_service, e.days_since_service
+  FROM expired e
+  ORDER BY e.last_service;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+COMMENT ON FUNCTION expire_one_time_boats_as_of IS 'Expire one-time boats 30+ days past last_service as of a given day; owner only';
+
+CREATE OR REPLACE FUNCTION expire_one_time_boats()
+RETURNS TABLE (
+  boat_id UUID,
+  boat_name TEXT,
+  customer_name TEXT,
+  last_service DATE,
+  days_since_service INTEGER
+) AS $$
+  SELECT * FROM expire_one_time_boats_as_of(CURRENT_DATE);
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION expire_one_time_boats IS 'Expire one-time boats 30+ days past last_service, deactivate their schedules and log history in one statement; returns expired boats';
+
+-- ============================================================================
+-- Access: the edge function (service key) only
+-- ============================================================================
+REVOKE EXECUTE ON FUNCTION alert_expiring_one_time_boats_as_of(DATE, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated, service_role;
+REVOKE EXECUTE ON FUNCTION expire_one_time_boats_as_of(DATE, INTEGER) FROM PUBLIC, anon, authenticated, service_role;
+REVOKE EXECUTE ON FUNCTION alert_expiring_one_time_boats() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION expire_one_time_boats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION alert_expiring_one_time_boats() TO service_role;
+GRANT EXECUTE ON FUNCTION expire_one_time_boats() TO service_role;
+
+COMMIT;
+
+-- Verification:
+-- What the next run would do (read-only):
+-- BEGIN;
+-- SELECT * FROM alert_expiring_one_time_boats();
+-- SELECT * FROM expire_one_time_boats();
+-- ROLLBACK;
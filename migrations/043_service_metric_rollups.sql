@@ -0,0 +1,362 @@
+-- Migration 043: Incremental service metric rollups
+-- Purpose: Keep monthly rollups of service_logs time tracking so the Insight
+--          metrics no longer re-aggregate all of service_logs per page load
+-- Date: 2025-11-15
+-- Depends on: 023_time_tracking_metrics_views.sql
+-- Used by: scripts/service-metric-rollups.mjs (backfill + consistency check)
+--
+-- Rollup tables (logs with total_hours, by month of service_date):
+--   service_metrics_monthly            - month
+--   service_metrics_technician_monthly - (month, technician)
+--   service_metrics_type_monthly       - (month, boat size, complexity)
+-- Statement-level triggers on service_logs collect the months touched by
+-- each INSERT/UPDATE/DELETE (old and new month on updates) and recompute
+-- just those months, so MIN/MAX and distinct counts stay exact. A change to
+-- boats.length recomputes the months that boat was serviced in.
+--
+-- The 023 views stay as the live reference; the *_rollup views below return
+-- the same columns from the rollups. Switch Insight reads to the *_rollup
+-- views once `node scripts/service-metric-rollups.mjs --check` passes.
+-- Logs without a service_date are not in any rollup.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_service_logs_service_date_timed
+  ON service_logs(service_date)
+  WHERE total_hours IS NOT NULL;
+
+-- ============================================================================
+-- Rollup tables
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS service_metrics_monthly (
+  month_start DATE PRIMARY KEY,
+  total_services INTEGER NOT NULL,
+  total_hours NUMERIC NOT NULL,
+  unique_boats_serviced INTEGER NOT NULL,
+  unique_technicians INTEGER NOT NULL,
+  longest_service NUMERIC,
+  shortest_service NUMERIC,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- technician_id NULL = logs without a technician
+CREATE TABLE IF NOT EXISTS service_metrics_technician_monthly (
+  month_start DATE NOT NULL,
+  technician_id UUID,
+  services_completed INTEGER NOT NULL,
+  total_hours NUMERIC NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_service_metrics_technician_monthly_key
+  ON service_metrics_technician_monthly(month_start, technician_id);
+
+CREATE TABLE IF NOT EXISTS service_metrics_type_monthly (
+  month_start DATE NOT NULL,
+  boat_size_category TEXT NOT NULL,
+  service_complexity TEXT NOT NULL,
+  service_count INTEGER NOT NULL,
+  total_hours NUMERIC NOT NULL,
+  total_hours_squared NUMERIC NOT NULL,   -- for the stddev across months
+  min_hours NUMERIC,
+  max_hours NUMERIC,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (month_start, boat_size_category, service_complexity)
+);
+
+COMMENT ON TABLE service_metrics_monthly IS 'Monthly service time rollup - maintained by trigger from service_logs (migration 043)';
+COMMENT ON TABLE service_metrics_technician_monthly IS 'Per-technician monthly service time rollup - maintained by trigger from service_logs';
+COMMENT ON TABLE service_metrics_type_monthly IS 'Monthly service time rollup by boat size and complexity - maintained by trigger from service_logs';
+
+ALTER TABLE service_metrics_monthly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE service_metrics_technician_monthly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE service_metrics_type_monthly ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Staff can view monthly service metrics" ON service_metrics_monthly
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin', 'technician', 'contractor', 'viewer')
+  );
+
+-- Per-technician figures are for managers (see technician_efficiency)
+CREATE POLICY "Managers can view technician service metrics" ON service_metrics_technician_monthly
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin')
+  );
+
+CREATE POLICY "Staff can view service type metrics" ON service_metrics_type_monthly
+  FOR SELECT USING (
+    (SELECT get_user_role(auth.uid())) IN ('owner', 'admin', 'technician', 'contractor', 'viewer')
+  );
+
+-- ============================================================================
+-- Recompute months (NULL = every month: backfill)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION refresh_service_metric_rollups(p_months DATE[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  v_months DATE[];
+  v_month DATE;
+BEGIN
+  IF p_months IS NULL THEN
+    TRUNCATE service_metrics_monthly, service_metrics_technician_monthly, service_metrics_type_monthly;
+    SELECT ARRAY_AGG(DISTINCT DATE_TRUNC('month', service_date)::DATE)
+    INTO v_months
+    FROM service_logs
+    WHERE total_hours IS NOT NULL
+      AND service_date IS NOT NULL;
+  ELSE
+    SELECT ARRAY_AGG(DISTINCT DATE_TRUNC('month', m)::DATE ORDER BY DATE_TRUNC('month', m)::DATE)
+    INTO v_months
+    FROM unnest(p_months) AS m
+    WHERE m IS NOT NULL;
+  END IF;
+
+  IF v_months IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  -- Serialize refreshes of the same month (in month order - no deadlocks)
+  IF p_months IS NOT NULL THEN
+    FOREACH v_month IN ARRAY v_months LOOP
+      PERFORM pg_advisory_xact_lock(hashtext('service_metric_rollups'), (v_month - DATE '2000-01-01'));
+    END LOOP;
+
+    DELETE FROM service_metrics_monthly WHERE month_start = ANY(v_months);
+    DELETE FROM service_metrics_technician_monthly WHERE month_start = ANY(v_months);
+    DELETE FROM service_metrics_type_monthly WHERE month_start = ANY(v_months);
+  END IF;
+
+  CREATE TEMP TABLE service_metric_rollup_logs ON COMMIT DROP AS
+  SELECT
+    m.month_start,
+    sl.boat_id,
+    sl.technician_id,
+    sl.total_hours::NUMERIC AS total_hours,
+    CASE
+      WHEN b.length < 30 THEN 'Under 30ft'
+      WHEN b.length >= 30 AND b.length < 40 THEN '30-40ft'
+      WHEN b.length >= 40 AND b.length < 50 THEN '40-50ft'
+      WHEN b.length >= 50 THEN '50ft+'
+      ELSE 'Unknown Size'
+    END AS boat_size_category,
+    CASE
+      WHEN sl.notes IS NOT NULL AND LENGTH(sl.notes) > 100 THEN 'Complex'
+      ELSE 'Routine'
+    END AS service_complexity
+  FROM unnest(v_months) AS m(month_start)
+  JOIN service_logs sl
+    ON sl.service_date >= m.month_start
+   AND sl.service_date < m.month_start + INTERVAL '1 month'
+  LEFT JOIN boats b ON b.id = sl.boat_id
+  WHERE sl.total_hours IS NOT NULL;
+
+  INSERT INTO service_metrics_monthly (
+    month_start, total_services, total_hours, unique_boats_serviced, unique_technicians,
+    longest_service, shortest_service
+  )
+  SELECT
+    month_start,
+    COUNT(*),
+    SUM(total_hours),
+    COUNT(DISTINCT boat_id),
+    COUNT(DISTINCT technician_id),
+    MAX(total_hours),
+    MIN(total_hours)
+  FROM service_metric_rollup_logs
+  GROUP BY month_start;
+
+  INSERT INTO service_metrics_technician_monthly (month_start, technician_id, services_completed, total_hours)
+  SELECT month_start, technician_id, COUNT(*), SUM(total_hours)
+  FROM service_metric_rollup_logs
+  GROUP BY month_start, technician_id;
+
+  INSERT INTO service_metrics_type_monthly (
+    month_start, boat_size_category, service_complexity, service_count,
+    total_hours, total_hours_squared, min_hours, max_hours
+  )
+  SELECT
+    month_start,
+    boat_size_category,
+    service_complexity,
+    COUNT(*),
+    SUM(total_hours),
+    SUM(total_hours * total_hours),
+    MIN(total_hours),
+    MAX(total_hours)
+  FROM service_metric_rollup_logs
+  GROUP BY month_start, boat_size_category, service_complexity;
+
+  DROP TABLE service_metric_rollup_logs;
+
+  RETURN array_length(v_months, 1);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION refresh_service_metric_rollups IS 'Recompute the service metric rollups for the given months (NULL = full backfill); returns months refreshed';
+
+-- A NULL call truncates and rebuilds every rollup: owner / service_role only
+-- (the triggers below run as the owner)
+REVOKE EXECUTE ON FUNCTION refresh_service_metric_rollups(DATE[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_service_metric_rollups(DATE[]) TO service_role;
+
+-- ============================================================================
+-- Incremental maintenance
+-- ============================================================================
+CREATE OR REPLACE FUNCTION refresh_service_metric_rollups_from_logs()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_months DATE[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT ARRAY_AGG(DISTINCT DATE_TRUNC('month', service_date)::DATE)
+    INTO v_months
+    FROM new_rows
+    WHERE total_hours IS NOT NULL;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT ARRAY_AGG(DISTINCT DATE_TRUNC('month', service_date)::DATE)
+    INTO v_months
+    FROM old_rows
+    WHERE total_hours IS NOT NULL;
+  ELSE
+    -- Only rows whose rolled-up inputs changed; both the old and new month
+    SELECT ARRAY_AGG(DISTINCT DATE_TRUNC('month', changed.service_date)::DATE)
+    INTO v_months
+    FROM old_rows o
+    JOIN new_rows n ON n.id = o.id
+    CROSS JOIN LATERAL (VALUES (o.service_date), (n.service_date)) AS changed(service_date)
+    WHERE (o.total_hours IS NOT NULL OR n.total_hours IS NOT NULL)
+      AND (o.service_date, o.total_hours, o.technician_id, o.boat_id, o.notes)
+          IS DISTINCT FROM (n.service_date, n.total_hours, n.technician_id, n.boat_id, n.notes);
+  END IF;
+
+  IF v_months IS NOT NULL THEN
+    PERFORM refresh_service_metric_rollups(v_months);
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Transition tables need one trigger per event
+DROP TRIGGER IF EXISTS service_logs_metric_rollups_insert ON service_logs;
+CREATE TRIGGER service_logs_metric_rollups_insert
+  AFTER INSERT ON service_logs
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION refresh_service_metric_rollups_from_logs();
+
+DROP TRIGGER IF EXISTS service_logs_metric_rollups_update ON service_logs;
+CREATE TRIGGER service_logs_metric_rollups_update
+  AFTER UPDATE ON service_logs
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION refresh_service_metric_rollups_from_logs();
+
+DROP TRIGGER IF EXISTS service_logs_metric_rollups_delete ON service_logs;
+CREATE TRIGGER service_logs_metric_rollups_delete
+  AFTER DELETE ON service_logs
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION refresh_service_metric_rollups_from_logs();
+
+-- Boat size category comes from boats.length
+CREATE OR REPLACE FUNCTION refresh_service_metric_rollups_from_boat()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM refresh_service_metric_rollups(ARRAY(
+    SELECT DISTINCT DATE_TRUNC('month', service_date)::DATE
+    FROM service_logs
+    WHERE boat_id = NEW.id
+      AND total_hours IS NOT NULL
+      AND service_date IS NOT NULL
+  ));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS boats_metric_rollups ON boats;
+CREATE TRIGGER boats_metric_rollups
+  AFTER UPDATE OF length ON boats
+  FOR EACH ROW
+  WHEN (OLD.length IS DISTINCT FROM NEW.length)
+  EXECUTE FUNCTION refresh_service_metric_rollups_from_boat();
+
+-- ============================================================================
+-- Rollup-backed views (same columns as the 023 views)
+-- security_invoker: readers go through the rollup tables' RLS policies
+-- (technician figures stay managers-only)
+-- ============================================================================
+CREATE OR REPLACE VIEW technician_efficiency_rollup
+WITH (security_invoker = true) AS
+SELECT
+  r.technician_id,
+  u.full_name as technician_name,
+  SUM(r.services_completed)::BIGINT as services_completed,
+  SUM(r.total_hours) as total_hours_worked,
+  SUM(r.total_hours) / NULLIF(SUM(r.services_completed), 0) as avg_service_duration,
+  COALESCE(SUM(r.services_completed) FILTER (
+    WHERE r.month_start = DATE_TRUNC('month', CURRENT_DATE)
+  ), 0)::BIGINT as services_this_month,
+  SUM(r.total_hours) FILTER (
+    WHERE r.month_start = DATE_TRUNC('month', CURRENT_DATE)
+  ) as hours_this_month,
+  SUM(r.total_hours) FILTER (WHERE r.month_start = DATE_TRUNC('month', CURRENT_DATE))
+    / NULLIF(SUM(r.services_completed) FILTER (WHERE r.month_start = DATE_TRUNC('month', CURRENT_DATE)), 0)
+    as avg_duration_this_month
+FROM service_metrics_technician_monthly r
+LEFT JOIN users u ON u.id = r.technician_id
+GROUP BY r.technician_id, u.full_name;
+
+COMMENT ON VIEW technician_efficiency_rollup IS 'technician_efficiency from the monthly rollups. Managers only (security_invoker, rollup table RLS).';
+
+CREATE OR REPLACE VIEW monthly_service_metrics_rollup
+WITH (security_invoker = true) AS
+SELECT
+  EXTRACT(YEAR FROM month_start)::INTEGER as year,
+  EXTRACT(MONTH FROM month_start)::INTEGER as month,
+  month_start,
+  total_services::BIGINT as total_services,
+  total_hours,
+  total_hours / NULLIF(total_services, 0) as avg_duration,
+  unique_boats_serviced::BIGINT as unique_boats_serviced,
+  unique_technicians::BIGINT as unique_technicians,
+  longest_service,
+  shortest_service
+FROM service_metrics_monthly
+ORDER BY year DESC, month DESC;
+
+COMMENT ON VIEW monthly_service_metrics_rollup IS 'monthly_service_metrics from the monthly rollup table';
+
+CREATE OR REPLACE VIEW service_type_efficiency_rollup
+WITH (security_invoker = true) AS
+SELECT
+  boat_size_category,
+  service_complexity,
+  SUM(service_count)::BIGINT as service_count,
+  SUM(total_hours) / NULLIF(SUM(service_count), 0) as avg_hours,
+  SUM(total_hours) as total_hours,
+  MIN(min_hours) as min_hours,
+  MAX(max_hours) as max_hours,
+  CASE
+    WHEN SUM(service_count) > 1 THEN SQRT(GREATEST(
+      (SUM(total_hours_squared) - SUM(total_hours) ^ 2 / SUM(service_count)) / (SUM(service_count) - 1),
+      0
+    ))
+  END as hours_stddev
+FROM service_metrics_type_monthly
+GROUP BY boat_size_category, service_complexity
+ORDER BY boat_size_category, service_complexity;
+
+COMMENT ON VIEW service_type_efficiency_rollup IS 'service_type_efficiency from the monthly rollups';
+
+-- ============================================================================
+-- Initial backfill
+-- ============================================================================
+SELECT refresh_service_metric_rollups();
+
+COMMIT;
+
+-- Verification:
+-- SELECT * FROM monthly_service_metrics_rollup LIMIT 12;
+-- Rollups vs live views (all should return no rows):
+--   node scripts/service-metric-rollups.mjs --check
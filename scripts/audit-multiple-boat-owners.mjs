@@ -3,6 +3,8 @@
 /**
  * Audit all customers showing multiple boats
  * Check if they legitimately own multiple boats or if there are data errors
+ *
+ * For a fleet-wide check with a bulk fix plan, use scan-boat-ownership.mjs.
  */
 
 import { createClient } from '@supabase/supabase-js';
@@ -0,0 +1,154 @@
+#!/usr/bin/env node
+
+/**
+ * Bulk Load Benchmark
+ *
+ * Compares rows/sec for importing service_logs and service_orders:
+ *   - direct: batched INSERTs into the live tables (row triggers fire)
+ *   - bulk:   INSERT into *_staging + bulk_load_service_*() (migration 034)
+ *
+ * Every run happens inside a transaction that is rolled back, so it is safe
+ * against a local or staging database with real boats.
+ *
+ * Usage:
+ *   node scripts/benchmark-bulk-load.mjs [--rows=20000] [--batch-size=1000]
+ */
+
+import pg from 'pg';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const { values: args } = parseArgs({
+  options: {
+    'rows': { type: 'string', default: '20000' },
+    'batch-size': { type: 'string', default: '1000' },
+  },
+});
+
+const ROWS = parseInt(args.rows, 10);
+const BATCH_SIZE = parseInt(args['batch-size'], 10);
+
+const SERVICE_LOG_COLUMNS = `
+  boat_id uuid, customer_id uuid, service_date date,
+  service_started_at timestamp, service_ended_at timestamp,
+  notes text, data_source text
+`;
+
+const SERVICE_ORDER_COLUMNS = `
+  boat_id uuid, customer_id uuid, service_type text,
+  service_interval text, status text, created_at timestamptz
+`;
+
+function generateServiceLogs(boats) {
+  return Array.from({ length: ROWS }, (_, i) => {
+    const boat = boats[i % boats.length];
+    const start = new Date(Date.UTC(2020, 0, 1) + i * 3600 * 1000);
+    const end = new Date(start.getTime() + (30 + (i % 90)) * 60 * 1000);
+    return {
+      boat_id: boat.id,
+      customer_id: boat.customer_id,
+      service_date: start.toISOString().slice(0, 10),
+      service_started_at: start.toISOString(),
+      service_ended_at: end.toISOString(),
+      notes: `bulk load benchmark ${i}`,
+      data_source: 'manual',
+    };
+  });
+}
+
+function generateServiceOrders(boats) {
+  const intervals = ['1-mo', '2-mo', '3-mo', 'one-time'];
+  return Array.from({ length: ROWS }, (_, i) => {
+    const boat = boats[i % boats.length];
+    return {
+      boat_id: boat.id,
+      customer_id: boat.customer_id,
+      service_type: 'Hull Cleaning',
+      service_interval: intervals[i % intervals.length],
+      status: 'confirmed',
+      created_at: new Date(Date.UTC(2020, 0, 1) + i * 60 * 1000).toISOString(),
+    };
+  });
+}
+
+async function insertBatches(client, table, columns, rows) {
+  const names = columns.split(',').map(c => c.trim().split(/\s+/)[0]).join(', ');
+  for (let i = 0; i < rows.length; i += BATCH_SIZE) {
+    await client.query(
+      `INSERT INTO ${table} (${names})
+       SELECT ${names} FROM json_to_recordset($1) AS x(${columns})`,
+      [JSON.stringify(rows.slice(i, i + BATCH_SIZE))]
+    );
+  }
+}
+
+/**
+ * Time fn inside a rolled-back transaction; returns rows/sec
+ */
+async function timeRun(label, fn) {
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+    const started = process.hrtime.bigint();
+    await fn(client);
+    const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+    const rate = Math.round(ROWS / seconds);
+    console.log(`  ${label.padEnd(28)} ${seconds.toFixed(2)}s  ${rate.toLocaleString()} rows/sec`);
+    return rate;
+  } finally {
+    await client.query('ROLLBACK');
+    client.release();
+  }
+}
+
+async function benchmark() {
+  console.log(`⏱️  Bulk load benchmark (${ROWS} rows, batches of ${BATCH_SIZE})\n`);
+
+  try {
+    const { rows: boats } = await pool.query(
+      'SELECT id, customer_id FROM boats ORDER BY id LIMIT 1000'
+    );
+
+    if (boats.length === 0) {
+      console.error('❌ No boats found - seed the database first');
+      process.exitCode = 1;
+      return;
+    }
+
+    const serviceLogs = generateServiceLogs(boats);
+    const serviceOrders = generateServiceOrders(boats);
+
+    console.log('service_logs:');
+    const logsDirect = await timeRun('direct (row triggers)', client =>
+      insertBatches(client, 'service_logs', SERVICE_LOG_COLUMNS, serviceLogs));
+    const logsBulk = await timeRun('bulk (staged, set-based)', async client => {
+      await insertBatches(client, 'service_logs_staging', SERVICE_LOG_COLUMNS, serviceLogs);
+      await client.query('SELECT bulk_load_service_logs()');
+    });
+
+    console.log('\nservice_orders:');
+    const ordersDirect = await timeRun('direct (row triggers)', client =>
+      insertBatches(client, 'service_orders', SERVICE_ORDER_COLUMNS, serviceOrders));
+    const ordersBulk = await timeRun('bulk (staged, set-based)', async client => {
+      await insertBatches(client, 'service_orders_staging', SERVICE_ORDER_COLUMNS, serviceOrders);
+      await client.query('SELECT * FROM bulk_load_service_orders()');
+    });
+
+    console.log('\n' + '='.repeat(50));
+    console.log(`service_logs speedup:   ${(logsBulk / logsDirect).toFixed(2)}x`);
+    console.log(`service_orders speedup: ${(ordersBulk / ordersDirect).toFixed(2)}x`);
+    console.log('='.repeat(50) + '\n');
+  } catch (error) {
+    console.error('❌ Benchmark failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+benchmark();
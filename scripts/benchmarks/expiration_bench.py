@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Boat Expiration Benchmark
+
+Times the check-expiring-services pass against a synthetic fleet, all in
+one rolled-back transaction:
+  legacy     - the old edge function flow: query each window, then one
+               UPDATE/INSERT round trip per boat
+  set-based  - alert_expiring_one_time_boats_as_of() +
+               expire_one_time_boats_as_of() (migration 042; owner-only
+               variants of the RPCs, so connect as the database owner)
+  catch-up   - replays --days of daily runs skipping every --skip-th day and
+               checks that no boat was alerted twice for the same service and
+               that every expired boat whose alert window (days 25-29) had a
+               run was alerted first
+
+--boats random boats are made one_time_active with last_service spread
+over the last 60 days; nothing is committed.
+
+Usage:
+    python scripts/benchmarks/expiration_bench.py [--boats 2000] [--scale 10]
+        [--days 45] [--skip 2] [--label after-042]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from query_bench import connect, git_commit, load_scale
+
+ALERT_DAYS = 25
+EXPIRE_DAYS = 30
+
+
+def prepare(cursor, boats, seed):
+    cursor.execute('SELECT setseed(%s)', (seed / 1000,))
+    cursor.execute("""
+        UPDATE boats
+        SET plan_status = 'one_time_active', is_active = TRUE,
+            last_service = CURRENT_DATE - (random() * 60)::INTEGER
+        WHERE id IN (SELECT id FROM boats ORDER BY random() LIMIT %s)
+    """, (boats,))
+    return cursor.rowcount
+
+
+def legacy_pass(cursor):
+    """The pre-042 edge function, one statement per boat."""
+    round_trips = 2
+    cursor.execute("""
+        SELECT id, last_service, CURRENT_DATE - last_service FROM boats
+        WHERE plan_status = 'one_time_active' AND is_active = TRUE
+          AND last_service <= CURRENT_DATE - %s AND last_service >= CURRENT_DATE - %s
+    """, (ALERT_DAYS, ALERT_DAYS + 1))
+    alerted = cursor.fetchall()
+    for boat_id, last_service, days in alerted:
+        cursor.execute("""
+            INSERT INTO boat_status_history (boat_id, old_status, new_status, old_is_active, new_is_active, reason, notes)
+            VALUES (%s, 'one_time_active', 'one_time_active', TRUE, TRUE, 'Expiration alert - 5 days remaining', %s)
+        """, (boat_id, f'Boat will expire in 5 days. Last service: {last_service} ({days} days ago)'))
+        round_trips += 1
+
+    cursor.execute("""
+        SELECT id, last_service, CURRENT_DATE - last_service FROM boats
+        WHERE plan_status = 'one_time_active' AND is_active = TRUE
+          AND last_service <= CURRENT_DATE - %s
+    """, (EXPIRE_DAYS,))
+    expired = cursor.fetchall()
+    for boat_id, last_service, days in expired:
+        cursor.execute("""
+            UPDATE boats SET is_active = FALSE, plan_status = 'expired', status_changed_at = NOW(),
+                status_change_reason = 'Auto-expired after 30 days from one-time service completion',
+                updated_at = NOW()
+            WHERE id = %s
+        """, (boat_id,))
+        cursor.execute('UPDATE service_schedules SET is_active = FALSE, updated_at = NOW() '
+                       'WHERE boat_id = %s AND is_active = TRUE', (boat_id,))
+        cursor.execute("""
+            INSERT INTO boat_status_history (boat_id, old_status, new_status, old_is_active, new_is_active, reason, notes)
+            VALUES (%s, 'one_time_active', 'expired', TRUE, FALSE, 'Auto-expired after 30 days', %s)
+        """, (boat_id, f'One-time service completed {days} days ago on {last_service}. No new orders received.'))
+        round_trips += 3
+    return len(alerted), len(expired), round_trips
+
+
+def set_based_pass(cursor, as_of=None):
+    cursor.execute('SELECT boat_id, last_service FROM alert_expiring_one_time_boats_as_of(COALESCE(%s, CURRENT_DATE))',
+                   (as_of,))
+    alerted = cursor.fetchall()
+    cursor.execute('SELECT boat_id, last_service FROM expire_one_time_boats_as_of(COALESCE(%s, CURRENT_DATE))',
+                   (as_of,))
+    expired = cursor.fetchall()
+    return alerted, expired
+
+
+def timed(cursor, name, run):
+    cursor.execute(f'SAVEPOINT {name}')
+    started = time.perf_counter()
+    result = run()
+    elapsed = (time.perf_counter() - started) * 1000
+    cursor.execute(f'ROLLBACK TO SAVEPOINT {name}')
+    return result, round(elapsed, 2)
+
+
+def catch_up(cursor, days, skip):
+    """Daily runs from today with every skip-th day missed; returns (run days, violations)."""
+    today = date.today()
+    run_days = [today + timedelta(days=n) for n in range(days) if not skip or (n + 1) % skip]
+    alerts, expired = {}, {}
+    for as_of in run_days:
+        alerted_rows, expired_rows = set_based_pass(cursor, as_of)
+        for boat_id, last_service in alerted_rows:
+            alerts.setdefault((boat_id, last_service), []).append(as_of)
+        for boat_id, last_service in expired_rows:
+            expired[(boat_id, last_service)] = as_of
+
+    run_set = set(run_days)
+    duplicates = sum(1 for days_alerted in alerts.values() if len(days_alerted) > 1)
+    missed = 0
+    for (boat_id, last_service), expired_on in expired.items():
+        window = {last_service + timedelta(days=d) for d in range(ALERT_DAYS, EXPIRE_DAYS)}
+        if window & run_set and (boat_id, last_service) not in alerts:
+            missed += 1
+    return {
+        'run_days': len(run_days),
+        'alerted': len(alerts),
+        'expired': len(expired),
+        'duplicate_alerts': duplicates,
+        'expired_without_alert': missed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the one-time boat expiration pass')
+    parser.add_argument('--boats', type=int, default=2000, help='Boats to make one_time_active')
+    parser.add_argument('--scale', type=float, help='Load the synthetic fleet at this scale first')
+    parser.add_argument('--days', type=int, default=45, help='Days to replay for the catch-up check')
+    parser.add_argument('--skip', type=int, default=2, help='Miss every skip-th day in the replay (0 = none)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', default='expiration')
+    parser.add_argument('--results-dir', default='benchmark-results')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        print(f'🚤 Loading synthetic fleet at {args.scale:g}x...')
+        load_scale(args.scale, args.allow_remote)
+
+    connection = connect(args.allow_remote)
+    connection.autocommit = False
+    report = {
+        'label': args.label,
+        'git_commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    try:
+        with connection.cursor() as cursor:
+            report['boats'] = prepare(cursor, args.boats, args.seed)
+            cursor.execute('ANALYZE boats')
+            print(f"⏱️  {report['boats']} one_time_active boats (last service 0-60 days ago)")
+
+            (alerted, expired, round_trips), legacy_ms = timed(cursor, 'legacy', lambda: legacy_pass(cursor))
+            report['legacy'] = {'ms': legacy_ms, 'alerted': alerted, 'expired': expired, 'statements': round_trips}
+            print(f'   legacy     {legacy_ms:>9.2f}ms  alerted {alerted:>5}  expired {expired:>5}  '
+                  f'({round_trips} statements)')
+
+            (alerted_rows, expired_rows), set_ms = timed(cursor, 'set_based', lambda: set_based_pass(cursor))
+            report['set_based'] = {'ms': set_ms, 'alerted': len(alerted_rows), 'expired': len(expired_rows),
+                                   'statements': 2}
+            print(f'   set-based  {set_ms:>9.2f}ms  alerted {len(alerted_rows):>5}  expired {len(expired_rows):>5}  '
+                  f'(2 statements; alerts include days 26-29 the legacy window misses)')
+
+            check, catch_up_ms = timed(cursor, 'catch_up', lambda: catch_up(cursor, args.days, args.skip))
+            report['catch_up'] = {'ms': catch_up_ms, **check}
+            ok = check['duplicate_alerts'] == 0 and check['expired_without_alert'] == 0
+            print(f"   {'✅' if ok else '❌'} catch-up over {check['run_days']} runs: {check['alerted']} alerted, "
+                  f"{check['expired']} expired, {check['duplicate_alerts']} duplicate alerts, "
+                  f"{check['expired_without_alert']} expired without alert")
+    finally:
+        connection.rollback()
+        connection.close()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n✅ Results saved to {path} (all changes rolled back)')
+
+
+if __name__ == '__main__':
+    main()
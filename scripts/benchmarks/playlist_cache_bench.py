@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Playlist Cache Benchmark
+
+Measures the get-playlist-videos cache (migration 041) against a stubbed
+YouTube Data API, so no quota is spent and upstream latency is fixed.
+Starts the stub on --stub-port, then runs three phases against the local
+function:
+  cold   - --burst concurrent requests per playlist with an empty cache;
+           coalescing should make one upstream call per playlist
+  warm   - --requests spread over the playlists; all served from cache
+  stale  - (needs DATABASE_URL) marks the entries stale, repeats warm; each
+           playlist should be revalidated once in the background while
+           callers get the stale copy
+
+Reports p50/p95/p99 latency, X-Cache counts (HIT/STALE/MISS/COALESCED) and
+upstream calls per phase.
+
+Serve the function pointing at the stub (the functions container reaches
+the host via host.docker.internal), with supabase/.env.local containing
+    YOUTUBE_API_KEY=stub
+    YOUTUBE_API_BASE=http://host.docker.internal:8765
+and `supabase functions serve get-playlist-videos --env-file ./supabase/.env.local`.
+
+Usage:
+    python scripts/benchmarks/playlist_cache_bench.py [--playlists 20] [--burst 10]
+        [--requests 2000] [--concurrency 32] [--stub-latency-ms 250] [--label after-041]
+    python scripts/benchmarks/playlist_cache_bench.py --stub-only
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from query_bench import connect, git_commit, percentile
+
+LOCAL_FUNCTION_URL = 'http://localhost:54321/functions/v1/get-playlist-videos'
+PLAYLIST_PREFIX = 'bench-playlist-'
+
+
+class StubYouTube(ThreadingHTTPServer):
+    """playlistItems endpoint with fixed latency; counts calls per phase."""
+    daemon_threads = True
+
+    def __init__(self, port, latency_ms):
+        super().__init__(('0.0.0.0', port), StubHandler)
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def take_calls(self):
+        with self.lock:
+            calls, self.calls = self.calls, 0
+        return calls
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith('/playlistItems'):
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        playlist_id = query.get('playlistId', [''])[0]
+        max_results = int(query.get('maxResults', ['4'])[0])
+
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.latency_ms / 1000)
+
+        items = [{
+            'snippet': {
+                'title': f'{playlist_id} video {n}',
+                'description': 'Hull cleaning',
+                'publishedAt': f'2025-11-{n + 1:02d}T12:00:00Z',
+                'resourceId': {'videoId': f'{playlist_id[-6:]}{n:05d}'},
+                'thumbnails': {'medium': {'url': f'https://i.ytimg.com/vi/{playlist_id}/{n}.jpg'}},
+            },
+        } for n in range(max_results)]
+        body = json.dumps({'items': items}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get(url, key, playlist_id, max_results):
+    request = Request(f"{url}?{urlencode({'playlistId': playlist_id, 'maxResults': max_results})}",
+                      headers={'Authorization': f'Bearer {key}'})
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=30) as response:
+            status, cache = response.status, response.headers.get('X-Cache', '-')
+            response.read()
+    except HTTPError as e:
+        status, cache = e.code, '-'
+    except URLError:
+        status, cache = 'unreachable', '-'
+    return status, cache, (time.perf_counter() - started) * 1000
+
+
+def run_phase(name, requests, args, key, stub):
+    stub.take_calls()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda playlist: get(args.url, key, playlist, args.max_results), requests))
+    elapsed = time.perf_counter() - started
+    # Background revalidations finish after the responses
+    time.sleep(args.stub_latency_ms / 1000 + 1)
+
+    counts = {}
+    for status, cache, _ in results:
+        label = cache if status == 200 else str(status)
+        counts[label] = counts.get(label, 0) + 1
+    latencies = sorted(ms for _, _, ms in results)
+    result = {
+        'requests': len(requests),
+        'seconds': round(elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'responses': counts,
+        'upstream_calls': stub.take_calls(),
+    }
+    print(f"   {name:<6} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+          f"p99 {result['p99_ms']:>8.2f}ms  upstream {result['upstream_calls']:>5}  {counts}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the get-playlist-videos cache with a stubbed YouTube API')
+    parser.add_argument('--url', default=LOCAL_FUNCTION_URL)
+    parser.add_argument('--playlists', type=int, default=20)
+    parser.add_argument('--burst', type=int, default=10, help='Concurrent cold requests per playlist')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--max-results', type=int, default=4)
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--stub-latency-ms', type=int, default=250)
+    parser.add_argument('--stub-only', action='store_true', help='Only run the stub YouTube API')
+    parser.add_argument('--no-db', action='store_true', help='Skip the stale phase and cache cleanup')
+    parser.add_argument('--seed', type=int, default=41)
+    parser.add_argument('--label', default='playlist-cache')
+    parser.add_argument('--results-dir', default='benchmark-results')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    stub = StubYouTube(args.stub_port, args.stub_latency_ms)
+    print(f'📺 Stub YouTube API on :{args.stub_port} ({args.stub_latency_ms}ms per call)')
+    if args.stub_only:
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    key = os.environ.get('SUPABASE_ANON_KEY') or os.environ.get('VITE_SUPABASE_ANON_KEY')
+    if not key:
+        print('❌ Set SUPABASE_ANON_KEY (from `supabase status`)')
+        return
+
+    connection = None if args.no_db else connect(args.allow_remote)
+    cursor = connection.cursor() if connection else None
+    if cursor:
+        cursor.execute('DELETE FROM youtube_playlist_cache WHERE playlist_id LIKE %s', (PLAYLIST_PREFIX + '%',))
+
+    rng = random.Random(args.seed)
+    # Fresh playlist IDs per run, so the cold phase is cold even with --no-db
+    run_id = uuid.uuid4().hex[:8]
+    playlists = [f'{PLAYLIST_PREFIX}{run_id}-{n:03d}' for n in range(args.playlists)]
+    cold = [playlist for playlist in playlists for _ in range(args.burst)]
+    rng.shuffle(cold)
+    warm = [rng.choice(playlists) for _ in range(args.requests)]
+
+    print(f'⏱️  {args.playlists} playlists against {args.url}')
+    phases = {
+        'cold': run_phase('cold', cold, args, key, stub),
+        'warm': run_phase('warm', warm, args, key, stub),
+    }
+    if cursor:
+        cursor.execute('UPDATE youtube_playlist_cache SET fresh_until = NOW() WHERE playlist_id LIKE %s',
+                       (f'{PLAYLIST_PREFIX}{run_id}-%',))
+        phases['stale'] = run_phase('stale', warm, args, key, stub)
+        cursor.execute('DELETE FROM youtube_playlist_cache WHERE playlist_id LIKE %s', (PLAYLIST_PREFIX + '%',))
+        connection.close()
+    stub.shutdown()
+
+    report = {
+        'label': args.label,
+        'git_commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'playlists': args.playlists,
+        'stub_latency_ms': args.stub_latency_ms,
+        'phases': phases,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n✅ Results saved to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Scheduling Queue Reconciliation Benchmark
+
+Times queueing pending service orders (migration 044) at --orders pending
+orders (default 100k), all in one rolled-back transaction:
+  legacy   - the old sync-orders-to-queue.mjs flow: fetch pending orders,
+             fetch their queue entries, insert the missing ones from the
+             client in pages
+  rpc      - enqueue_pending_service_orders() with nothing queued yet
+  steady   - the same RPC again with everything queued (the anti-join only;
+             must create 0 entries)
+  trigger  - --single-inserts one-row order inserts with the
+             service_orders_enqueue trigger off vs on (per-insert overhead)
+
+Orders are generated against existing boats (load the synthetic fleet with
+--scale first on an empty database); nothing is committed.
+
+Usage:
+    python scripts/benchmarks/queue_reconcile_bench.py [--orders 100000]
+        [--single-inserts 500] [--scale 1] [--label after-044]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from query_bench import connect, git_commit, load_scale
+
+PAGE_SIZE = 1000
+
+INSERT_ORDERS = """
+    WITH fleet AS (
+        SELECT ARRAY_AGG(id) AS boat_ids, ARRAY_AGG(customer_id) AS customer_ids, COUNT(*) AS boats
+        FROM boats
+    )
+    INSERT INTO service_orders (id, order_number, customer_id, boat_id, service_type, service_interval,
+                                status, created_at)
+    SELECT gen_random_uuid(), 'BENCH-' || %(run)s || '-' || n,
+           fleet.customer_ids[1 + n %% fleet.boats], fleet.boat_ids[1 + n %% fleet.boats],
+           'Hull Cleaning', 'one-time', 'pending', NOW() - n * INTERVAL '1 second'
+    FROM generate_series(%(start)s, %(start)s + %(count)s - 1) AS n, fleet
+"""
+
+
+def insert_orders(cursor, run, start, count):
+    cursor.execute(INSERT_ORDERS, {'run': run, 'start': start, 'count': count})
+    return cursor.rowcount
+
+
+def legacy_sync(cursor):
+    """Pre-044 client-side flow; returns (entries created, statements)."""
+    from psycopg2.extras import execute_values
+
+    cursor.execute("""
+        SELECT id, customer_id, boat_id, service_type, notes, created_at
+        FROM service_orders WHERE status = 'pending' AND scheduled_date IS NULL
+    """)
+    orders = cursor.fetchall()
+    cursor.execute('SELECT scheduled_service_order_id FROM scheduling_queue WHERE scheduled_service_order_id = ANY(%s::uuid[])',
+                   ([str(order[0]) for order in orders],))
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = [order for order in orders if order[0] not in existing]
+
+    statements = 2
+    for page in range(0, len(missing), PAGE_SIZE):
+        execute_values(cursor, """
+            INSERT INTO scheduling_queue (customer_id, boat_id, service_type, priority, notes, status, added_at)
+            VALUES %s
+        """, [(customer_id, boat_id, service_type or 'Hull Cleaning', 'normal', notes, 'pending', created_at)
+              for _, customer_id, boat_id, service_type, notes, created_at in missing[page:page + PAGE_SIZE]],
+            page_size=PAGE_SIZE)
+        statements += 1
+    return len(missing), statements
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def single_inserts(cursor, run, start, count):
+    started = time.perf_counter()
+    for n in range(start, start + count):
+        insert_orders(cursor, run, n, 1)
+    return round((time.perf_counter() - started) * 1000 / count, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scheduling queue reconciliation')
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--single-inserts', type=int, default=500)
+    parser.add_argument('--scale', type=float, help='Load the synthetic fleet at this scale first')
+    parser.add_argument('--label', default='queue-reconcile')
+    parser.add_argument('--results-dir', default='benchmark-results')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        print(f'🚤 Loading synthetic fleet at {args.scale:g}x...')
+        load_scale(args.scale, args.allow_remote)
+
+    connection = connect(args.allow_remote)
+    connection.autocommit = False
+    run = datetime.now().strftime('%H%M%S')
+    report = {
+        'label': args.label,
+        'git_commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'orders': args.orders,
+    }
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE service_orders DISABLE TRIGGER service_orders_enqueue')
+            print(f'📦 Inserting {args.orders} pending orders...')
+            insert_orders(cursor, run, 0, args.orders)
+            cursor.execute('SELECT COUNT(*) FROM service_orders WHERE status = %s AND scheduled_date IS NULL',
+                           ('pending',))
+            report['pending_orders'] = cursor.fetchone()[0]
+            cursor.execute('ANALYZE service_orders')
+            cursor.execute('ANALYZE scheduling_queue')
+            print(f"⏱️  {report['pending_orders']} pending unscheduled orders")
+
+            cursor.execute('SAVEPOINT legacy')
+            (created, statements), legacy_ms = timed(lambda: legacy_sync(cursor))
+            cursor.execute('ROLLBACK TO SAVEPOINT legacy')
+            report['legacy'] = {'ms': legacy_ms, 'created': created, 'statements': statements}
+            print(f'   legacy   {legacy_ms:>10.2f}ms  created {created:>7}  ({statements} statements)')
+
+            (_, rpc_ms) = timed(lambda: cursor.execute('SELECT enqueue_pending_service_orders()'))
+            created = cursor.fetchone()[0]
+            report['rpc'] = {'ms': rpc_ms, 'created': created, 'statements': 1}
+            print(f'   rpc      {rpc_ms:>10.2f}ms  created {created:>7}  (1 statement)')
+
+            (_, steady_ms) = timed(lambda: cursor.execute('SELECT enqueue_pending_service_orders()'))
+            again = cursor.fetchone()[0]
+            report['steady'] = {'ms': steady_ms, 'created': again}
+            print(f"   {'✅' if again == 0 else '❌'} steady  {steady_ms:>10.2f}ms  created {again:>7}  (rerun is a no-op)")
+
+            if args.single_inserts:
+                without = single_inserts(cursor, run, args.orders, args.single_inserts)
+                cursor.execute('SELECT enqueue_pending_service_orders()')
+                cursor.execute('ALTER TABLE service_orders ENABLE TRIGGER service_orders_enqueue')
+                with_trigger = single_inserts(cursor, run, args.orders + args.single_inserts, args.single_inserts)
+                cursor.execute("""
+                    SELECT COUNT(*) FROM service_orders o
+                    WHERE o.order_number LIKE %s
+                      AND NOT EXISTS (SELECT 1 FROM scheduling_queue q WHERE q.service_order_id = o.id)
+                """, (f'BENCH-{run}-%',))
+                unqueued = cursor.fetchone()[0]
+                report['trigger'] = {'insert_ms_without': without, 'insert_ms_with': with_trigger,
+                                     'unqueued_after_trigger': unqueued}
+                print(f"   {'✅' if unqueued == 0 else '❌'} trigger {without:.3f} → {with_trigger:.3f}ms "
+                      f'per single-row insert ({unqueued} benchmark orders unqueued)')
+    finally:
+        connection.rollback()
+        connection.close()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n✅ Results saved to {path} (all changes rolled back)')
+
+
+if __name__ == '__main__':
+    main()
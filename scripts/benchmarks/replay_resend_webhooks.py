@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Resend Webhook Replay Harness
+
+Fires a burst of Resend webhook events at the local resend-webhook function
+and reports:
+  - ingestion throughput (events/s) and p50/p95/p99 response latency
+  - HTTP status counts
+  - with database access: events stored vs unique events sent (duplicate
+    deliveries must be ignored) and how long the fold into email_logs took
+    to drain the backlog (migration 040)
+
+Events come from a recorded JSONL file (one payload per line, or
+{"headers": {...}, "body": {...}}) or are synthesized as a campaign burst
+against email_logs rows that have a resend_id (e.g. the synthetic fleet from
+scripts/notion-import/generate_fleet.py).
+
+Usage:
+    python scripts/benchmarks/replay_resend_webhooks.py --synthesize 5000
+        [--concurrency 32] [--duplicates 0.1] [--fold] [--label before-040]
+    python scripts/benchmarks/replay_resend_webhooks.py --events recorded.jsonl
+        [--url http://localhost:54321/functions/v1/resend-webhook]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from query_bench import connect, git_commit, percentile
+
+LOCAL_FUNCTION_URL = 'http://localhost:54321/functions/v1/resend-webhook'
+
+# Share of delivered emails that produce each engagement event
+OPEN_RATE = 0.6
+CLICK_RATE = 0.25
+BOUNCE_RATE = 0.03
+COMPLAINT_RATE = 0.005
+
+
+def load_recorded(path):
+    events = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'body' in record:
+                events.append((record.get('headers', {}), record['body']))
+            else:
+                events.append(({}, record))
+    return events
+
+
+def event(event_type, email_id, at, **data):
+    headers = {'svix-id': f'msg_{uuid.uuid4().hex}'}
+    body = {
+        'type': event_type,
+        'created_at': at.isoformat(),
+        'data': {'email_id': email_id, **data},
+    }
+    return headers, body
+
+
+def synthesize(resend_ids, count, rng):
+    """Campaign burst: delivered, then opens/clicks/bounces/complaints."""
+    events = []
+    now = datetime.now(timezone.utc)
+    while len(events) < count:
+        email_id = rng.choice(resend_ids)
+        at = now - timedelta(seconds=rng.randint(0, 3600))
+        if rng.random() < BOUNCE_RATE:
+            events.append(event('email.bounced', email_id, at, bounced_at=at.isoformat(),
+                                reason='Mailbox does not exist'))
+            continue
+        events.append(event('email.delivered', email_id, at))
+        if rng.random() < OPEN_RATE:
+            opened = at + timedelta(minutes=rng.randint(1, 120))
+            events.append(event('email.opened', email_id, opened, opened_at=opened.isoformat()))
+            if rng.random() < CLICK_RATE:
+                for _ in range(rng.randint(1, 3)):
+                    clicked = opened + timedelta(seconds=rng.randint(5, 600))
+                    events.append(event('email.clicked', email_id, clicked, clicked_at=clicked.isoformat()))
+        if rng.random() < COMPLAINT_RATE:
+            events.append(event('email.complained', email_id, at, complained_at=at.isoformat()))
+    return events[:count]
+
+
+def with_duplicates(events, fraction, rng):
+    """Re-deliver a share of events with the same svix-id, as Svix retries do."""
+    duplicates = rng.sample(events, int(len(events) * fraction))
+    replay = events + duplicates
+    rng.shuffle(replay)
+    return replay
+
+
+def send(url, key, headers, body):
+    request = Request(url, data=json.dumps(body).encode(), method='POST', headers={
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {key}',
+        **headers,
+    })
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=30) as response:
+            status = response.status
+    except HTTPError as e:
+        status = e.code
+    except URLError:
+        status = 'unreachable'
+    return status, (time.perf_counter() - started) * 1000
+
+
+def replay(events, args, key):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda e: send(args.url, key, *e), events))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latencies = sorted(ms for _, ms in results)
+    return {
+        'sent': len(events),
+        'seconds': round(elapsed, 2),
+        'events_per_second': round(len(events) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'statuses': statuses,
+    }
+
+
+def pending_events(cursor):
+    cursor.execute('SELECT COUNT(*) FROM resend_webhook_events WHERE processed_at IS NULL')
+    return cursor.fetchone()[0]
+
+
+def matched_pending(cursor):
+    """Pending events whose email_logs row exists (what the fold still owes)."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM resend_webhook_events w
+        WHERE w.processed_at IS NULL
+          AND EXISTS (SELECT 1 FROM email_logs e WHERE e.resend_id = w.resend_id)
+    """)
+    return cursor.fetchone()[0]
+
+
+def drain(cursor, fold, timeout):
+    """Seconds until no matched event is pending (calling the fold ourselves with --fold)."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if fold:
+            cursor.execute('SELECT * FROM fold_resend_webhook_events(5000)')
+            events = cursor.fetchone()[0]
+        if matched_pending(cursor) == 0:
+            return round(time.perf_counter() - started, 2)
+        if not fold or events == 0:
+            time.sleep(0.5)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Resend webhook bursts at the local function')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--events', help='Recorded events (JSONL)')
+    source.add_argument('--synthesize', type=int, help='Number of events to synthesize from email_logs')
+    parser.add_argument('--url', default=LOCAL_FUNCTION_URL)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duplicates', type=float, default=0.1, help='Share of events delivered twice')
+    parser.add_argument('--fold', action='store_true', help='Fold events from here instead of waiting for the function/pg_cron')
+    parser.add_argument('--drain-timeout', type=float, default=120)
+    parser.add_argument('--no-db', action='store_true', help='Only measure HTTP ingestion')
+    parser.add_argument('--seed', type=int, default=40)
+    parser.add_argument('--label', default='replay')
+    parser.add_argument('--results-dir', default='benchmark-results')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    key = os.environ.get('SUPABASE_ANON_KEY') or os.environ.get('VITE_SUPABASE_ANON_KEY')
+    if not key:
+        print('❌ Set SUPABASE_ANON_KEY (from `supabase status`)')
+        return
+    if not args.url.startswith(('http://localhost', 'http://127.0.0.1')) and not args.allow_remote:
+        print(f'❌ {args.url} is not the local function - pass --allow-remote to override')
+        return
+
+    rng = random.Random(args.seed)
+    connection = None if args.no_db else connect(args.allow_remote)
+    cursor = connection.cursor() if connection else None
+
+    if args.events:
+        events = load_recorded(args.events)
+    else:
+        if not cursor:
+            print('❌ --synthesize reads resend_ids from email_logs and needs the database')
+            return
+        cursor.execute('SELECT resend_id FROM email_logs WHERE resend_id IS NOT NULL LIMIT 100000')
+        resend_ids = [row[0] for row in cursor.fetchall()]
+        if not resend_ids:
+            print('❌ No email_logs with a resend_id - load the synthetic fleet first')
+            return
+        events = synthesize(resend_ids, args.synthesize, rng)
+
+    stored_before = None
+    if cursor:
+        cursor.execute('SELECT COUNT(*) FROM resend_webhook_events')
+        stored_before = cursor.fetchone()[0]
+
+    burst = with_duplicates(events, args.duplicates, rng)
+    print(f'📨 Replaying {len(burst)} deliveries ({len(events)} unique) at {args.url} '
+          f'with {args.concurrency} workers')
+    result = replay(burst, args, key)
+    print(f"   {result['events_per_second']} events/s  p50 {result['p50_ms']}ms  "
+          f"p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  statuses {result['statuses']}")
+
+    if cursor:
+        cursor.execute('SELECT COUNT(*) FROM resend_webhook_events')
+        result['stored'] = cursor.fetchone()[0] - stored_before
+        result['unique'] = len(events)
+        flag = '✅' if result['stored'] <= result['unique'] else '⚠️ '
+        print(f"   {flag} {result['stored']} events stored for {result['unique']} unique "
+              f"({len(burst) - len(events)} duplicate deliveries)")
+
+        result['drain_seconds'] = drain(cursor, args.fold, args.drain_timeout)
+        result['pending_after_drain'] = pending_events(cursor)
+        if result['drain_seconds'] is None:
+            print(f'   ⚠️  Backlog not drained after {args.drain_timeout:g}s')
+        else:
+            print(f"   ✓ Folded into email_logs in {result['drain_seconds']}s "
+                  f"({result['pending_after_drain']} unmatched still pending)")
+        connection.close()
+
+    report = {
+        'label': args.label,
+        'git_commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'concurrency': args.concurrency,
+        'replay': result,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n✅ Results saved to {path}')
+
+
+if __name__ == '__main__':
+    main()
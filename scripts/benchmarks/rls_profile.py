@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+RLS Policy Cost Profiler
+
+Runs the same full-table read on each RLS-protected table as the
+connection role (RLS bypassed - the baseline) and as an owner, admin,
+viewer and customer JWT, then reports per table and role:
+  - rows visible and p50/p95 latency
+  - RLS overhead: p50 minus the baseline p50
+  - how the policy functions are evaluated: 'per-row' when
+    get_user_role()/get_user_metadata() appear in a scan Filter, 'initplan'
+    when they were hoisted into InitPlans (migration 036)
+
+Results are saved in the query_bench.py format, so a run before and after a
+policy migration is compared with `query_bench.py compare`.
+
+Usage:
+    python scripts/benchmarks/rls_profile.py [--label before-036] [--scales 1,10]
+        [--runs 20] [--owner-user UUID] [--admin-user UUID] [--viewer-user UUID]
+        [--customer-user UUID] [--results-dir benchmark-results]
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+from query_bench import ANALYZE_TABLES, connect, git_commit, impersonate, load_scale, run_query, table_sizes
+
+TABLES = [
+    'customers',
+    'boats',
+    'service_logs',
+    'service_orders',
+    'invoices',
+    'customer_messages',
+    'service_requests',
+    'cleaning_time_intervals',
+    'cleaning_frequency_formulas',
+    'cleaning_frequency_overrides',
+]
+
+STAFF_ROLES = ['owner', 'admin', 'viewer']
+POLICY_FUNCTIONS = ('get_user_role', 'get_user_metadata')
+
+
+def find_users(cursor, args):
+    """role → (user id, JWT user_type); staff from users, customer from auth.users."""
+    users = {}
+    for role in STAFF_ROLES:
+        user_id = getattr(args, f'{role}_user')
+        if not user_id:
+            cursor.execute('SELECT id::text FROM users WHERE role = %s AND active = true LIMIT 1', (role,))
+            row = cursor.fetchone()
+            user_id = row[0] if row else None
+        if user_id:
+            users[role] = (user_id, 'staff')
+
+    customer_id = args.customer_user
+    if not customer_id:
+        cursor.execute('SELECT id::text FROM auth.users WHERE id NOT IN (SELECT id FROM users) LIMIT 1')
+        row = cursor.fetchone()
+        customer_id = row[0] if row else None
+    if customer_id:
+        users['customer'] = (customer_id, 'customer')
+    return users
+
+
+def evaluation_mode(stats):
+    if any(name in f for f in stats['filters'] for name in POLICY_FUNCTIONS):
+        return 'per-row'
+    return 'initplan' if stats['initplans'] else '-'
+
+
+def profile(connection, args):
+    with connection.cursor() as cursor:
+        for table in ANALYZE_TABLES:
+            cursor.execute(f'ANALYZE {table}')
+        users = find_users(cursor, args)
+        sizes = table_sizes(cursor)
+        cursor.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s) AND relkind = 'r'", (TABLES,))
+        existing = {row[0] for row in cursor.fetchall()}
+
+    missing = [role for role in STAFF_ROLES + ['customer'] if role not in users]
+    if missing:
+        print(f'   ⚠️  No user for {", ".join(missing)} - pass --<role>-user to include')
+
+    results = {}
+    print(f"\n   {'table':<30} {'role':<9} {'rows':>8} {'p50 ms':>9} {'p95 ms':>9} {'overhead':>10}  eval")
+    for table in TABLES:
+        if table not in existing:
+            print(f'   {table:<30} (table not found)')
+            continue
+        sql = f'SELECT COUNT(*) FROM {table}'
+        baseline = run_query(connection, sql, {}, None, None, args.runs, args.warmup)
+        baseline['visible_rows'] = count_visible(connection, sql, None, None)
+        results[f'rls.{table}.baseline'] = baseline
+        print(f"   {table:<30} {'baseline':<9} {baseline['visible_rows']:>8} "
+              f"{baseline['p50_ms']:>9.2f} {baseline['p95_ms']:>9.2f} {'':>10}")
+
+        for role, (user_id, user_type) in users.items():
+            try:
+                stats = run_query(connection, sql, {}, user_id, user_type, args.runs, args.warmup)
+            except Exception as error:
+                print(f'   {"":<30} {role:<9} ❌ {str(error).strip().splitlines()[0]}')
+                continue
+            stats['visible_rows'] = count_visible(connection, sql, user_id, user_type)
+            stats['overhead_ms'] = round(stats['p50_ms'] - baseline['p50_ms'], 3)
+            stats['evaluation'] = evaluation_mode(stats)
+            results[f'rls.{table}.{role}'] = stats
+            print(f"   {'':<30} {role:<9} {stats['visible_rows']:>8} {stats['p50_ms']:>9.2f} "
+                  f"{stats['p95_ms']:>9.2f} {stats['overhead_ms']:>+10.2f}  {stats['evaluation']}")
+
+    per_row = sorted({key.split('.')[1] for key, s in results.items() if s.get('evaluation') == 'per-row'})
+    if per_row:
+        print(f'\n   ⚠️  Policy functions evaluated per row on: {", ".join(per_row)}')
+        print('      Wrap them in (SELECT ...) - see migrations/036_initplan_staff_rls_policies.sql')
+    return {'table_rows': sizes, 'queries': results}
+
+
+def count_visible(connection, sql, user_id, user_type):
+    """Rows the policies let through (the plan only shows COUNT(*)'s one row)."""
+    connection.autocommit = False
+    try:
+        with connection.cursor() as cursor:
+            if user_id:
+                impersonate(cursor, user_id, user_type)
+            cursor.execute(sql)
+            return cursor.fetchone()[0]
+    finally:
+        connection.rollback()
+        connection.autocommit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile RLS policy overhead per table and role')
+    parser.add_argument('--label', default='rls')
+    parser.add_argument('--scales', help='Comma-separated synthetic fleet scales, e.g. 1,10')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    for role in STAFF_ROLES + ['customer']:
+        parser.add_argument(f'--{role}-user', help=f'User id to run as {role}')
+    parser.add_argument('--results-dir', default='benchmark-results')
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+
+    scales = [float(s) for s in args.scales.split(',')] if args.scales else [None]
+    connection = connect(args.allow_remote)
+    report = {
+        'label': args.label,
+        'git_commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'runs': args.runs,
+        'scales': {},
+    }
+    try:
+        for scale in scales:
+            key = 'current' if scale is None else f'{scale:g}x'
+            if scale is not None:
+                print(f'\n🚤 Loading synthetic fleet at {key}...')
+                load_scale(scale, args.allow_remote)
+            print(f'\n🔐 Profiling RLS ({key})')
+            report['scales'][key] = profile(connection, args)
+    finally:
+        connection.close()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n✅ Results saved to {path}')
+    print(f'   Compare with: python scripts/benchmarks/query_bench.py compare <before.json> {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env node
+
+/**
+ * Deduplicate Service Logs (set-based, batched, resumable)
+ *
+ * Replaces the NOT IN (SELECT id FROM service_logs_to_keep) approach in
+ * deduplicate-service-logs.sql. Keeps the FIRST record (earliest created_at)
+ * for each boat_id + service_date combination.
+ *
+ * 1. Plan: one streaming pass over service_logs (window over a hashed
+ *    boat_id|service_date key) writes every duplicate and its keeper into
+ *    service_log_dedup_queue under a run ID.
+ * 2. Report: the plan is streamed to a CSV diff (keep_id → delete_id).
+ * 3. Delete: bounded batches, each its own short transaction, using
+ *    DELETE ... USING joins and a NOT EXISTS-style keeper check. Progress is
+ *    recorded per row, so an interrupted run resumes where it stopped.
+ *
+ * Usage:
+ *   node scripts/deduplicate-service-logs.mjs --dry-run
+ *   node scripts/deduplicate-service-logs.mjs [--batch-size=500]
+ *   node scripts/deduplicate-service-logs.mjs --resume=<run_id>
+ *
+ * --dry-run plans and reports inside one transaction that is rolled back,
+ * so it leaves no queue table or saved plan behind.
+ */
+
+import pg from 'pg';
+import { createWriteStream } from 'fs';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const { values: args } = parseArgs({
+  options: {
+    'dry-run': { type: 'boolean', default: false },
+    'batch-size': { type: 'string', default: '500' },
+    'resume': { type: 'string' },
+    'report': { type: 'string' },
+  },
+});
+
+const DRY_RUN = args['dry-run'];
+const BATCH_SIZE = parseInt(args['batch-size'], 10);
+const REPORT_PAGE_SIZE = 5000;
+
+async function ensureQueueTable(db) {
+  await db.query(`
+    CREATE TABLE IF NOT EXISTS service_log_dedup_queue (
+      run_id TEXT NOT NULL,
+      id UUID NOT NULL,
+      keep_id UUID NOT NULL,
+      dedup_key BIGINT NOT NULL,
+      boat_id UUID NOT NULL,
+      service_date DATE NOT NULL,
+      processed_at TIMESTAMP WITH TIME ZONE,
+      deleted BOOLEAN,
+      PRIMARY KEY (run_id, id)
+    )
+  `);
+  await db.query(`
+    CREATE INDEX IF NOT EXISTS idx_service_log_dedup_queue_pending
+      ON service_log_dedup_queue(run_id, id)
+      WHERE processed_at IS NULL
+  `);
+}
+
+/**
+ * Single pass: rank rows within each hashed key, queue everything but the first
+ */
+async function planRun(db, runId) {
+  const { rowCount } = await db.query(`
+    INSERT INTO service_log_dedup_queue (run_id, id, keep_id, dedup_key, boat_id, service_date)
+    SELECT $1, id, keep_id, dedup_key, boat_id, service_date
+    FROM (
+      SELECT
+        id,
+        boat_id,
+        service_date,
+        hashtextextended(boat_id::text || '|' || service_date::text, 0) AS dedup_key,
+        FIRST_VALUE(id) OVER w AS keep_id,
+        ROW_NUMBER() OVER w AS row_num
+      FROM service_logs
+      WHERE boat_id IS NOT NULL
+        AND service_date IS NOT NULL
+      WINDOW w AS (
+        PARTITION BY hashtextextended(boat_id::text || '|' || service_date::text, 0), boat_id, service_date
+        ORDER BY created_at ASC, id ASC
+      )
+    ) ranked
+    WHERE row_num > 1
+  `, [runId]);
+
+  return rowCount;
+}
+
+/**
+ * Stream the plan to a CSV diff using keyset pagination
+ */
+async function writeReport(db, runId, path) {
+  const out = createWriteStream(path);
+  out.write('dedup_key,boat_id,service_date,keep_id,delete_id\n');
+
+  let lastId = '00000000-0000-0000-0000-000000000000';
+  let written = 0;
+
+  while (true) {
+    const { rows } = await db.query(`
+      SELECT dedup_key, boat_id, service_date::text AS service_date, keep_id, id
+      FROM service_log_dedup_queue
+      WHERE run_id = $1 AND id > $2
+      ORDER BY id
+      LIMIT $3
+    `, [runId, lastId, REPORT_PAGE_SIZE]);
+
+    if (rows.length === 0) break;
+
+    for (const row of rows) {
+      out.write(`${row.dedup_key},${row.boat_id},${row.service_date},${row.keep_id},${row.id}\n`);
+    }
+    written += rows.length;
+    lastId = rows[rows.length - 1].id;
+  }
+
+  await new Promise(resolve => out.end(resolve));
+  return written;
+}
+
+/**
+ * Delete one bounded batch; returns number of queue rows processed
+ */
+async function deleteBatch(db, runId) {
+  const { rows } = await db.query(`
+    WITH batch AS (
+      SELECT q.id, q.keep_id
+      FROM service_log_dedup_queue q
+      WHERE q.run_id = $1
+        AND q.processed_at IS NULL
+      ORDER BY q.id
+      LIMIT $2
+      FOR UPDATE SKIP LOCKED
+    ),
+    deleted AS (
+      DELETE FROM service_logs s
+      USING batch b
+      WHERE s.id = b.id
+        -- Never delete a duplicate whose keeper has since disappeared
+        AND EXISTS (SELECT 1 FROM service_logs k WHERE k.id = b.keep_id)
+      RETURNING s.id
+    )
+    UPDATE service_log_dedup_queue q
+    SET processed_at = NOW(),
+        deleted = EXISTS (SELECT 1 FROM deleted d WHERE d.id = q.id)
+    FROM batch b
+    WHERE q.run_id = $1 AND q.id = b.id
+    RETURNING q.deleted
+  `, [runId, BATCH_SIZE]);
+
+  return {
+    processed: rows.length,
+    deleted: rows.filter(r => r.deleted).length,
+  };
+}
+
+async function deduplicate() {
+  console.log('🧹 Deduplicating service_logs (boat_id + service_date)\n');
+  console.log(DRY_RUN ? '🔍 DRY RUN MODE - No rows will be deleted\n' : '');
+
+  if (DRY_RUN && args.resume) {
+    console.error('❌ --dry-run cannot be combined with --resume (it would touch a saved plan)');
+    process.exitCode = 1;
+    await pool.end();
+    return;
+  }
+
+  const db = await pool.connect();
+
+  try {
+    if (DRY_RUN) {
+      // Everything below, including the queue table, is rolled back
+      await db.query('BEGIN');
+    }
+
+    await ensureQueueTable(db);
+
+    let runId = args.resume;
+
+    if (runId) {
+      console.log(`↻ Resuming run ${runId}`);
+    } else {
+      runId = `dedup-${Date.now()}`;
+      console.log(`1️⃣  Planning run ${runId}...`);
+      const queued = await planRun(db, runId);
+      console.log(`   ✅ ${queued} duplicate rows queued`);
+    }
+
+    const { rows: [summary] } = await db.query(`
+      SELECT
+        COUNT(*) AS total,
+        COUNT(DISTINCT dedup_key) AS groups,
+        COUNT(*) FILTER (WHERE processed_at IS NULL) AS pending
+      FROM service_log_dedup_queue
+      WHERE run_id = $1
+    `, [runId]);
+
+    console.log(`   Groups: ${summary.groups}, duplicates: ${summary.total}, pending: ${summary.pending}`);
+
+    const reportPath = args.report || `service-log-dedup-${runId}.csv`;
+    const reported = await writeReport(db, runId, reportPath);
+    console.log(`\n2️⃣  Diff report: ${reportPath} (${reported} rows)`);
+
+    if (DRY_RUN) {
+      await db.query('ROLLBACK');
+      console.log('\n🔍 DRY RUN - plan rolled back. Re-run without --dry-run to delete.\n');
+      return;
+    }
+
+    console.log(`\n3️⃣  Deleting in batches of ${BATCH_SIZE}...`);
+    let totalProcessed = 0;
+    let totalDeleted = 0;
+
+    while (true) {
+      const { processed, deleted } = await deleteBatch(db, runId);
+      if (processed === 0) break;
+      totalProcessed += processed;
+      totalDeleted += deleted;
+      console.log(`   ✓ ${totalProcessed}/${summary.pending} processed (${totalDeleted} deleted)`);
+    }
+
+    console.log('\n' + '='.repeat(50));
+    console.log(`✅ Run ${runId} complete`);
+    console.log(`   Deleted: ${totalDeleted}`);
+    console.log(`   Skipped (already gone or keeper missing): ${totalProcessed - totalDeleted}`);
+    console.log('='.repeat(50) + '\n');
+  } catch (error) {
+    if (DRY_RUN) {
+      await db.query('ROLLBACK');
+    }
+    console.error('❌ Deduplication failed:', error.message);
+    if (!DRY_RUN) {
+      console.error('   Progress is saved - rerun with --resume=<run_id> to continue');
+    }
+    process.exitCode = 1;
+  } finally {
+    db.release();
+    await pool.end();
+  }
+}
+
+deduplicate();
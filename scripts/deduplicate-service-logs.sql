@@ -1,6 +1,10 @@
 -- Deduplicate Service Logs
 -- Keeps the FIRST record for each boat_id + service_date combination
 -- (First by created_at timestamp)
+--
+-- NOTE: Holds locks for the whole transaction and uses NOT IN over a temp
+-- table. For large tables use scripts/deduplicate-service-logs.mjs instead
+-- (batched, resumable, with --dry-run diff report).
 
 BEGIN;
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env node
+
+/**
+ * Drain Audit Log Queue
+ *
+ * Background worker for migration 037 where pg_cron is not available:
+ * repeatedly calls drain_audit_log_queue() to move queued audit entries into
+ * the monthly audit_logs partitions, sleeping when the queue is empty.
+ * Several workers can run at once (the drain uses SKIP LOCKED).
+ *
+ * Also applies retention with --keep-months (drops whole partitions).
+ *
+ * Usage:
+ *   node scripts/drain-audit-queue.mjs [--batch-size=5000] [--interval-ms=5000]
+ *   node scripts/drain-audit-queue.mjs --once
+ *   node scripts/drain-audit-queue.mjs --once --keep-months=24
+ */
+
+import pg from 'pg';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const { values: args } = parseArgs({
+  options: {
+    'batch-size': { type: 'string', default: '5000' },
+    'interval-ms': { type: 'string', default: '5000' },
+    'keep-months': { type: 'string' },
+    'once': { type: 'boolean', default: false },
+  },
+});
+
+const BATCH_SIZE = parseInt(args['batch-size'], 10);
+const INTERVAL_MS = parseInt(args['interval-ms'], 10);
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+let stopping = false;
+process.on('SIGINT', () => { stopping = true; });
+process.on('SIGTERM', () => { stopping = true; });
+
+/**
+ * Drain until the queue is empty; returns entries moved
+ */
+async function drainAll() {
+  let total = 0;
+  while (!stopping) {
+    const { rows: [{ moved }] } = await pool.query(
+      'SELECT drain_audit_log_queue($1) AS moved', [BATCH_SIZE]);
+    total += moved;
+    if (moved < BATCH_SIZE) break;
+  }
+  return total;
+}
+
+async function main() {
+  console.log('📜 Draining audit_log_queue → audit_logs\n');
+
+  try {
+    if (args['keep-months']) {
+      const { rows: [{ dropped }] } = await pool.query(
+        'SELECT drop_audit_log_partitions($1) AS dropped', [parseInt(args['keep-months'], 10)]);
+      console.log(`🗑️  Dropped ${dropped} partitions older than ${args['keep-months']} months`);
+    }
+
+    do {
+      const started = Date.now();
+      const moved = await drainAll();
+      if (moved > 0) {
+        console.log(`   ✓ ${moved} entries moved in ${Date.now() - started}ms`);
+      }
+      if (!args.once && !stopping) await sleep(INTERVAL_MS);
+    } while (!args.once && !stopping);
+
+    const { rows: [{ pending }] } = await pool.query(
+      'SELECT COUNT(*)::int AS pending FROM audit_log_queue');
+    console.log(`\n✅ Stopped - ${pending} entries still queued`);
+  } catch (error) {
+    console.error('❌ Drain failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+main();
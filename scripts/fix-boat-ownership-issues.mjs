@@ -11,6 +11,8 @@
  * Usage:
  *   node scripts/fix-boat-ownership-issues.mjs          # Dry run
  *   DRY_RUN=false node scripts/fix-boat-ownership-issues.mjs  # Execute fixes
+ *
+ * Fleet-wide reassignments: scan-boat-ownership.mjs, then --apply its plan.
  */
 
 import { createClient } from '@supabase/supabase-js';
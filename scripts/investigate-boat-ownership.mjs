@@ -6,6 +6,8 @@
  * David Marcolini showing 3 boats but should only own "One Prolonged Blast"
  * - Nimbus should be Ilya Khanykov
  * - Take It Easy should be Jose Larrain
+ *
+ * For a fleet-wide check with a bulk fix plan, use scan-boat-ownership.mjs.
  */
 
 import { createClient } from '@supabase/supabase-js';
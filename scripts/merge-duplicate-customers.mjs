@@ -0,0 +1,517 @@
+#!/usr/bin/env node
+
+/**
+ * Merge Duplicate Customers (set-based, batched, reversible)
+ *
+ * Reusable replacement for migrations/020_deduplicate_customers.sql:
+ *
+ * 1. Plan: customers are grouped by LOWER(email) in one pass over a
+ *    pre-aggregated boat count per customer (no correlated COUNT per row).
+ *    The keeper is the customer with most boats, then first email, then id.
+ * 2. Repoint: every table referencing customers - FK constraints to
+ *    customers(id) plus any column named customer_id (uuid or text) - is
+ *    updated in bounded batches, each its own short transaction. Every
+ *    changed row is written to customer_merge_log (old → new customer).
+ * 3. Delete: once every reference is re-counted at zero (customer_id FKs
+ *    cascade), duplicates are locked and deleted in batches - skipping any
+ *    that gained a reference since - with a JSON snapshot of each deleted
+ *    row kept in customer_merge_plan.
+ *
+ * --undo re-inserts the deleted customers from their snapshots and points
+ * logged rows back to their original customer (only rows still pointing at
+ * the keeper are touched). Interrupted runs continue with --resume.
+ * --dry-run plans and counts inside one transaction that is rolled back, so
+ * it leaves no plan or tables behind.
+ *
+ * Usage:
+ *   node scripts/merge-duplicate-customers.mjs --dry-run
+ *   node scripts/merge-duplicate-customers.mjs [--batch-size=500] [--pause-ms=0]
+ *   node scripts/merge-duplicate-customers.mjs --resume=<run_id>
+ *   node scripts/merge-duplicate-customers.mjs --undo=<run_id>
+ */
+
+import pg from 'pg';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const { values: args } = parseArgs({
+  options: {
+    'dry-run': { type: 'boolean', default: false },
+    'batch-size': { type: 'string', default: '500' },
+    'pause-ms': { type: 'string', default: '0' },
+    'resume': { type: 'string' },
+    'undo': { type: 'string' },
+  },
+});
+
+const DRY_RUN = args['dry-run'];
+const BATCH_SIZE = parseInt(args['batch-size'], 10);
+const PAUSE_MS = parseInt(args['pause-ms'], 10);
+
+// Batches that find every remaining row locked are retried this many times
+const LOCKED_RETRIES = 10;
+const LOCKED_RETRY_MS = 500;
+
+const quote = (identifier) => `"${identifier.replace(/"/g, '""')}"`;
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function ensureTables(db) {
+  await db.query(`
+    CREATE TABLE IF NOT EXISTS customer_merge_plan (
+      run_id TEXT NOT NULL,
+      duplicate_id UUID NOT NULL,
+      keeper_id UUID NOT NULL,
+      email_lower TEXT NOT NULL,
+      customer_snapshot JSONB,
+      deleted_at TIMESTAMP WITH TIME ZONE,
+      restored_at TIMESTAMP WITH TIME ZONE,
+      PRIMARY KEY (run_id, duplicate_id)
+    )
+  `);
+  await db.query(`
+    CREATE TABLE IF NOT EXISTS customer_merge_log (
+      id BIGSERIAL PRIMARY KEY,
+      run_id TEXT NOT NULL,
+      table_name TEXT NOT NULL,
+      column_name TEXT NOT NULL,
+      row_pk TEXT NOT NULL,
+      old_customer_id TEXT NOT NULL,
+      new_customer_id TEXT NOT NULL,
+      merged_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+      reverted_at TIMESTAMP WITH TIME ZONE
+    )
+  `);
+  await db.query(`
+    CREATE INDEX IF NOT EXISTS idx_customer_merge_log_run
+      ON customer_merge_log(run_id, table_name, column_name, id)
+  `);
+}
+
+/**
+ * One pass: boat counts pre-aggregated, customers ranked within each email
+ */
+async function planRun(db, runId) {
+  const { rowCount } = await db.query(`
+    WITH boat_counts AS (
+      SELECT customer_id, COUNT(*) AS boats
+      FROM boats
+      WHERE customer_id IS NOT NULL
+      GROUP BY customer_id
+    ),
+    ranked AS (
+      SELECT
+        c.id,
+        LOWER(c.email) AS email_lower,
+        FIRST_VALUE(c.id) OVER w AS keeper_id,
+        ROW_NUMBER() OVER w AS row_num
+      FROM customers c
+      LEFT JOIN boat_counts bc ON bc.customer_id = c.id
+      WHERE c.email IS NOT NULL AND c.email != ''
+      WINDOW w AS (
+        PARTITION BY LOWER(c.email)
+        ORDER BY COALESCE(bc.boats, 0) DESC, c.email ASC, c.id ASC
+      )
+    )
+    INSERT INTO customer_merge_plan (run_id, duplicate_id, keeper_id, email_lower)
+    SELECT $1, id, keeper_id, email_lower
+    FROM ranked
+    WHERE row_num > 1
+  `, [runId]);
+
+  return rowCount;
+}
+
+/**
+ * Tables referencing customers: FK constraints to customers(id) and any
+ * customer_id column, with a single-column primary key to log rows by
+ */
+async function discoverReferences(db) {
+  const { rows } = await db.query(`
+    WITH fk_columns AS (
+      SELECT con.conrelid AS relid, a.attname AS column_name
+      FROM pg_constraint con
+      JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+      WHERE con.contype = 'f'
+        AND con.confrelid = 'public.customers'::regclass
+        AND array_length(con.conkey, 1) = 1
+    ),
+    named_columns AS (
+      SELECT a.attrelid AS relid, a.attname AS column_name
+      FROM pg_attribute a
+      JOIN pg_class c ON c.oid = a.attrelid
+      JOIN pg_namespace n ON n.oid = c.relnamespace
+      WHERE n.nspname = 'public'
+        AND c.relkind IN ('r', 'p')
+        AND a.attname = 'customer_id'
+        AND NOT a.attisdropped
+    ),
+    candidates AS (
+      SELECT relid, column_name FROM fk_columns
+      UNION
+      SELECT relid, column_name FROM named_columns
+    )
+    SELECT
+      c.relname AS table_name,
+      cand.column_name,
+      format_type(col.atttypid, col.atttypmod) AS column_type,
+      pk_col.attname AS pk_column
+    FROM candidates cand
+    JOIN pg_class c ON c.oid = cand.relid
+    JOIN pg_attribute col ON col.attrelid = cand.relid AND col.attname = cand.column_name
+    LEFT JOIN pg_index pk ON pk.indrelid = cand.relid AND pk.indisprimary AND pk.indnatts = 1
+    LEFT JOIN pg_attribute pk_col ON pk_col.attrelid = cand.relid AND pk_col.attnum = pk.indkey[0]
+    WHERE c.relname NOT IN ('customer_merge_plan', 'customer_merge_log')
+      AND format_type(col.atttypid, col.atttypmod) IN ('uuid', 'text', 'character varying')
+    ORDER BY c.relname, cand.column_name
+  `);
+
+  return rows;
+}
+
+/**
+ * Repoint one bounded batch of a referencing column; returns rows moved
+ */
+async function repointBatch(db, runId, ref) {
+  const table = quote(ref.table_name);
+  const column = quote(ref.column_name);
+  const pk = quote(ref.pk_column);
+
+  const { rowCount } = await db.query(`
+    WITH batch AS (
+      SELECT t.${pk} AS pk, t.${column} AS old_id, p.keeper_id
+      FROM ${table} t
+      JOIN customer_merge_plan p
+        ON t.${column} = p.duplicate_id::${ref.column_type}
+      WHERE p.run_id = $1
+        AND p.deleted_at IS NULL
+      LIMIT $2
+      FOR UPDATE OF t SKIP LOCKED
+    ),
+    moved AS (
+      UPDATE ${table} t
+      SET ${column} = b.keeper_id::${ref.column_type}
+      FROM batch b
+      WHERE t.${pk} = b.pk
+      RETURNING t.${pk} AS pk, b.old_id, b.keeper_id
+    )
+    INSERT INTO customer_merge_log (run_id, table_name, column_name, row_pk, old_customer_id, new_customer_id)
+    SELECT $1, $3, $4, pk::text, old_id::text, keeper_id::text
+    FROM moved
+  `, [runId, BATCH_SIZE, ref.table_name, ref.column_name]);
+
+  return rowCount;
+}
+
+async function countPending(db, runId, ref) {
+  const { rows: [{ count }] } = await db.query(`
+    SELECT COUNT(*)::int AS count
+    FROM ${quote(ref.table_name)} t
+    JOIN customer_merge_plan p ON t.${quote(ref.column_name)} = p.duplicate_id::${ref.column_type}
+    WHERE p.run_id = $1 AND p.deleted_at IS NULL
+  `, [runId]);
+  return count;
+}
+
+/**
+ * Delete one batch of duplicates (keyset after `after`), keeping a snapshot
+ * of each row. The duplicates are locked first, so rows referencing them
+ * wait until the batch commits; the DELETE then runs with a fresh snapshot
+ * and skips any duplicate something still references, rather than letting
+ * an ON DELETE CASCADE take the new row with it.
+ */
+async function deleteBatch(db, runId, references, after) {
+  const guards = references.map(ref => `
+        AND NOT EXISTS (
+          SELECT 1 FROM ${quote(ref.table_name)} r
+          WHERE r.${quote(ref.column_name)} = c.id::${ref.column_type}
+        )`).join('');
+
+  await db.query('BEGIN');
+  try {
+    const { rows: batch } = await db.query(`
+      SELECT duplicate_id
+      FROM customer_merge_plan
+      WHERE run_id = $1 AND deleted_at IS NULL AND duplicate_id > $3
+      ORDER BY duplicate_id
+      LIMIT $2
+      FOR UPDATE SKIP LOCKED
+    `, [runId, BATCH_SIZE, after]);
+
+    if (batch.length === 0) {
+      await db.query('COMMIT');
+      return { processed: 0, deleted: 0, last: after };
+    }
+    const ids = batch.map(row => row.duplicate_id);
+
+    await db.query('SELECT id FROM customers WHERE id = ANY($1::uuid[]) FOR UPDATE', [ids]);
+
+    // Plan rows whose customer is already gone are closed without a snapshot
+    const { rowCount: deleted } = await db.query(`
+      WITH deleted AS (
+        DELETE FROM customers c
+        WHERE c.id = ANY($2::uuid[])${guards}
+        RETURNING c.*
+      )
+      UPDATE customer_merge_plan p
+      SET deleted_at = NOW(),
+          customer_snapshot = (SELECT to_jsonb(d) FROM deleted d WHERE d.id = p.duplicate_id)
+      WHERE p.run_id = $1
+        AND p.duplicate_id = ANY($2::uuid[])
+        AND (
+          p.duplicate_id IN (SELECT id FROM deleted)
+          OR NOT EXISTS (SELECT 1 FROM customers c WHERE c.id = p.duplicate_id)
+        )
+    `, [runId, ids]);
+
+    await db.query('COMMIT');
+    return { processed: ids.length, deleted, last: ids.at(-1) };
+  } catch (error) {
+    await db.query('ROLLBACK');
+    throw error;
+  }
+}
+
+async function merge(db, runId, isResume) {
+  if (!isResume) {
+    console.log(`1️⃣  Planning run ${runId}...`);
+    const planned = await planRun(db, runId);
+    console.log(`   ✅ ${planned} duplicate customers queued`);
+  }
+
+  const { rows: [summary] } = await db.query(`
+    SELECT
+      COUNT(DISTINCT email_lower) AS groups,
+      COUNT(*) AS duplicates,
+      COUNT(*) FILTER (WHERE deleted_at IS NULL) AS pending
+    FROM customer_merge_plan
+    WHERE run_id = $1
+  `, [runId]);
+  console.log(`   Emails: ${summary.groups}, duplicates: ${summary.duplicates}, pending: ${summary.pending}`);
+
+  const references = await discoverReferences(db);
+  const skipped = references.filter(ref => !ref.pk_column);
+  const tables = references.filter(ref => ref.pk_column);
+
+  console.log(`\n2️⃣  Repointing ${tables.length} referencing columns in batches of ${BATCH_SIZE}`);
+  skipped.forEach(ref =>
+    console.log(`   ⚠️  ${ref.table_name}.${ref.column_name}: no single-column primary key - skipped`));
+
+  const failures = [];
+  for (const ref of tables) {
+    const label = `${ref.table_name}.${ref.column_name}`;
+    const total = await countPending(db, runId, ref);
+    if (DRY_RUN || total === 0) {
+      console.log(`   ${total === 0 ? '✅' : '•'} ${label}: ${total} rows to move`);
+      continue;
+    }
+
+    // SKIP LOCKED: an empty batch only means the remaining rows are locked
+    // right now, so the loop ends on countPending, not on an empty batch
+    let moved = 0;
+    let lockedRetries = 0;
+    try {
+      while (true) {
+        const count = await repointBatch(db, runId, ref);
+        if (count === 0) {
+          const remaining = await countPending(db, runId, ref);
+          if (remaining === 0) break;
+          if (++lockedRetries > LOCKED_RETRIES) {
+            throw new Error(`${remaining} rows still locked after ${LOCKED_RETRIES} retries`);
+          }
+          await sleep(LOCKED_RETRY_MS);
+          continue;
+        }
+        lockedRetries = 0;
+        moved += count;
+        console.log(`   ✓ ${label}: ${moved}/${total}`);
+        if (PAUSE_MS > 0) await sleep(PAUSE_MS);
+      }
+    } catch (error) {
+      failures.push({ label, error: error.message });
+      console.log(`   ❌ ${label}: ${error.message}`);
+    }
+  }
+
+  if (DRY_RUN) {
+    await db.query('ROLLBACK');
+    console.log('\n🔍 DRY RUN - plan rolled back. Re-run without --dry-run to merge.\n');
+    return;
+  }
+
+  if (failures.length > 0 || skipped.length > 0) {
+    console.log('\n⚠️  Some references were not repointed - duplicates kept.');
+    console.log(`   Fix and rerun with --resume=${runId}, or revert with --undo=${runId}\n`);
+    process.exitCode = 1;
+    return;
+  }
+
+  // Several customer_id FKs are ON DELETE CASCADE: any row still pointing at
+  // a duplicate would be deleted with it, so verify every reference first
+  const remaining = [];
+  for (const ref of tables) {
+    const count = await countPending(db, runId, ref);
+    if (count > 0) remaining.push(`${ref.table_name}.${ref.column_name} (${count})`);
+  }
+  if (remaining.length > 0) {
+    console.log(`\n⚠️  Rows still reference duplicates: ${remaining.join(', ')} - duplicates kept.`);
+    console.log(`   Rerun with --resume=${runId}, or revert with --undo=${runId}\n`);
+    process.exitCode = 1;
+    return;
+  }
+
+  console.log('\n3️⃣  Deleting merged duplicates...');
+  let deleted = 0;
+  let after = '00000000-0000-0000-0000-000000000000';
+  while (true) {
+    const batch = await deleteBatch(db, runId, references, after);
+    if (batch.processed === 0) break;
+    deleted += batch.deleted;
+    after = batch.last;
+    console.log(`   ✓ ${deleted}/${summary.pending}`);
+  }
+
+  const { rows: [kept] } = await db.query(
+    'SELECT COUNT(*)::int AS count FROM customer_merge_plan WHERE run_id = $1 AND deleted_at IS NULL', [runId]);
+  if (kept.count > 0) {
+    console.log(`\n⚠️  ${kept.count} duplicates gained new references during the delete - kept.`);
+    console.log(`   Rerun with --resume=${runId}, or revert with --undo=${runId}\n`);
+    process.exitCode = 1;
+    return;
+  }
+
+  const { rows: [logged] } = await db.query(
+    'SELECT COUNT(*)::int AS count FROM customer_merge_log WHERE run_id = $1', [runId]);
+
+  console.log('\n' + '='.repeat(50));
+  console.log(`✅ Run ${runId} complete`);
+  console.log(`   Customers merged: ${deleted}`);
+  console.log(`   References repointed: ${logged.count}`);
+  console.log(`   Undo with: --undo=${runId}`);
+  console.log('='.repeat(50) + '\n');
+}
+
+async function undo(db, runId) {
+  console.log(`↩️  Reverting run ${runId}\n`);
+
+  const { rowCount: restored } = await db.query(`
+    WITH restored AS (
+      INSERT INTO customers
+      SELECT (jsonb_populate_record(NULL::customers, p.customer_snapshot)).*
+      FROM customer_merge_plan p
+      WHERE p.run_id = $1
+        AND p.customer_snapshot IS NOT NULL
+        AND p.restored_at IS NULL
+      ON CONFLICT (id) DO NOTHING
+      RETURNING id
+    )
+    UPDATE customer_merge_plan p
+    SET restored_at = NOW()
+    FROM restored r
+    WHERE p.run_id = $1 AND p.duplicate_id = r.id
+  `, [runId]);
+  console.log(`   ✅ ${restored} customers restored`);
+
+  const references = await discoverReferences(db);
+  const byLabel = new Map(references.map(ref => [`${ref.table_name}.${ref.column_name}`, ref]));
+
+  const { rows: groups } = await db.query(`
+    SELECT table_name, column_name, COUNT(*)::int AS count
+    FROM customer_merge_log
+    WHERE run_id = $1 AND reverted_at IS NULL
+    GROUP BY table_name, column_name
+  `, [runId]);
+
+  for (const group of groups) {
+    const ref = byLabel.get(`${group.table_name}.${group.column_name}`);
+    if (!ref || !ref.pk_column) {
+      console.log(`   ⚠️  ${group.table_name}.${group.column_name}: table changed - ${group.count} rows not reverted`);
+      continue;
+    }
+
+    const table = quote(ref.table_name);
+    const column = quote(ref.column_name);
+    const pk = quote(ref.pk_column);
+    let reverted = 0;
+
+    while (true) {
+      const { rowCount } = await db.query(`
+        WITH batch AS (
+          SELECT id, row_pk, old_customer_id, new_customer_id
+          FROM customer_merge_log
+          WHERE run_id = $1 AND table_name = $2 AND column_name = $3 AND reverted_at IS NULL
+          ORDER BY id
+          LIMIT $4
+        ),
+        moved AS (
+          UPDATE ${table} t
+          SET ${column} = b.old_customer_id::${ref.column_type}
+          FROM batch b
+          WHERE t.${pk}::text = b.row_pk
+            AND t.${column} = b.new_customer_id::${ref.column_type}
+        )
+        UPDATE customer_merge_log l
+        SET reverted_at = NOW()
+        FROM batch b
+        WHERE l.id = b.id
+      `, [runId, ref.table_name, ref.column_name, BATCH_SIZE]);
+
+      if (rowCount === 0) break;
+      reverted += rowCount;
+    }
+
+    console.log(`   ✓ ${ref.table_name}.${ref.column_name}: ${reverted} rows reverted`);
+  }
+
+  console.log(`\n✅ Run ${runId} reverted\n`);
+}
+
+async function main() {
+  console.log('👥 Merging duplicate customers (case-insensitive email)\n');
+  console.log(DRY_RUN ? '🔍 DRY RUN MODE - No rows will be changed\n' : '');
+
+  if (DRY_RUN && (args.resume || args.undo)) {
+    console.error('❌ --dry-run cannot be combined with --resume or --undo (they act on a saved run)');
+    process.exitCode = 1;
+    await pool.end();
+    return;
+  }
+
+  const db = await pool.connect();
+
+  try {
+    if (DRY_RUN) {
+      // Everything below, including the plan and log tables, is rolled back
+      await db.query('BEGIN');
+    }
+
+    await ensureTables(db);
+
+    if (args.undo) {
+      await undo(db, args.undo);
+    } else if (args.resume) {
+      console.log(`↻ Resuming run ${args.resume}`);
+      await merge(db, args.resume, true);
+    } else {
+      await merge(db, `merge-${Date.now()}`, false);
+    }
+  } catch (error) {
+    if (DRY_RUN) {
+      await db.query('ROLLBACK');
+    }
+    console.error('❌ Customer merge failed:', error.message);
+    if (!DRY_RUN) {
+      console.error('   Progress is saved - rerun with --resume=<run_id> or --undo=<run_id>');
+    }
+    process.exitCode = 1;
+  } finally {
+    db.release();
+    await pool.end();
+  }
+}
+
+main();
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Service Time Backfill
+
+Fills service_started_at / service_ended_at / total_hours for the whole
+service history in one set-based pass, replacing the row-by-row derivation
+of migration 024 and the calculate_total_hours() trigger:
+
+1. Notion export: every Admin/Services "Time In" / "Time Out" / "Duration"
+   column is parsed a column at a time (HHMM integers such as 1447, 905),
+   joined to its service log by notion_source_key, COPYed into a temp table
+   and applied with a single UPDATE ... FROM.
+2. Database: service_logs that already have time_in/time_out but no
+   timestamps are filled by one UPDATE with the same rules.
+
+Rules:
+- Time Out earlier than Time In is a past-midnight service when the
+  resulting span is at most --max-overnight-hours; otherwise rejected
+- Zero-length spans, malformed values (e.g. "27", "2561") and spans over
+  --max-hours are rejected
+- Rows with only a usable Duration (minutes) get total_hours without
+  timestamps; unusable times are still reported
+- A Duration that disagrees with the times by more than 5 minutes is kept
+  but reported
+
+Rejected and suspicious rows are written to an anomaly report (CSV).
+Existing values are only filled when NULL unless --overwrite is given.
+
+Usage:
+    python scripts/notion-import/backfill_service_times.py [SOURCE ...] [--dry-run]
+        [--overwrite] [--report service-time-anomalies.csv]
+        [--max-hours 8] [--max-overnight-hours 6]
+
+Requires DATABASE_URL unless --dry-run is given; a dry run with it set also
+reports unusable database rows, without writing anything.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from export_manifest import collect_members
+from notion_export import (
+    ADMIN_KINDS, build_records, clean, parse_file, parse_hhmm_minutes, parse_int, row_keys,
+)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_EXPORT_DIR = os.path.join(REPO_ROOT, 'archive', 'notion-exports', 'notion-export-new')
+
+DURATION_TOLERANCE_MINUTES = 5
+
+REPORT_COLUMNS = [
+    'source', 'key', 'boat', 'service_date', 'time_in', 'time_out', 'duration', 'reason',
+]
+
+
+# ============================================================================
+# Column parsing
+# ============================================================================
+
+def parse_hhmm_column(values):
+    """
+    Parse a column of HHMM cells into minutes since midnight.
+
+    Returns (minutes, status) lists; status is 'ok', 'blank' or 'malformed'.
+    """
+    minutes, status = [], []
+    for value in values:
+        value = clean(value)
+        if not value:
+            minutes.append(None)
+            status.append('blank')
+            continue
+        parsed = parse_hhmm_minutes(value)
+        minutes.append(parsed)
+        status.append('malformed' if parsed is None else 'ok')
+    return minutes, status
+
+
+def compute_spans(time_in, in_status, time_out, out_status, durations, max_minutes, max_overnight):
+    """
+    Combine parsed columns into (span_minutes, overnight, reason) per row.
+
+    reason is None for accepted rows, 'duration_only' when only Duration is
+    usable ('duration_only:<problem>' when the times were unusable), or the
+    rejection reason.
+    """
+    spans = []
+    for start, s_in, end, s_out, duration in zip(time_in, in_status, time_out, out_status, durations):
+        valid_duration = duration if duration and 0 < duration <= max_minutes else None
+        if s_in == 'blank' and s_out == 'blank':
+            spans.append((valid_duration, False, 'duration_only' if valid_duration else 'blank'))
+            continue
+        if s_in != 'ok' or s_out != 'ok':
+            if 'malformed' in (s_in, s_out):
+                problem = 'malformed_time'
+            else:
+                problem = 'missing_time_in' if s_in == 'blank' else 'missing_time_out'
+            if valid_duration:
+                spans.append((valid_duration, False, f'duration_only:{problem}'))
+            else:
+                spans.append((None, False, problem))
+            continue
+
+        span = end - start
+        overnight = span < 0
+        if overnight:
+            span += 24 * 60
+            if span > max_overnight:
+                spans.append((None, True, 'negative_span'))
+                continue
+        if span == 0:
+            spans.append((None, False, 'zero_duration'))
+        elif span > max_minutes:
+            spans.append((None, overnight, 'too_long'))
+        else:
+            spans.append((span, overnight, None))
+    return spans
+
+
+# ============================================================================
+# Export side
+# ============================================================================
+
+def export_time_rows(sources):
+    """Admin/Services rows with their service log key, boat and date."""
+    members, _ = collect_members(sources)
+    tables = []
+    for member in members.values():
+        parsed = parse_file(member['name'], member['data'])
+        if parsed and parsed[0] == 'table':
+            tables.append(parsed[1])
+
+    records, _ = build_records(tables)
+    by_row_key = {}
+    for record in records:
+        by_row_key[record['notion_source_key']] = record
+        if record['admin_source_key']:
+            by_row_key[record['admin_source_key']] = record
+
+    rows = []
+    for table in tables:
+        if table['kind'] not in ADMIN_KINDS:
+            continue
+        for key, row, _ in row_keys(table):
+            record = by_row_key.get(key)
+            if record is None:
+                continue
+            rows.append({
+                'key': record['notion_source_key'],
+                'boat': record['boat_name'],
+                'service_date': record['service_date'],
+                'time_in': row.get('Time In'),
+                'time_out': row.get('Time Out'),
+                'duration': row.get('Duration'),
+            })
+
+    # A service can appear in both its Admin and Services tables; keep one
+    unique = {}
+    for row in rows:
+        current = unique.get(row['key'])
+        if current is None or (not clean(current['time_in']) and clean(row['time_in'])):
+            unique[row['key']] = row
+    return list(unique.values())
+
+
+def plan_export_updates(rows, max_minutes, max_overnight):
+    """Vectorized pass over export rows → (updates, anomalies)."""
+    time_in, in_status = parse_hhmm_column([r['time_in'] for r in rows])
+    time_out, out_status = parse_hhmm_column([r['time_out'] for r in rows])
+    durations = [parse_int(r['duration']) for r in rows]
+    spans = compute_spans(time_in, in_status, time_out, out_status, durations,
+                          max_minutes, max_overnight)
+
+    updates, anomalies = [], []
+    for row, start, end, duration, (span, overnight, reason) in zip(
+            rows, time_in, time_out, durations, spans):
+        if reason == 'blank':
+            continue
+        if reason is not None and not reason.startswith('duration_only'):
+            anomalies.append(anomaly('export', row, reason))
+            continue
+        if reason and ':' in reason:
+            anomalies.append(anomaly('export', row, f"{reason.split(':')[1]} (duration used)"))
+
+        update = {'key': row['key'], 'total_hours': round(span / 60, 2),
+                  'time_in': None, 'time_out': None, 'started_at': None, 'ended_at': None}
+        if reason is None:
+            started_at = datetime.combine(row['service_date'], datetime.min.time()) + timedelta(minutes=start)
+            update.update({
+                'time_in': f'{start // 60:02d}:{start % 60:02d}',
+                'time_out': f'{end // 60:02d}:{end % 60:02d}',
+                'started_at': started_at,
+                'ended_at': started_at + timedelta(minutes=span),
+            })
+            if duration and abs(duration - span) > DURATION_TOLERANCE_MINUTES:
+                anomalies.append(anomaly('export', row, f'duration_mismatch (times give {span} min)'))
+            if overnight:
+                anomalies.append(anomaly('export', row, 'past_midnight (accepted)'))
+        updates.append(update)
+
+    return updates, anomalies
+
+
+def anomaly(source, row, reason):
+    return {
+        'source': source,
+        'key': row['key'],
+        'boat': row['boat'],
+        'service_date': row['service_date'],
+        'time_in': row['time_in'],
+        'time_out': row['time_out'],
+        'duration': row['duration'],
+        'reason': reason,
+    }
+
+
+# ============================================================================
+# Database side
+# ============================================================================
+
+def span_sql(max_minutes, max_overnight):
+    """Shared span expression for TIME columns (minutes, past-midnight aware)."""
+    raw = 'EXTRACT(EPOCH FROM (sl.time_out - sl.time_in)) / 60'
+    return f"""
+        CASE
+            WHEN {raw} > 0 AND {raw} <= {max_minutes} THEN {raw}
+            WHEN {raw} < 0 AND {raw} + 1440 <= LEAST({max_overnight}, {max_minutes}) THEN {raw} + 1440
+        END
+    """
+
+
+def apply_updates(cursor, updates, overwrite, max_minutes, max_overnight):
+    """One COPY + UPDATE for export rows, one UPDATE for database-only rows."""
+    fill = (lambda column, value: value) if overwrite else \
+        (lambda column, value: f'COALESCE(sl.{column}, {value})')
+
+    cursor.execute('SELECT begin_bulk_load()')
+    cursor.execute("""
+        CREATE TEMP TABLE service_time_backfill (
+            notion_source_key TEXT PRIMARY KEY,
+            time_in TIME,
+            time_out TIME,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP,
+            total_hours NUMERIC
+        ) ON COMMIT DROP
+    """)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for u in updates:
+        writer.writerow([u['key'], u['time_in'] or '', u['time_out'] or '',
+                         u['started_at'].isoformat() if u['started_at'] else '',
+                         u['ended_at'].isoformat() if u['ended_at'] else '',
+                         u['total_hours']])
+    buffer.seek(0)
+    cursor.copy_expert(
+        'COPY service_time_backfill FROM STDIN WITH (FORMAT csv, NULL \'\')', buffer)
+
+    cursor.execute(f"""
+        UPDATE service_logs sl
+        SET time_in = {fill('time_in', 'b.time_in')},
+            time_out = {fill('time_out', 'b.time_out')},
+            service_started_at = {fill('service_started_at', 'b.started_at')},
+            service_ended_at = {fill('service_ended_at', 'b.ended_at')},
+            total_hours = {fill('total_hours', 'b.total_hours')}
+        FROM service_time_backfill b
+        WHERE sl.notion_source_key = b.notion_source_key
+    """)
+    export_updated = cursor.rowcount
+
+    span = span_sql(max_minutes, max_overnight)
+    cursor.execute(f"""
+        WITH spans AS (
+            SELECT sl.id, sl.service_date + sl.time_in AS started_at, {span} AS minutes
+            FROM service_logs sl
+            WHERE sl.notion_source_key IS NULL
+              AND sl.service_date IS NOT NULL
+              AND sl.time_in IS NOT NULL
+              AND sl.time_out IS NOT NULL
+              {'' if overwrite else 'AND (sl.service_started_at IS NULL OR sl.total_hours IS NULL)'}
+        )
+        UPDATE service_logs sl
+        SET service_started_at = {fill('service_started_at', 's.started_at')},
+            service_ended_at = {fill('service_ended_at', "s.started_at + s.minutes * INTERVAL '1 minute'")},
+            total_hours = {fill('total_hours', 'ROUND(s.minutes / 60.0, 2)')}
+        FROM spans s
+        WHERE sl.id = s.id
+          AND s.minutes IS NOT NULL
+    """)
+    database_updated = cursor.rowcount
+
+    cursor.execute('SELECT end_bulk_load()')
+    return export_updated, database_updated
+
+
+def database_anomalies(cursor, max_minutes, max_overnight):
+    """Database-only rows whose time_in/time_out the backfill can't use."""
+    span = span_sql(max_minutes, max_overnight)
+    cursor.execute(f"""
+        SELECT sl.id::text, b.name, sl.service_date, sl.time_in::text, sl.time_out::text,
+               CASE
+                   WHEN sl.time_in = sl.time_out THEN 'zero_duration'
+                   WHEN sl.time_out < sl.time_in THEN 'negative_span'
+                   ELSE 'too_long'
+               END
+        FROM service_logs sl
+        LEFT JOIN boats b ON b.id = sl.boat_id
+        WHERE sl.notion_source_key IS NULL
+          AND sl.time_in IS NOT NULL
+          AND sl.time_out IS NOT NULL
+          AND {span} IS NULL
+        ORDER BY sl.service_date
+    """)
+    return [
+        {'source': 'database', 'key': log_id, 'boat': boat, 'service_date': service_date,
+         'time_in': time_in, 'time_out': time_out, 'duration': None, 'reason': reason}
+        for log_id, boat, service_date, time_in, time_out, reason in cursor
+    ]
+
+
+def write_report(path, anomalies):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(anomalies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill service start/end timestamps and total_hours')
+    parser.add_argument('sources', nargs='*', default=[DEFAULT_EXPORT_DIR])
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--overwrite', action='store_true')
+    parser.add_argument('--report', default='service-time-anomalies.csv')
+    parser.add_argument('--max-hours', type=float, default=8)
+    parser.add_argument('--max-overnight-hours', type=float, default=6)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    max_minutes = int(args.max_hours * 60)
+    max_overnight = int(args.max_overnight_hours * 60)
+    print('🧪 Dry-run mode\n' if args.dry_run else '🚀 Backfill mode\n')
+
+    rows = export_time_rows(args.sources)
+    updates, anomalies = plan_export_updates(rows, max_minutes, max_overnight)
+    with_times = sum(1 for u in updates if u['started_at'])
+    print(f'📂 {len(rows)} Notion service rows with time columns')
+    print(f'   {with_times} with start/end times, {len(updates) - with_times} duration only')
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url and not args.dry_run:
+        print('❌ Missing DATABASE_URL (source db-env.sh or scripts/load-env.sh)')
+        sys.exit(1)
+
+    # A dry run still runs the read-only database checks when it can connect
+    if database_url:
+        import psycopg2
+
+        connection = psycopg2.connect(database_url)
+        try:
+            with connection, connection.cursor() as cursor:
+                if not args.dry_run:
+                    export_updated, database_updated = apply_updates(
+                        cursor, updates, args.overwrite, max_minutes, max_overnight)
+                anomalies.extend(database_anomalies(cursor, max_minutes, max_overnight))
+        finally:
+            connection.close()
+        if not args.dry_run:
+            print(f'   ✅ Updated {export_updated} Notion service logs, '
+                  f'{database_updated} from existing time_in/time_out')
+    else:
+        print('   No DATABASE_URL - database rows not checked (export anomalies only)')
+
+    write_report(args.report, anomalies)
+    print(f'\n⚠️  {len(anomalies)} anomalies written to {args.report}:')
+    for reason, count in Counter(a['reason'].split(' (')[0] for a in anomalies).most_common():
+        print(f'   - {reason}: {count}')
+    print(f'\n{"🧪 Dry run" if args.dry_run else "✅ Backfill"} complete in '
+          f'{time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Notion Condition History → Parquet
+
+Converts the per-boat "Conditions" tables of the Notion export into one
+columnar dataset for fleet-wide condition trend queries (Insight, DuckDB,
+pandas). Multi-valued cells such as "Minimal, Moderate" are exploded into
+one observation row per value:
+
+    boat | service_date | notion_source_key | attribute | value | value_index | value_count
+
+attribute is one of growth, paint, anodes, prop, thru_hulls. value_count
+is the number of values in the original cell, so 1 / value_count weights a
+cell evenly when counting. boat, attribute and value are dictionary
+encoded; the dataset is hive-partitioned by year (year=2023/...).
+
+Usage:
+    python scripts/notion-import/conditions_to_parquet.py [SOURCE ...]
+        [--output notion-conditions] [--dry-run]
+
+    SOURCE: export directories or zips (see ingest.py), later sources win
+"""
+
+import argparse
+import os
+import shutil
+import time
+from collections import Counter
+
+from export_manifest import collect_members
+from notion_export import CONDITION_KINDS, clean, parse_date, parse_file, row_keys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_EXPORT_DIR = os.path.join(REPO_ROOT, 'archive', 'notion-exports', 'notion-export-new')
+
+# Export column → attribute name
+CONDITION_COLUMNS = {
+    'Growth': 'growth',
+    'Paint': 'paint',
+    'Anodes': 'anodes',
+    'Prop': 'prop',
+    'Thru-hulls': 'thru_hulls',
+}
+
+
+def split_values(cell):
+    """'Good, Poor' → ['Good', 'Poor']; Notion's 'None' select value is dropped."""
+    cell = clean(cell)
+    if not cell:
+        return []
+    return [v.strip() for v in cell.split(',') if v.strip() and v.strip() != 'None']
+
+
+def condition_tables(members):
+    tables = []
+    for member in members.values():
+        parsed = parse_file(member['name'], member['data'])
+        if parsed and parsed[0] == 'table' and parsed[1]['boat'] and parsed[1]['kind'] in CONDITION_KINDS:
+            tables.append(parsed[1])
+
+    # _all copies only when the plain table is missing (same rule as build_records)
+    plain = {t['db_id'] for t in tables if not t['is_all']}
+    return [t for t in tables if not t['is_all'] or t['db_id'] not in plain]
+
+
+def explode_conditions(tables):
+    """Return column lists for the observation table plus skipped row count."""
+    columns = {name: [] for name in (
+        'boat', 'service_date', 'year', 'notion_source_key',
+        'attribute', 'value', 'value_index', 'value_count',
+    )}
+    skipped = 0
+
+    for table in sorted(tables, key=lambda t: (t['boat'], t['db_id'])):
+        for source_key, row, _ in row_keys(table):
+            service_date = parse_date(row.get('Date'))
+            if service_date is None:
+                skipped += 1
+                continue
+
+            for column, attribute in CONDITION_COLUMNS.items():
+                values = split_values(row.get(column))
+                for index, value in enumerate(values):
+                    columns['boat'].append(table['boat'])
+                    columns['service_date'].append(service_date)
+                    columns['year'].append(service_date.year)
+                    columns['notion_source_key'].append(source_key)
+                    columns['attribute'].append(attribute)
+                    columns['value'].append(value)
+                    columns['value_index'].append(index)
+                    columns['value_count'].append(len(values))
+
+    return columns, skipped
+
+
+def write_dataset(columns, output):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.table({
+        'boat': pa.array(columns['boat'], pa.string()).dictionary_encode(),
+        'service_date': pa.array(columns['service_date'], pa.date32()),
+        'year': pa.array(columns['year'], pa.int16()),
+        'notion_source_key': pa.array(columns['notion_source_key'], pa.string()),
+        'attribute': pa.array(columns['attribute'], pa.string()).dictionary_encode(),
+        'value': pa.array(columns['value'], pa.string()).dictionary_encode(),
+        'value_index': pa.array(columns['value_index'], pa.int8()),
+        'value_count': pa.array(columns['value_count'], pa.int8()),
+    })
+
+    if os.path.exists(output):
+        shutil.rmtree(output)
+
+    ds.write_dataset(
+        table,
+        output,
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('year', pa.int16())]), flavor='hive'),
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert Notion condition history to Parquet')
+    parser.add_argument('sources', nargs='*', default=[DEFAULT_EXPORT_DIR])
+    parser.add_argument('--output', default='notion-conditions')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    members, stats = collect_members(args.sources)
+    tables = condition_tables(members)
+    columns, skipped = explode_conditions(tables)
+
+    observations = len(columns['value'])
+    print(f'📂 {len(members)} unique export files ({stats["duplicates"]} duplicate copies skipped)')
+    print(f'   {len(tables)} condition tables, {len(set(columns["boat"]))} boats, '
+          f'{len(set(columns["notion_source_key"]))} services, {skipped} rows without a date')
+    print(f'   {observations} observations')
+
+    for attribute, count in sorted(Counter(columns['attribute']).items()):
+        print(f'   - {attribute}: {count}')
+
+    if args.dry_run:
+        print(f'\n🧪 Dry run complete in {time.perf_counter() - started:.2f}s - nothing written')
+        return
+
+    if not observations:
+        print(f'\n⚠️  No condition observations found - nothing written '
+              f'({time.perf_counter() - started:.2f}s)')
+        return
+
+    write_dataset(columns, args.output)
+    years = sorted(set(columns['year']))
+    print(f'\n✅ Wrote {args.output}/ ({len(years)} year partitions: {years[0]}-{years[-1]}) '
+          f'in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Notion export sources and import manifest
+
+Reads export members straight out of directories and zip files (including
+the ExportBlock zip nested inside Notion_Export_*.zip) without extracting
+them, drops byte-identical duplicates, and tracks what has been imported in
+a JSON manifest:
+
+    {
+      "files":   {"<page_id>[_all]": {"sha256": ..., "name": ..., "source": ...}},
+      "records": {"<notion_source_key>": "<sha256 of normalized record>"},
+      "unresolved": ["<notion_source_key>", ...]
+    }
+
+File hashes let a re-run skip parsing entirely when nothing changed; record
+hashes decide which service logs are re-written. Unresolved records (boat
+not in the database yet) are retried on every run.
+"""
+
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+from notion_export import isoformat, parse_filename
+
+EXPORT_EXTENSIONS = ('.md', '.csv')
+
+
+def iter_zip(archive, origin):
+    """Yield (origin, name, bytes) for a zip, descending into nested zips."""
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            if info.filename.endswith('.zip'):
+                with zf.open(info) as nested:
+                    yield from iter_zip(io.BytesIO(nested.read()), f'{origin}!{info.filename}')
+            elif info.filename.endswith(EXPORT_EXTENSIONS):
+                yield origin, info.filename, zf.read(info)
+
+
+def iter_members(source):
+    """Yield (origin, name, bytes) for every export file under a directory or zip."""
+    if os.path.isfile(source):
+        yield from iter_zip(source, source)
+        return
+
+    for root, _, names in sorted(os.walk(source)):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if name.endswith('.zip'):
+                yield from iter_zip(path, path)
+            elif name.endswith(EXPORT_EXTENSIONS):
+                with open(path, 'rb') as f:
+                    yield path, name, f.read()
+
+
+def member_key(name):
+    """Manifest key: Notion page/database ID, with _all copies kept separate."""
+    info = parse_filename(name)
+    if not info:
+        return None
+    return info['page_id'] + ('_all' if info['is_all'] else '')
+
+
+def collect_members(sources):
+    """
+    Read all sources once and keep one copy of each export file.
+
+    Sources are applied in order, so a later export always replaces an
+    earlier copy of the same page, even when an older source repeats an
+    earlier version. Re-reading an identical copy, or an _all.csv identical
+    to its plain table, counts as a duplicate.
+    Returns ({key: member}, stats).
+    """
+    members = {}
+    stats = {'read': 0, 'duplicates': 0, 'unrecognized': 0}
+
+    for source in sources:
+        for origin, name, data in iter_members(source):
+            stats['read'] += 1
+            key = member_key(name)
+            if key is None:
+                stats['unrecognized'] += 1
+                continue
+
+            digest = hashlib.sha256(data).hexdigest()
+            if key in members and members[key]['sha256'] == digest:
+                stats['duplicates'] += 1
+                continue
+
+            members[key] = {
+                'name': name.rsplit('/', 1)[-1],
+                'source': origin,
+                'sha256': digest,
+                'data': data,
+            }
+
+    for key in [k for k in members if k.endswith('_all')]:
+        plain = members.get(key.removesuffix('_all'))
+        if plain and plain['sha256'] == members[key]['sha256']:
+            del members[key]
+            stats['duplicates'] += 1
+
+    return members, stats
+
+
+def record_hash(record):
+    fields = {k: v for k, v in record.items() if k not in ('boat_id', 'customer_id')}
+    payload = json.dumps(fields, sort_keys=True, default=isoformat)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_manifest(path):
+    if not path or not os.path.exists(path):
+        return {'files': {}, 'records': {}, 'unresolved': []}
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest.setdefault('files', {})
+    manifest.setdefault('records', {})
+    manifest.setdefault('unresolved', [])
+    return manifest
+
+
+def save_manifest(path, members, record_hashes, unresolved):
+    manifest = {
+        'files': {
+            key: {'sha256': m['sha256'], 'name': m['name'], 'source': m['source']}
+            for key, m in sorted(members.items())
+        },
+        'records': record_hashes,
+        'unresolved': sorted(unresolved),
+    }
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def changed_files(manifest, members):
+    """Keys of files that are new or whose content changed."""
+    known = manifest['files']
+    return [key for key, m in members.items() if known.get(key, {}).get('sha256') != m['sha256']]
+
+
+def changed_records(manifest, records):
+    """Split records into (new, changed) against the manifest's record hashes."""
+    known = manifest['records']
+    new, changed = [], []
+    for record in records:
+        previous = known.get(record['notion_source_key'])
+        if previous is None:
+            new.append(record)
+        elif previous != record_hash(record):
+            changed.append(record)
+    return new, changed
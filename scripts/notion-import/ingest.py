@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Notion Service History Ingester
+
+Parses the Notion export (per-service markdown pages + per-boat Conditions/
+Admin/Services CSVs) with a process pool, normalizes rows into
+service_logs-shaped records and streams them into service_logs_staging with
+COPY batches, then moves them with bulk_load_service_logs() (migration 034)
+on --replace, or upserts them on notion_source_key otherwise.
+
+Sources may be export directories or zip files (nested zips are read in
+place). With a manifest, only records that are new or changed since the last
+import are written; existing rows are updated in place, so they keep their
+id and any invoice_id the Zoho linker set.
+
+Usage:
+    python scripts/notion-import/ingest.py [SOURCE ...] [--dry-run] [--replace]
+        [--manifest notion-import-manifest.json] [--full]
+        [--workers N] [--batch-size N] [--output records.jsonl]
+
+    SOURCE defaults to archive/notion-exports/notion-export-new; list older
+           exports first, later sources win for the same page
+    --replace  deletes existing data_source = 'notion' rows in the same transaction
+    --full     ignore the manifest and re-import every record
+
+Requires DATABASE_URL unless --dry-run is given.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from export_manifest import (
+    changed_files,
+    changed_records,
+    collect_members,
+    load_manifest,
+    record_hash,
+    save_manifest,
+)
+from notion_export import (
+    RECORD_COLUMNS,
+    attach_page_ids,
+    build_records,
+    isoformat,
+    parse_file,
+)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_EXPORT_DIR = os.path.join(REPO_ROOT, 'archive', 'notion-exports', 'notion-export-new')
+
+
+def parse_chunk(members):
+    """Worker: parse a chunk of (name, bytes) export files."""
+    pages, tables = [], []
+    for name, data in members:
+        parsed = parse_file(name, data)
+        if parsed is None:
+            continue
+        kind, value = parsed
+        (pages if kind == 'page' else tables).append(value)
+    return pages, tables
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parse_export(members, workers):
+    """Fan the files out over a process pool and gather pages and tables."""
+    items = [(m['name'], m['data']) for m in members.values()]
+    pages, tables = [], []
+    chunk_size = max(1, len(items) // (workers * 4) or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_pages, chunk_tables in executor.map(parse_chunk, chunked(items, chunk_size)):
+            pages.extend(chunk_pages)
+            tables.extend(chunk_tables)
+    return pages, tables
+
+
+def load_boats(cursor):
+    """Map lower-cased boat name → (boat_id, customer_id)."""
+    cursor.execute('SELECT id, customer_id, name FROM boats WHERE name IS NOT NULL')
+    return {name.strip().lower(): (boat_id, customer_id) for boat_id, customer_id, name in cursor}
+
+
+def copy_row(record):
+    values = []
+    for column in RECORD_COLUMNS:
+        value = record.get(column)
+        if column in ('propellers', 'anode_conditions'):
+            value = json.dumps(value)
+        values.append('' if value is None else isoformat(value))
+    return values
+
+
+def stream_copy(cursor, records, batch_size):
+    """COPY records into service_logs_staging in fixed-size batches."""
+    sql = (
+        f"COPY service_logs_staging ({', '.join(RECORD_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv, NULL '')"
+    )
+    for start in range(0, len(records), batch_size):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records[start:start + batch_size]:
+            writer.writerow(copy_row(record))
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+# Re-imported rows only overwrite what the importer owns
+UPSERT_SQL = (
+    f"INSERT INTO service_logs ({', '.join(RECORD_COLUMNS)}) "
+    f"SELECT {', '.join(RECORD_COLUMNS)} FROM service_logs_staging "
+    "ON CONFLICT (notion_source_key) WHERE notion_source_key IS NOT NULL DO UPDATE SET "
+    + ', '.join(f'{column} = EXCLUDED.{column}'
+                for column in RECORD_COLUMNS if column != 'notion_source_key')
+)
+
+
+def load(records, replace, batch_size):
+    import psycopg2
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print('❌ Missing DATABASE_URL (source db-env.sh or scripts/load-env.sh)')
+        sys.exit(1)
+
+    connection = psycopg2.connect(database_url)
+    try:
+        with connection, connection.cursor() as cursor:
+            boats = load_boats(cursor)
+            resolved, unresolved, unknown = [], [], {}
+            for record in records:
+                boat = boats.get(record['boat_name'].lower())
+                if boat is None:
+                    unknown[record['boat_name']] = unknown.get(record['boat_name'], 0) + 1
+                    unresolved.append(record['notion_source_key'])
+                    continue
+                record['boat_id'], record['customer_id'] = boat
+                resolved.append(record)
+
+            if replace:
+                cursor.execute("DELETE FROM service_logs WHERE data_source = 'notion'")
+                print(f'   🗑️  Removed {cursor.rowcount} existing Notion service logs')
+
+            cursor.execute('TRUNCATE service_logs_staging')
+            stream_copy(cursor, resolved, batch_size)
+
+            if replace:
+                cursor.execute('SELECT bulk_load_service_logs()')
+                loaded = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    'SELECT COUNT(*) FROM service_logs WHERE notion_source_key = ANY(%s)',
+                    ([r['notion_source_key'] for r in resolved],)
+                )
+                print(f'   🔁 Updating {cursor.fetchone()[0]} previously imported service logs in place')
+                cursor.execute(UPSERT_SQL)
+                loaded = cursor.rowcount
+                cursor.execute('TRUNCATE service_logs_staging')
+    finally:
+        connection.close()
+
+    return loaded, resolved, unresolved, unknown
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import Notion service history into service_logs')
+    parser.add_argument('sources', nargs='*', default=[DEFAULT_EXPORT_DIR])
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--replace', action='store_true')
+    parser.add_argument('--manifest', default='notion-import-manifest.json')
+    parser.add_argument('--full', action='store_true')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--output', help='Write normalized records as JSON lines')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    print('🧪 Dry-run mode\n' if args.dry_run else '🚀 Import mode\n')
+
+    members, stats = collect_members(args.sources)
+    print(f'📂 {stats["read"]} export files in {len(args.sources)} sources: '
+          f'{len(members)} unique, {stats["duplicates"]} duplicate copies skipped')
+
+    full = args.full or args.replace
+    manifest = load_manifest(None if full else args.manifest)
+    changed = changed_files(manifest, members)
+    print(f'   {len(changed)} new or changed files since last import')
+
+    if not changed and manifest['records'] and not manifest['unresolved']:
+        print(f'\n✅ Nothing to import ({time.perf_counter() - started:.2f}s)')
+        return
+
+    pages, tables = parse_export(members, args.workers)
+    print(f'   Parsed {len(pages)} service pages, {len(tables)} tables '
+          f'({time.perf_counter() - started:.2f}s, {args.workers} workers)')
+
+    records, rejected = build_records(tables)
+    unmatched_pages = attach_page_ids(records, tables, pages)
+    print(f'   {len(records)} service log records, {len(rejected)} rejected rows, '
+          f'{len(unmatched_pages)} pages not matched to a table row')
+
+    new, updated = changed_records(manifest, records)
+    pending = new + updated
+    print(f'   {len(new)} new and {len(updated)} changed records to import')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            for record in pending:
+                f.write(json.dumps(record, default=isoformat) + '\n')
+        print(f'   📝 Records written to {args.output}')
+
+    if args.dry_run:
+        print(f'\n🧪 Dry run complete in {time.perf_counter() - started:.2f}s - nothing written')
+        return
+
+    loaded, resolved, unresolved, unknown = load(pending, args.replace, args.batch_size)
+
+    # Records for unknown boats stay out of the manifest so they import once the boat exists
+    record_hashes = dict(manifest['records'])
+    record_hashes.update({r['notion_source_key']: record_hash(r) for r in resolved})
+    save_manifest(args.manifest, members, record_hashes, unresolved)
+
+    print(f'\n✅ Loaded {loaded} service logs in {time.perf_counter() - started:.2f}s')
+    print(f'   📋 Manifest updated: {args.manifest}')
+    if unknown:
+        print(f'⚠️  {sum(unknown.values())} records skipped for {len(unknown)} boats not in database:')
+        for name, count in sorted(unknown.items()):
+            print(f'   - {name} ({count})')
+
+
+if __name__ == '__main__':
+    main()
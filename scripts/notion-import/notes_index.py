@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Service Notes Search Index
+
+Builds a local SQLite FTS5 index over technician notes from the Notion
+export (per-service pages and Conditions/Admin rows) and from
+service_logs.notes, with boat and date facets.
+
+Updates are incremental: each note is stored with a content hash and only
+new or changed notes are re-indexed; service_logs are read from the last
+updated_at watermark. service_logs imported from Notion
+(data_source = 'notion') are skipped since the export already covers them.
+
+Usage:
+    python scripts/notion-import/notes_index.py build [SOURCE ...] [--no-database]
+    python scripts/notion-import/notes_index.py search "gudgeon play" [--boat NAME]
+        [--from 2023-01-01] [--to 2024-12-31] [--limit 20] [--json]
+    python scripts/notion-import/notes_index.py serve [--port 8765]
+
+    GET /search?q=gudgeon&boat=Maris&from=2023-01-01&limit=20
+
+All commands take --index (default notes-index.sqlite). build reads
+DATABASE_URL unless --no-database is given.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from export_manifest import collect_members
+from notion_export import attach_page_ids, build_records, clean, parse_date, parse_file
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_EXPORT_DIR = os.path.join(REPO_ROOT, 'archive', 'notion-exports', 'notion-export-new')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    boat TEXT,
+    service_date TEXT,
+    content_hash TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notes_boat ON notes(boat COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_notes_service_date ON notes(service_date);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    body, content='notes', content_rowid='id', tokenize='porter unicode61'
+);
+
+-- Keep the external-content FTS table in step with notes
+CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts(rowid, body) VALUES (new.id, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, body) VALUES ('delete', old.id, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    INSERT INTO notes_fts(rowid, body) VALUES (new.id, new.body);
+END;
+
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def open_index(path):
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def content_hash(doc):
+    payload = json.dumps([doc['boat'], doc['service_date'], doc['body']])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# ============================================================================
+# Document collection
+# ============================================================================
+
+def notion_documents(sources):
+    """
+    One document per service record: its table notes plus the notes and body
+    of every page matched to it (a record usually has both a Conditions and
+    an Admin page), with repeated paragraphs dropped. Pages not matched to a
+    record get a document of their own.
+    """
+    members, _ = collect_members(sources)
+    pages, tables = [], []
+    for member in members.values():
+        parsed = parse_file(member['name'], member['data'])
+        if parsed:
+            (pages if parsed[0] == 'page' else tables).append(parsed[1])
+
+    records, _ = build_records(tables)
+    attach_page_ids(records, tables, pages)
+    pages_by_id = {page['page_id']: page for page in pages}
+    matched = {page_id for record in records for page_id in record['notion_page_ids']}
+
+    for page in pages:
+        if page['page_id'] in matched:
+            continue
+        body = join_parts([clean(page['properties'].get('Notes')), page['body']])
+        if not body:
+            continue
+        service_date = parse_date(page['properties'].get('Date'))
+        yield {
+            'doc_key': f"notion-page:{page['page_id']}",
+            'source': 'notion',
+            'boat': None,
+            'service_date': service_date.isoformat() if service_date else None,
+            'body': body,
+        }
+
+    for record in records:
+        parts = [record['notes']]
+        for page_id in record['notion_page_ids']:
+            page = pages_by_id[page_id]
+            parts += [clean(page['properties'].get('Notes')), page['body']]
+        body = join_parts(parts)
+        if not body:
+            continue
+        yield {
+            'doc_key': f"notion-row:{record['notion_source_key']}",
+            'source': 'notion',
+            'boat': record['boat_name'],
+            'service_date': record['service_date'].isoformat(),
+            'body': body,
+        }
+
+
+def join_parts(parts):
+    """Join non-empty text parts, skipping exact repeats."""
+    unique = []
+    for part in parts:
+        part = (part or '').strip()
+        if part and part not in unique:
+            unique.append(part)
+    return '\n\n'.join(unique)
+
+
+def fetch_service_log_notes(since):
+    """
+    Notes from service_logs changed after the `since` watermark.
+
+    Returns (documents, live_keys, watermark) where live_keys covers every
+    service log that still has notes, so deleted logs can be dropped.
+    """
+    import psycopg2
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print('❌ Missing DATABASE_URL (source db-env.sh or use --no-database)')
+        sys.exit(1)
+
+    documents, watermark = [], since
+    connection = psycopg2.connect(database_url)
+    try:
+        with connection.cursor(name='service_log_notes') as cursor:
+            cursor.itersize = 5000
+            cursor.execute("""
+                SELECT sl.id, b.name, sl.service_date, sl.notes,
+                       COALESCE(sl.updated_at, sl.created_at) AS changed_at
+                FROM service_logs sl
+                LEFT JOIN boats b ON b.id = sl.boat_id
+                WHERE sl.data_source IS DISTINCT FROM 'notion'
+                  AND NULLIF(TRIM(sl.notes), '') IS NOT NULL
+                  AND COALESCE(sl.updated_at, sl.created_at) > %s
+                ORDER BY changed_at
+            """, (since,))
+            for log_id, boat, service_date, notes, changed_at in cursor:
+                documents.append({
+                    'doc_key': f'service-log:{log_id}',
+                    'source': 'service_logs',
+                    'boat': boat,
+                    'service_date': service_date.isoformat() if service_date else None,
+                    'body': notes.strip(),
+                })
+                watermark = changed_at.isoformat()
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id::text FROM service_logs
+                WHERE data_source IS DISTINCT FROM 'notion'
+                  AND NULLIF(TRIM(notes), '') IS NOT NULL
+            """)
+            live_keys = {f'service-log:{log_id}' for (log_id,) in cursor}
+    finally:
+        connection.close()
+
+    return documents, live_keys, watermark
+
+
+# ============================================================================
+# Build
+# ============================================================================
+
+def upsert(connection, documents, known):
+    """Insert or update documents whose hash changed; returns (added, updated)."""
+    added = updated = 0
+    for doc in documents:
+        digest = content_hash(doc)
+        previous = known.get(doc['doc_key'])
+        if previous == digest:
+            continue
+        row = (doc['source'], doc['boat'], doc['service_date'], digest, doc['body'], doc['doc_key'])
+        if previous is None:
+            connection.execute(
+                'INSERT INTO notes (source, boat, service_date, content_hash, body, doc_key) '
+                'VALUES (?, ?, ?, ?, ?, ?)', row)
+            added += 1
+        else:
+            connection.execute(
+                'UPDATE notes SET source = ?, boat = ?, service_date = ?, content_hash = ?, body = ? '
+                'WHERE doc_key = ?', row)
+            updated += 1
+        known[doc['doc_key']] = digest
+    return added, updated
+
+
+def remove_missing(connection, prefix, live_keys, known):
+    stale = [key for key in known if key.startswith(prefix) and key not in live_keys]
+    connection.executemany('DELETE FROM notes WHERE doc_key = ?', [(key,) for key in stale])
+    return len(stale)
+
+
+def build(args):
+    started = time.perf_counter()
+    connection = open_index(args.index)
+    known = dict(connection.execute('SELECT doc_key, content_hash FROM notes'))
+
+    with connection:
+        notion_docs = list(notion_documents(args.sources))
+        added, updated = upsert(connection, notion_docs, known)
+        live = {doc['doc_key'] for doc in notion_docs}
+        removed = remove_missing(connection, 'notion-', live, known)
+        print(f'📓 Notion: {len(notion_docs)} notes - {added} added, {updated} updated, {removed} removed')
+
+        if not args.no_database:
+            watermark_row = connection.execute(
+                "SELECT value FROM index_state WHERE key = 'service_logs_watermark'").fetchone()
+            watermark = watermark_row[0] if watermark_row else '1970-01-01T00:00:00'
+
+            docs, live_keys, watermark = fetch_service_log_notes(watermark)
+            added, updated = upsert(connection, docs, known)
+            removed = remove_missing(connection, 'service-log:', live_keys, known)
+            connection.execute(
+                "INSERT INTO index_state (key, value) VALUES ('service_logs_watermark', ?) "
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value', (watermark,))
+            print(f'🔧 service_logs: {len(docs)} changed notes - {added} added, {updated} updated, '
+                  f'{removed} removed')
+
+    connection.execute("INSERT INTO notes_fts(notes_fts) VALUES ('optimize')")
+    connection.commit()
+    total = connection.execute('SELECT COUNT(*) FROM notes').fetchone()[0]
+    connection.close()
+    print(f'\n✅ {total} notes indexed in {args.index} ({time.perf_counter() - started:.2f}s)')
+
+
+# ============================================================================
+# Search
+# ============================================================================
+
+def to_match_query(text):
+    """Quote each term so user input can't be parsed as FTS5 syntax."""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def search(connection, query, boat=None, date_from=None, date_to=None, limit=20):
+    """Ranked matches plus boat/year facet counts for the same filter."""
+    match = to_match_query(query)
+    if not match:
+        return {'query': query, 'total': 0, 'results': [], 'facets': {'boat': [], 'year': []}}
+
+    filters, params = ['notes_fts MATCH ?'], [match]
+    if boat:
+        filters.append('n.boat = ? COLLATE NOCASE')
+        params.append(boat)
+    if date_from:
+        filters.append('n.service_date >= ?')
+        params.append(date_from)
+    if date_to:
+        filters.append('n.service_date <= ?')
+        params.append(date_to)
+    where = ' AND '.join(filters)
+
+    started = time.perf_counter()
+    rows = connection.execute(f"""
+        SELECT n.doc_key, n.source, n.boat, n.service_date,
+               snippet(notes_fts, 0, '[', ']', '…', 16) AS snippet,
+               bm25(notes_fts) AS score
+        FROM notes_fts
+        JOIN notes n ON n.id = notes_fts.rowid
+        WHERE {where}
+        ORDER BY score
+        LIMIT ?
+    """, params + [limit]).fetchall()
+
+    boats = connection.execute(f"""
+        SELECT n.boat AS value, COUNT(*) AS count
+        FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+        WHERE {where}
+        GROUP BY n.boat ORDER BY count DESC LIMIT 20
+    """, params).fetchall()
+
+    years = connection.execute(f"""
+        SELECT substr(n.service_date, 1, 4) AS value, COUNT(*) AS count
+        FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+        WHERE {where}
+        GROUP BY value ORDER BY value
+    """, params).fetchall()
+
+    return {
+        'query': query,
+        'total': sum(row['count'] for row in years),
+        'took_ms': round((time.perf_counter() - started) * 1000, 2),
+        'results': [dict(row) for row in rows],
+        'facets': {
+            'boat': [dict(row) for row in boats],
+            'year': [dict(row) for row in years],
+        },
+    }
+
+
+def run_search(args):
+    connection = open_index(args.index)
+    result = search(connection, args.query, args.boat, args.date_from, args.date_to, args.limit)
+    connection.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"🔍 {result['total']} notes match \"{args.query}\" ({result.get('took_ms', 0)}ms)\n")
+    for row in result['results']:
+        print(f"  {row['service_date'] or '????-??-??'}  {row['boat'] or '(unknown boat)'}  [{row['source']}]")
+        print(f"    {row['snippet']}")
+    if result['facets']['boat']:
+        print('\nBoats: ' + ', '.join(f"{f['value'] or '?'} ({f['count']})" for f in result['facets']['boat']))
+        print('Years: ' + ', '.join(f"{f['value'] or '?'} ({f['count']})" for f in result['facets']['year']))
+
+
+# ============================================================================
+# JSON API
+# ============================================================================
+
+def serve(args):
+    connection = sqlite3.connect(args.index, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+
+    class SearchHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/search':
+                self.respond(404, {'error': 'Not found'})
+                return
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if not params.get('q'):
+                self.respond(400, {'error': 'Missing q parameter'})
+                return
+            try:
+                limit = min(int(params.get('limit', 20)), 200)
+            except ValueError:
+                self.respond(400, {'error': 'limit must be an integer'})
+                return
+            result = search(connection, params['q'], params.get('boat'),
+                            params.get('from'), params.get('to'), limit)
+            self.respond(200, result)
+
+        def respond(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), SearchHandler)
+    print(f'🚀 Notes search API on http://127.0.0.1:{args.port}/search?q=...')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text index over service notes')
+    parser.add_argument('--index', default='notes-index.sqlite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='Create or incrementally update the index')
+    build_parser.add_argument('sources', nargs='*', default=[DEFAULT_EXPORT_DIR])
+    build_parser.add_argument('--no-database', action='store_true')
+
+    search_parser = commands.add_parser('search', help='Query the index')
+    search_parser.add_argument('query')
+    search_parser.add_argument('--boat')
+    search_parser.add_argument('--from', dest='date_from')
+    search_parser.add_argument('--to', dest='date_to')
+    search_parser.add_argument('--limit', type=int, default=20)
+    search_parser.add_argument('--json', action='store_true')
+
+    serve_parser = commands.add_parser('serve', help='Serve GET /search as JSON')
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    args = parser.parse_args()
+    {'build': build, 'search': run_search, 'serve': serve}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
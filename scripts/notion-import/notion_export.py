@@ -0,0 +1,369 @@
+"""
+Notion export parsing
+
+Shared by the Notion import scripts. Parses the flattened Notion export
+(per-service "01 <page_id>.md" pages and per-boat "<Boat> Conditions/Admin/
+Services <db_id>.csv" tables) and normalizes it into service_logs-shaped
+records, matching the field mapping of the original Operations CSV import
+(raw paint/growth values, data_source = 'notion').
+"""
+
+import csv
+import io
+import re
+from collections import Counter
+from datetime import date, datetime
+
+FILENAME_RE = re.compile(
+    r'^(?P<title>.*?) (?P<page_id>[0-9a-f]{32})(?P<all>_all)?\.(?P<ext>md|csv)$'
+)
+TABLE_TITLE_RE = re.compile(
+    r'^(?P<boat>.+?) (?P<kind>Conditions|Admin|Services|Service Table|Service Log)(?: \(\d+\))?$'
+)
+PROPERTY_RE = re.compile(r'^(?P<key>[^:\n]{1,40}): ?(?P<value>.*)$')
+
+CONDITION_KINDS = {'Conditions', 'Services', 'Service Table'}
+ADMIN_KINDS = {'Admin', 'Services', 'Service Table'}
+
+# service_logs columns written by the importers, in COPY order
+RECORD_COLUMNS = [
+    'boat_id',
+    'customer_id',
+    'service_type',
+    'service_date',
+    'time_in',
+    'time_out',
+    'total_hours',
+    'paint_condition_overall',
+    'growth_level',
+    'thru_hull_condition',
+    'propellers',
+    'anode_conditions',
+    'notes',
+    'data_source',
+    'created_by',
+    'notion_source_key',
+]
+
+
+def parse_filename(name):
+    """Split an export file name into title, Notion ID and table kind."""
+    match = FILENAME_RE.match(name.rsplit('/', 1)[-1])
+    if not match:
+        return None
+
+    info = {
+        'title': match.group('title'),
+        'page_id': match.group('page_id'),
+        'is_all': bool(match.group('all')),
+        'ext': match.group('ext'),
+        'boat': None,
+        'kind': None,
+    }
+
+    table = TABLE_TITLE_RE.match(info['title'])
+    if table:
+        info['boat'] = table.group('boat').strip()
+        info['kind'] = table.group('kind')
+
+    return info
+
+
+def clean(value):
+    """Trim a cell; Notion exports 'None' for empty select values."""
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def parse_date(value):
+    """Parse MM/DD/YYYY or 'Month D, YYYY' into a date."""
+    value = clean(value)
+    if not value:
+        return None
+    for fmt in ('%m/%d/%Y', '%B %d, %Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_hhmm_minutes(value):
+    """
+    Parse an HHMM integer cell (e.g. '1447', '905') into minutes since
+    midnight. Shared by the importer and the time backfill so both read the
+    same cells the same way: 1-2 digit values such as '27' or '0' are
+    malformed, not 00:27 / 00:00.
+    """
+    value = clean(value)
+    if not value or not value.isdigit() or len(value) not in (3, 4):
+        return None
+    hours, minutes = divmod(int(value), 100)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def parse_hhmm(value):
+    """Parse an HHMM integer cell into 'HH:MM' (see parse_hhmm_minutes)."""
+    minutes = parse_hhmm_minutes(value)
+    if minutes is None:
+        return None
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def parse_int(value):
+    value = clean(value)
+    if not value:
+        return None
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def parse_markdown_page(name, text):
+    """Parse a per-service page into {page_id, row, properties, body}."""
+    info = parse_filename(name)
+    if not info or info['ext'] != 'md':
+        return None
+
+    lines = text.lstrip('﻿').splitlines()
+    properties = {}
+    body_start = len(lines)
+
+    # "# <title>", blank line, then "Key: value" lines until the first blank
+    for index, line in enumerate(lines[2:], start=2):
+        if not line.strip():
+            body_start = index + 1
+            break
+        match = PROPERTY_RE.match(line)
+        if match:
+            properties[match.group('key').strip()] = match.group('value')
+
+    return {
+        'page_id': info['page_id'],
+        'title': info['title'],
+        'row': parse_int(info['title']),
+        'properties': properties,
+        'body': '\n'.join(lines[body_start:]).strip(),
+    }
+
+
+def parse_csv_table(name, text):
+    """Parse a per-boat table into {db_id, boat, kind, rows}."""
+    info = parse_filename(name)
+    if not info or info['ext'] != 'csv':
+        return None
+
+    reader = csv.DictReader(io.StringIO(text.lstrip('﻿')))
+    return {
+        'db_id': info['page_id'],
+        'boat': info['boat'],
+        'kind': info['kind'],
+        'is_all': info['is_all'],
+        'rows': [row for row in reader],
+    }
+
+
+def parse_file(name, data):
+    """Parse one export member (bytes) into ('page'|'table', parsed) or None."""
+    info = parse_filename(name)
+    if not info:
+        return None
+    text = data.decode('utf-8', errors='replace')
+    if info['ext'] == 'md':
+        if parse_int(info['title']) is None:
+            return None  # per-boat overview pages, not service rows
+        return ('page', parse_markdown_page(name, text))
+    return ('table', parse_csv_table(name, text))
+
+
+def condition_fields(row):
+    """Map Conditions/Services columns onto service_logs fields."""
+    anodes = clean(row.get('Anodes'))
+    prop = clean(row.get('Prop'))
+    return {
+        'paint_condition_overall': clean(row.get('Paint')),
+        'growth_level': clean(row.get('Growth')),
+        'thru_hull_condition': clean(row.get('Thru-hulls')),
+        'propellers': [{'condition': prop}] if prop and prop != 'None' else [],
+        'anode_conditions': [{'overall_condition': anodes}] if anodes and anodes != 'None' else [],
+        'notes': clean(row.get('Notes')),
+    }
+
+
+def admin_fields(row):
+    """Map Admin/Services columns onto service_logs time fields."""
+    duration = parse_int(row.get('Duration'))
+    return {
+        'time_in': parse_hhmm(row.get('Time In')),
+        'time_out': parse_hhmm(row.get('Time Out')),
+        'total_hours': round(duration / 60, 2) if duration and 0 < duration <= 24 * 60 else None,
+    }
+
+
+def row_keys(table):
+    """
+    Yield (source_key, row, duplicated) for each row of a table.
+
+    The key is '<db_id>:<#>'. '#' is not unique in every export (e.g. two
+    rows numbered '05'), so repeated numbers get their occurrence in file
+    order appended ('<db_id>:05~2') and are flagged as duplicated.
+    """
+    counts = Counter(clean(row.get('#')) for row in table['rows'])
+    seen = Counter()
+    for row in table['rows']:
+        number = clean(row.get('#'))
+        seen[number] += 1
+        if counts[number] > 1:
+            yield f"{table['db_id']}:{row.get('#')}~{seen[number]}", row, True
+        else:
+            yield f"{table['db_id']}:{row.get('#')}", row, False
+
+
+def build_records(tables):
+    """
+    Merge per-boat tables into service_logs-shaped records.
+
+    Conditions rows are joined to Admin rows of the same boat by row number
+    ('#'). _all.csv copies are ignored when the plain table is present.
+    Returns (records, rejected) where rejected rows lack a boat or date, or
+    share their '#' with another row of the same table (which Conditions and
+    Admin row belong together is then unknown, so neither is guessed).
+    """
+    plain = {t['db_id'] for t in tables if not t['is_all']}
+    tables = [t for t in tables if not t['is_all'] or t['db_id'] not in plain]
+
+    by_boat = {}
+    rejected = []
+    for table in tables:
+        if not table['boat'] or table['kind'] not in CONDITION_KINDS | ADMIN_KINDS:
+            reason = 'no_boat' if not table['boat'] else 'unsupported_table'
+            rejected.extend({'db_id': table['db_id'], 'row': r.get('#'), 'reason': reason}
+                            for r in table['rows'])
+            continue
+        by_boat.setdefault(table['boat'], []).append(table)
+
+    records = []
+    for boat, boat_tables in by_boat.items():
+        admin_rows = {}
+        for table in boat_tables:
+            if table['kind'] == 'Admin':
+                for key, row, duplicated in row_keys(table):
+                    if duplicated:
+                        rejected.append({'db_id': key, 'boat': boat, 'reason': 'duplicate_row_number'})
+                        continue
+                    admin_rows.setdefault(parse_int(row.get('#')), (key, row))
+
+        used_admin = set()
+        for table in sorted(boat_tables, key=lambda t: t['db_id']):
+            if table['kind'] not in CONDITION_KINDS:
+                continue
+            for key, row, duplicated in row_keys(table):
+                if duplicated:
+                    rejected.append({'db_id': key, 'boat': boat, 'reason': 'duplicate_row_number'})
+                    continue
+                number = parse_int(row.get('#'))
+                record = new_record(boat, key)
+                record.update(condition_fields(row))
+                record['service_date'] = parse_date(row.get('Date'))
+
+                admin = admin_rows.get(number)
+                if admin:
+                    used_admin.add(number)
+                    record['admin_source_key'] = admin[0]
+                    record.update(admin_fields(admin[1]))
+                    record['service_date'] = record['service_date'] or parse_date(admin[1].get('Date'))
+                if table['kind'] != 'Conditions':
+                    record.update({k: v for k, v in admin_fields(row).items() if v is not None})
+
+                append_or_reject(records, rejected, record)
+
+        for number, (key, row) in admin_rows.items():
+            if number in used_admin:
+                continue
+            record = new_record(boat, key)
+            record.update(admin_fields(row))
+            record['service_date'] = parse_date(row.get('Date'))
+            append_or_reject(records, rejected, record)
+
+    return records, rejected
+
+
+def new_record(boat, source_key):
+    return {
+        'boat_name': boat,
+        'service_type': 'hull_cleaning',
+        'service_date': None,
+        'time_in': None,
+        'time_out': None,
+        'total_hours': None,
+        'paint_condition_overall': None,
+        'growth_level': None,
+        'thru_hull_condition': None,
+        'propellers': [],
+        'anode_conditions': [],
+        'notes': None,
+        'data_source': 'notion',
+        'created_by': 'notion_import',
+        'notion_source_key': source_key,
+        'admin_source_key': None,
+        'notion_page_ids': [],
+    }
+
+
+def append_or_reject(records, rejected, record):
+    if record['service_date'] is None:
+        rejected.append({'db_id': record['notion_source_key'], 'boat': record['boat_name'],
+                         'reason': 'no_date'})
+    else:
+        records.append(record)
+
+
+def page_fingerprint(row_number, fields):
+    """Identity of a row shared by its CSV line and its markdown page."""
+    return (
+        row_number,
+        clean(fields.get('Date')),
+        clean(fields.get('Paint')),
+        clean(fields.get('Time In')),
+        clean(fields.get('Time Out')),
+        (clean(fields.get('Notes')) or '')[:60],
+    )
+
+
+def attach_page_ids(records, tables, pages):
+    """
+    Link markdown pages to records via their row fingerprint.
+
+    Only unambiguous matches are attached; returns the unmatched pages.
+    """
+    by_key = {r['notion_source_key']: r for r in records}
+    by_key.update({r['admin_source_key']: r for r in records if r['admin_source_key']})
+    candidates = {}
+    for table in tables:
+        for key, row, _ in row_keys(table):
+            if key in by_key:
+                fingerprint = page_fingerprint(parse_int(row.get('#')), row)
+                matches = candidates.setdefault(fingerprint, [])
+                if all(match is not by_key[key] for match in matches):
+                    matches.append(by_key[key])
+
+    unmatched = []
+    for page in pages:
+        matches = candidates.get(page_fingerprint(page['row'], page['properties']), [])
+        if len(matches) == 1:
+            matches[0]['notion_page_ids'].append(page['page_id'])
+        else:
+            unmatched.append(page)
+
+    for record in records:
+        record['notion_page_ids'].sort()
+    return unmatched
+
+
+def isoformat(value):
+    return value.isoformat() if isinstance(value, date) else value
@@ -0,0 +1,401 @@
+#!/usr/bin/env node
+
+/**
+ * Boat Ownership Anomaly Scanner
+ *
+ * Replaces the per-boat lookups in audit-multiple-boat-owners.mjs,
+ * investigate-boat-ownership.mjs and fix-boat-ownership-issues.mjs with one
+ * grouped query streamed through a server-side cursor, one boat at a time:
+ *
+ * - Multiple owners: boats.customer_id, the customer named by the
+ *   denormalized boats.customer_name and the customer with the latest
+ *   service history disagree
+ * - Orphaned boats: customer_id is NULL or points at no customer
+ * - History under the wrong customer: service_logs / service_orders rows for
+ *   the boat whose customer is not the (proposed) owner - unresolvable IDs,
+ *   or a customer whose history overlaps the owner's (earlier owners whose
+ *   history ends before the current owner's starts are left alone)
+ *
+ * Writes a JSON Lines fix plan (reassign_boat / reassign_history / review)
+ * plus a summary. --apply reads a plan back and applies every non-review
+ * action in one transaction with a few set-based UPDATE ... FROM statements;
+ * each update only matches rows still owned by the plan's "from" customer,
+ * so a stale or re-applied plan changes nothing it should not.
+ *
+ * Usage:
+ *   node scripts/scan-boat-ownership.mjs [--plan=boat-ownership-plan.jsonl] [--fetch=2000] [--samples=10]
+ *   node scripts/scan-boat-ownership.mjs --apply=boat-ownership-plan.jsonl
+ *
+ * The scan exits with code 2 when anomalies are found (for nightly jobs).
+ */
+
+import pg from 'pg';
+import { createReadStream, createWriteStream } from 'fs';
+import { once } from 'events';
+import { createInterface } from 'readline';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const { values: args } = parseArgs({
+  options: {
+    'plan': { type: 'string', default: 'boat-ownership-plan.jsonl' },
+    'apply': { type: 'string' },
+    'fetch': { type: 'string', default: '2000' },
+    'samples': { type: 'string', default: '10' },
+  },
+});
+
+const FETCH_SIZE = parseInt(args.fetch, 10);
+const SAMPLE_SIZE = parseInt(args.samples, 10);
+const APPLY_BATCH_SIZE = 1000;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const UUID_PATTERN = '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$';
+
+// One row per (boat, history source, history customer); boats without
+// history get a single row with NULL history columns. Ordered by boat so
+// each boat's rows arrive together, latest history first.
+const SCAN_QUERY = `
+  WITH named AS (
+    SELECT LOWER(TRIM(name)) AS name_key, (ARRAY_AGG(id))[1] AS customer_id
+    FROM customers
+    WHERE name IS NOT NULL
+    GROUP BY 1
+    HAVING COUNT(*) = 1
+  ),
+  history AS (
+    SELECT
+      sl.boat_id,
+      'service_logs' AS source,
+      sl.customer_id AS raw_customer,
+      COALESCE(by_id.id, by_stripe.id) AS customer_id,
+      COUNT(*)::int AS rows,
+      MIN(COALESCE(sl.service_date, sl.created_at::date))::text AS first_at,
+      MAX(COALESCE(sl.service_date, sl.created_at::date))::text AS last_at
+    FROM service_logs sl
+    LEFT JOIN customers by_id
+      ON by_id.id = CASE WHEN sl.customer_id ~* '${UUID_PATTERN}' THEN sl.customer_id::uuid END
+    LEFT JOIN customers by_stripe
+      ON sl.customer_id LIKE 'cus_%' AND by_stripe.stripe_customer_id = sl.customer_id
+    WHERE sl.boat_id IS NOT NULL
+    GROUP BY sl.boat_id, sl.customer_id, COALESCE(by_id.id, by_stripe.id)
+
+    UNION ALL
+
+    SELECT
+      o.boat_id,
+      'service_orders',
+      o.customer_id::text,
+      c.id,
+      COUNT(*)::int,
+      MIN(o.created_at::date)::text,
+      MAX(o.created_at::date)::text
+    FROM service_orders o
+    LEFT JOIN customers c ON c.id = o.customer_id
+    WHERE o.boat_id IS NOT NULL
+    GROUP BY o.boat_id, o.customer_id, c.id
+  )
+  SELECT
+    b.id AS boat_id,
+    b.name AS boat_name,
+    b.customer_id AS owner_id,
+    owner.id IS NOT NULL AS owner_exists,
+    b.customer_name,
+    named.customer_id AS named_customer_id,
+    h.source,
+    h.raw_customer,
+    h.customer_id AS history_customer_id,
+    h.rows,
+    h.first_at,
+    h.last_at
+  FROM boats b
+  LEFT JOIN customers owner ON owner.id = b.customer_id
+  LEFT JOIN named ON named.name_key = LOWER(TRIM(b.customer_name))
+  LEFT JOIN history h ON h.boat_id = b.id
+  ORDER BY b.id, h.last_at DESC NULLS LAST
+`;
+
+/**
+ * Classify one boat's rows; returns { anomalies, actions }
+ */
+function evaluateBoat(group) {
+  const [boat] = group;
+  const history = group.filter(row => row.source !== null);
+  const owner = boat.owner_exists ? boat.owner_id : null;
+  const named = boat.named_customer_id;
+  const latest = history.find(row => row.history_customer_id)?.history_customer_id ?? null;
+
+  const anomalies = [];
+  const actions = [];
+  const base = { boat_id: boat.boat_id, boat_name: boat.boat_name };
+
+  if (!owner) {
+    anomalies.push('orphaned_boat');
+  }
+  if (new Set([owner, named, latest].filter(Boolean)).size > 1) {
+    anomalies.push('multiple_owners');
+  }
+
+  // Proposed owner: the current one unless history (backed by the
+  // denormalized name, or with nothing under the current owner) says otherwise
+  let proposed = owner;
+  const ownerHasHistory = owner && history.some(row => row.history_customer_id === owner);
+
+  if (!owner) {
+    proposed = latest ?? named;
+  } else if (latest && latest !== owner && (named === latest || !ownerHasHistory)) {
+    proposed = latest;
+  } else if (named && named !== owner && latest !== owner) {
+    proposed = null;
+  }
+
+  if (!proposed) {
+    actions.push({ action: 'review', ...base, anomalies: [...anomalies],
+      reason: owner ? 'owner, customer_name and service history disagree' : 'no candidate owner' });
+    return { anomalies, actions };
+  }
+
+  if (proposed !== boat.owner_id) {
+    actions.push({ action: 'reassign_boat', ...base, from_customer_id: boat.owner_id, to_customer_id: proposed,
+      reason: owner ? 'latest service history is under another customer' : 'boat has no valid customer' });
+  }
+
+  const proposedHistory = history.filter(row => row.history_customer_id === proposed);
+  const proposedSince = proposedHistory.map(row => row.first_at).sort()[0] ?? null;
+  const proposedUntil = proposedHistory.map(row => row.last_at).sort().at(-1) ?? null;
+
+  for (const row of history) {
+    if (row.history_customer_id === proposed) continue;
+    // An earlier owner's history that ends before the proposed owner's starts
+    if (row.history_customer_id && proposedSince && row.last_at < proposedSince) continue;
+
+    // Unresolvable IDs always move; another customer's history only when it
+    // overlaps the owner's (history entirely after it may be a sale)
+    const overlaps = proposedUntil !== null && row.first_at <= proposedUntil;
+    const auto = !row.history_customer_id || overlaps;
+    actions.push({
+      action: auto ? 'reassign_history' : 'review',
+      ...base,
+      source: row.source,
+      from_customer: row.raw_customer,
+      to_customer_id: proposed,
+      rows: row.rows,
+      reason: !row.history_customer_id ? 'customer_id matches no customer'
+        : overlaps ? 'history overlaps the owner\'s' : 'history under another customer after the owner\'s',
+    });
+  }
+  if (actions.some(action => action.source)) {
+    anomalies.push('wrong_customer_history');
+  }
+
+  return { anomalies, actions };
+}
+
+/**
+ * Stream the grouped query through a cursor, holding one boat group at a time
+ */
+async function scan() {
+  console.log('🔍 Scanning boat ownership\n');
+  const started = Date.now();
+  const summary = {
+    boats: 0,
+    anomalous_boats: 0,
+    anomalies: { multiple_owners: 0, orphaned_boat: 0, wrong_customer_history: 0 },
+    actions: { reassign_boat: 0, reassign_history: 0, review: 0 },
+    history_rows_to_move: 0,
+  };
+  const samples = [];
+
+  const plan = createWriteStream(args.plan);
+  const write = async (line) => {
+    if (!plan.write(line)) await once(plan, 'drain');
+  };
+
+  const flush = async (group) => {
+    const { anomalies, actions } = evaluateBoat(group);
+    summary.boats++;
+    if (anomalies.length === 0) return;
+
+    summary.anomalous_boats++;
+    anomalies.forEach(anomaly => summary.anomalies[anomaly]++);
+    for (const action of actions) {
+      summary.actions[action.action]++;
+      if (action.action === 'reassign_history') summary.history_rows_to_move += action.rows;
+      await write(JSON.stringify(action) + '\n');
+    }
+    if (samples.length < SAMPLE_SIZE) {
+      samples.push({ boat: group[0].boat_name, anomalies, actions: actions.map(action => action.action) });
+    }
+  };
+
+  const client = await pool.connect();
+  try {
+    await client.query('BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY');
+    await client.query(`DECLARE ownership_scan NO SCROLL CURSOR FOR ${SCAN_QUERY}`);
+
+    let group = [];
+    for (;;) {
+      const { rows } = await client.query(`FETCH ${FETCH_SIZE} FROM ownership_scan`);
+      for (const row of rows) {
+        if (group.length > 0 && group[0].boat_id !== row.boat_id) {
+          await flush(group);
+          group = [];
+        }
+        group.push(row);
+      }
+      if (rows.length < FETCH_SIZE) break;
+    }
+    if (group.length > 0) await flush(group);
+
+    await client.query('COMMIT');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    throw error;
+  } finally {
+    client.release();
+    plan.end();
+    await once(plan, 'finish');
+  }
+
+  console.log(`Scanned ${summary.boats} boats in ${Date.now() - started}ms\n`);
+  console.log(`   Multiple owners:          ${summary.anomalies.multiple_owners}`);
+  console.log(`   Orphaned boats:           ${summary.anomalies.orphaned_boat}`);
+  console.log(`   Wrong-customer history:   ${summary.anomalies.wrong_customer_history}`);
+  console.log('\n📋 Fix plan:');
+  console.log(`   reassign_boat:    ${summary.actions.reassign_boat}`);
+  console.log(`   reassign_history: ${summary.actions.reassign_history} (${summary.history_rows_to_move} rows)`);
+  console.log(`   review:           ${summary.actions.review} (not applied)`);
+
+  if (samples.length > 0) {
+    console.log('\nSamples:');
+    samples.forEach(sample =>
+      console.log(`   - ${sample.boat}: ${sample.anomalies.join(', ')} → ${sample.actions.join(', ') || 'none'}`));
+  }
+
+  return summary;
+}
+
+const APPLY_STATEMENTS = {
+  reassign_boat: `
+    UPDATE boats b
+    SET customer_id = p.to_customer_id,
+        customer_name = c.name,
+        customer_email = c.email,
+        updated_at = NOW()
+    FROM jsonb_to_recordset($1::jsonb) AS p(boat_id UUID, from_customer_id UUID, to_customer_id UUID)
+    JOIN customers c ON c.id = p.to_customer_id
+    WHERE b.id = p.boat_id
+      AND b.customer_id IS NOT DISTINCT FROM p.from_customer_id
+  `,
+  // service_logs.customer_id holds either a customer UUID or a Stripe cus_
+  // ID; moved rows keep the convention they were written with
+  service_logs: `
+    UPDATE service_logs sl
+    SET customer_id = CASE
+      WHEN p.from_customer LIKE 'cus_%' AND c.stripe_customer_id IS NOT NULL THEN c.stripe_customer_id
+      ELSE c.id::text
+    END
+    FROM jsonb_to_recordset($1::jsonb) AS p(boat_id UUID, from_customer TEXT, to_customer_id UUID)
+    JOIN customers c ON c.id = p.to_customer_id
+    WHERE sl.boat_id = p.boat_id
+      AND sl.customer_id IS NOT DISTINCT FROM p.from_customer
+  `,
+  service_orders: `
+    UPDATE service_orders o
+    SET customer_id = p.to_customer_id
+    FROM jsonb_to_recordset($1::jsonb) AS p(boat_id UUID, from_customer TEXT, to_customer_id UUID)
+    WHERE o.boat_id = p.boat_id
+      AND o.customer_id::text IS NOT DISTINCT FROM p.from_customer
+  `,
+};
+
+/**
+ * Apply a plan file in one transaction, APPLY_BATCH_SIZE actions per statement
+ */
+async function apply(path) {
+  console.log(`🔧 Applying boat ownership plan ${path}\n`);
+  const started = Date.now();
+  const batches = { reassign_boat: [], service_logs: [], service_orders: [] };
+  const planned = { reassign_boat: 0, service_logs: 0, service_orders: 0 };
+  const updated = { reassign_boat: 0, service_logs: 0, service_orders: 0 };
+  let reviews = 0;
+
+  const client = await pool.connect();
+  const run = async (kind) => {
+    if (batches[kind].length === 0) return;
+    const result = await client.query(APPLY_STATEMENTS[kind], [JSON.stringify(batches[kind])]);
+    updated[kind] += result.rowCount;
+    batches[kind] = [];
+  };
+
+  try {
+    await client.query('BEGIN');
+
+    // Boats first, so history moves land on the settled owner
+    const lines = createInterface({ input: createReadStream(path), crlfDelay: Infinity });
+    const history = [];
+    for await (const line of lines) {
+      if (!line.trim()) continue;
+      const action = JSON.parse(line);
+      if (action.action === 'review') {
+        reviews++;
+      } else if (action.action === 'reassign_boat') {
+        planned.reassign_boat++;
+        batches.reassign_boat.push(action);
+        if (batches.reassign_boat.length >= APPLY_BATCH_SIZE) await run('reassign_boat');
+      } else if (action.action === 'reassign_history') {
+        history.push(action);
+      }
+    }
+    await run('reassign_boat');
+
+    for (const action of history) {
+      planned[action.source] += action.rows;
+      batches[action.source].push(action);
+      if (batches[action.source].length >= APPLY_BATCH_SIZE) await run(action.source);
+    }
+    await run('service_logs');
+    await run('service_orders');
+
+    await client.query('COMMIT');
+  } catch (error) {
+    await client.query('ROLLBACK');
+    throw error;
+  } finally {
+    client.release();
+  }
+
+  console.log(`   Boats reassigned:        ${updated.reassign_boat} / ${planned.reassign_boat}`);
+  console.log(`   service_logs moved:      ${updated.service_logs} / ${planned.service_logs}`);
+  console.log(`   service_orders moved:    ${updated.service_orders} / ${planned.service_orders}`);
+  console.log(`   Review items skipped:    ${reviews}`);
+  console.log(`\n✅ Applied in ${Date.now() - started}ms (rows already changed since the scan are left as-is)`);
+}
+
+async function main() {
+  try {
+    if (args.apply) {
+      await apply(args.apply);
+    } else {
+      const summary = await scan();
+      if (summary.anomalous_boats > 0) {
+        console.log(`\n⚠️  ${summary.anomalous_boats} boats with ownership anomalies - plan written to ${args.plan}`);
+        console.log(`   Review it, then run: node scripts/scan-boat-ownership.mjs --apply=${args.plan}`);
+        process.exitCode = 2;
+      } else {
+        console.log('\n✅ No ownership anomalies found');
+      }
+    }
+  } catch (error) {
+    console.error('❌ Failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+main();
@@ -0,0 +1,242 @@
+#!/usr/bin/env node
+
+/**
+ * Referential Orphan Scanner
+ *
+ * Replaces the per-relation LEFT JOIN ... WHERE b.id IS NULL checks in
+ * investigate_orphaned_data.sql, fix_orphaned_service_logs.sql and
+ * migrations/fix_orphaned_boat_references.sql with a single scan:
+ *
+ * - Discovers every public table column named boat_id, customer_id,
+ *   order_id or invoice_id whose type matches the parent table's id
+ *   (text order_id columns holding Stripe pi_ IDs are skipped)
+ * - Checks each relation with a NOT EXISTS hash anti-join, spread over
+ *   parallel worker sessions
+ * - Writes one consolidated report with counts and sample IDs
+ *
+ * Usage:
+ *   node scripts/scan-orphaned-references.mjs [--workers=4] [--samples=5] [--output=orphan-scan-report.json]
+ *
+ * Exits with code 2 when orphans are found and 1 when any check failed
+ * (for nightly jobs).
+ */
+
+import pg from 'pg';
+import { writeFileSync } from 'fs';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const { values: args } = parseArgs({
+  options: {
+    'workers': { type: 'string', default: '4' },
+    'samples': { type: 'string', default: '5' },
+    'output': { type: 'string', default: 'orphan-scan-report.json' },
+  },
+});
+
+const WORKERS = parseInt(args.workers, 10);
+const SAMPLE_SIZE = parseInt(args.samples, 10);
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+  max: WORKERS,
+});
+
+// Logical foreign key column → parent table
+const LOGICAL_KEYS = {
+  boat_id: 'boats',
+  customer_id: 'customers',
+  order_id: 'service_orders',
+  invoice_id: 'invoices',
+};
+
+const quote = (identifier) => `"${identifier.replace(/"/g, '""')}"`;
+
+/**
+ * Find all candidate relations from the schema
+ */
+async function discoverRelations() {
+  const { rows } = await pool.query(`
+    WITH logical_keys (column_name, parent_table) AS (
+      SELECT * FROM unnest($1::text[], $2::text[])
+    )
+    SELECT
+      c.table_name,
+      c.column_name,
+      c.data_type,
+      parent_id.data_type AS parent_data_type,
+      EXISTS (
+        SELECT 1 FROM information_schema.columns pk
+        WHERE pk.table_schema = 'public'
+          AND pk.table_name = c.table_name
+          AND pk.column_name = 'id'
+      ) AS has_id,
+      EXISTS (
+        SELECT 1
+        FROM information_schema.key_column_usage kcu
+        JOIN information_schema.table_constraints tc
+          ON tc.constraint_name = kcu.constraint_name
+          AND tc.table_schema = kcu.table_schema
+        WHERE tc.constraint_type = 'FOREIGN KEY'
+          AND kcu.table_schema = 'public'
+          AND kcu.table_name = c.table_name
+          AND kcu.column_name = c.column_name
+      ) AS has_fk_constraint
+    FROM information_schema.columns c
+    JOIN logical_keys lk ON lk.column_name = c.column_name
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema
+      AND t.table_name = c.table_name
+      AND t.table_type = 'BASE TABLE'
+    JOIN information_schema.columns parent_id
+      ON parent_id.table_schema = 'public'
+      AND parent_id.table_name = lk.parent_table
+      AND parent_id.column_name = 'id'
+    WHERE c.table_schema = 'public'
+    ORDER BY c.table_name, c.column_name
+  `, [Object.keys(LOGICAL_KEYS), Object.values(LOGICAL_KEYS)]);
+
+  const relations = [];
+  const skipped = [];
+
+  for (const row of rows) {
+    const relation = {
+      table: row.table_name,
+      column: row.column_name,
+      parent: LOGICAL_KEYS[row.column_name],
+      hasId: row.has_id,
+      enforced: row.has_fk_constraint,
+    };
+
+    if (row.data_type !== row.parent_data_type) {
+      skipped.push({ ...relation, reason: `type ${row.data_type} ≠ ${row.parent_data_type}` });
+    } else {
+      relations.push(relation);
+    }
+  }
+
+  return { relations, skipped };
+}
+
+/**
+ * Count orphans for one relation using a hash anti-join
+ */
+async function checkRelation(client, relation) {
+  const table = quote(relation.table);
+  const column = quote(relation.column);
+  const sampleColumn = relation.hasId ? 'c.id' : `c.${column}`;
+  const started = Date.now();
+
+  const { rows: [result] } = await client.query(`
+    SELECT
+      COUNT(*)::int AS orphaned,
+      COUNT(DISTINCT c.${column})::int AS missing_parents,
+      (ARRAY_AGG(${sampleColumn}::text ORDER BY ${sampleColumn}))[1:${SAMPLE_SIZE}] AS sample_ids,
+      (ARRAY_AGG(DISTINCT c.${column}::text))[1:${SAMPLE_SIZE}] AS sample_missing_parents
+    FROM ${table} c
+    WHERE c.${column} IS NOT NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM ${quote(relation.parent)} p WHERE p.id = c.${column}
+      )
+  `);
+
+  return {
+    ...relation,
+    orphaned: result.orphaned,
+    missingParents: result.missing_parents,
+    sampleIds: result.sample_ids || [],
+    sampleMissingParents: result.sample_missing_parents || [],
+    durationMs: Date.now() - started,
+  };
+}
+
+/**
+ * Run checks across WORKERS sessions, each pulling from a shared queue
+ */
+async function runChecks(relations) {
+  const queue = [...relations];
+  const results = [];
+
+  const worker = async () => {
+    const client = await pool.connect();
+    try {
+      // Steer the planner to hash anti-joins for full-table scans
+      await client.query('SET enable_nestloop = off');
+      await client.query("SET work_mem = '64MB'");
+
+      while (queue.length > 0) {
+        const relation = queue.shift();
+        try {
+          results.push(await checkRelation(client, relation));
+        } catch (error) {
+          results.push({ ...relation, error: error.message });
+        }
+      }
+    } finally {
+      await client.query('RESET ALL');
+      client.release();
+    }
+  };
+
+  await Promise.all(Array.from({ length: Math.min(WORKERS, relations.length) }, worker));
+
+  return results.sort((a, b) =>
+    a.table.localeCompare(b.table) || a.column.localeCompare(b.column)
+  );
+}
+
+async function scan() {
+  console.log('🔍 Scanning for orphaned boat/customer/order/invoice references\n');
+  const started = Date.now();
+
+  try {
+    const { relations, skipped } = await discoverRelations();
+    console.log(`Found ${relations.length} relations (${skipped.length} skipped), ${WORKERS} workers\n`);
+
+    const results = await runChecks(relations);
+
+    for (const r of results) {
+      const label = `${r.table}.${r.column} → ${r.parent}${r.enforced ? ' (FK)' : ''}`;
+      if (r.error) {
+        console.log(`  ⚠️  ${label}: ${r.error}`);
+      } else if (r.orphaned > 0) {
+        console.log(`  ❌ ${label}: ${r.orphaned} orphaned (${r.missingParents} missing ${r.parent}) e.g. ${r.sampleIds.join(', ')}`);
+      } else {
+        console.log(`  ✅ ${label}`);
+      }
+    }
+
+    const totalOrphaned = results.reduce((sum, r) => sum + (r.orphaned || 0), 0);
+    const failed = results.filter(r => r.error);
+    const report = {
+      scannedAt: new Date().toISOString(),
+      durationMs: Date.now() - started,
+      relationsChecked: results.length,
+      relationsWithOrphans: results.filter(r => r.orphaned > 0).length,
+      relationsFailed: failed.length,
+      totalOrphaned,
+      results,
+      skipped,
+    };
+
+    writeFileSync(args.output, JSON.stringify(report, null, 2));
+
+    console.log('\n' + '='.repeat(50));
+    console.log(`Total orphaned rows: ${totalOrphaned} across ${report.relationsWithOrphans} relations`);
+    if (failed.length > 0) console.log(`⚠️  ${failed.length} checks failed - scan incomplete`);
+    console.log(`Report: ${args.output} (${report.durationMs}ms)`);
+    console.log('='.repeat(50) + '\n');
+
+    // A failed check means the scan is incomplete, which outranks orphans
+    if (failed.length > 0) process.exitCode = 1;
+    else if (totalOrphaned > 0) process.exitCode = 2;
+  } catch (error) {
+    console.error('❌ Orphan scan failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+scan();
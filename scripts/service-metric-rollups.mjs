@@ -0,0 +1,176 @@
+#!/usr/bin/env node
+
+/**
+ * Service Metric Rollups - backfill and consistency check
+ *
+ * Maintains the rollup tables from migration 043:
+ *   --backfill           Rebuild every month from service_logs
+ *   --months=2025-10,... Recompute only these months
+ *   --check              Compare each *_rollup view with its live 023 view
+ *                        (technician_efficiency, monthly_service_metrics,
+ *                        service_type_efficiency) and time both
+ *
+ * The rollups only cover logs with a service_date, so --check evaluates each
+ * live view's definition over dated service_logs only (undated timed logs
+ * are counted and reported separately, not as differences).
+ *
+ * --check exits with code 1 when any row differs, so it can run in CI or
+ * after imports.
+ *
+ * Usage:
+ *   node scripts/service-metric-rollups.mjs --backfill --check
+ *   node scripts/service-metric-rollups.mjs --months=2025-10,2025-11
+ *   node scripts/service-metric-rollups.mjs --check [--show=20]
+ */
+
+import pg from 'pg';
+import { parseArgs } from 'util';
+
+const { Pool } = pg;
+
+const pool = new Pool({
+  connectionString: process.env.DATABASE_URL,
+});
+
+const { values: args } = parseArgs({
+  options: {
+    'backfill': { type: 'boolean', default: false },
+    'months': { type: 'string' },
+    'check': { type: 'boolean', default: false },
+    'show': { type: 'string', default: '10' },
+  },
+});
+
+// Live view → rollup view, compared on these columns (numbers rounded)
+const COMPARISONS = [
+  {
+    live: 'technician_efficiency',
+    rollup: 'technician_efficiency_rollup',
+    keys: ['technician_id', 'technician_name'],
+    values: ['services_completed', 'total_hours_worked', 'avg_service_duration',
+      'services_this_month', 'hours_this_month', 'avg_duration_this_month'],
+  },
+  {
+    live: 'monthly_service_metrics',
+    rollup: 'monthly_service_metrics_rollup',
+    keys: ['month_start'],
+    values: ['total_services', 'total_hours', 'avg_duration', 'unique_boats_serviced',
+      'unique_technicians', 'longest_service', 'shortest_service'],
+  },
+  {
+    live: 'service_type_efficiency',
+    rollup: 'service_type_efficiency_rollup',
+    keys: ['boat_size_category', 'service_complexity'],
+    values: ['service_count', 'avg_hours', 'total_hours', 'min_hours', 'max_hours', 'hours_stddev'],
+  },
+];
+
+function comparableColumns({ keys, values }) {
+  return [
+    ...keys,
+    ...values.map(column => `ROUND(${column}::numeric, 4) AS ${column}`),
+  ].join(', ');
+}
+
+/**
+ * A live view's definition evaluated over dated service_logs only: the CTE
+ * shadows the table the (unqualified) view definition reads from
+ */
+async function datedLiveQuery(view) {
+  const { rows: [{ definition }] } = await pool.query(
+    'SELECT pg_get_viewdef($1::regclass) AS definition', [view]);
+  return `WITH service_logs AS (
+      SELECT * FROM public.service_logs WHERE service_date IS NOT NULL
+    )
+    ${definition.trim().replace(/;$/, '')}`;
+}
+
+async function timeQuery(sql) {
+  const started = Date.now();
+  await pool.query(sql);
+  return Date.now() - started;
+}
+
+/**
+ * Rows that differ between a live view and its rollup view
+ */
+async function compare(comparison, liveQuery) {
+  const columns = comparableColumns(comparison);
+  const { rows } = await pool.query(`
+    WITH live AS (SELECT ${columns} FROM (${liveQuery}) live_view),
+         rollup AS (SELECT ${columns} FROM ${comparison.rollup})
+    SELECT 'live only' AS side, * FROM (SELECT * FROM live EXCEPT SELECT * FROM rollup) a
+    UNION ALL
+    SELECT 'rollup only' AS side, * FROM (SELECT * FROM rollup EXCEPT SELECT * FROM live) b
+  `);
+  return rows;
+}
+
+async function check() {
+  console.log('\n🔍 Comparing rollup views with live views');
+  let failures = 0;
+
+  for (const comparison of COMPARISONS) {
+    const liveQuery = await datedLiveQuery(comparison.live);
+    const liveMs = await timeQuery(liveQuery);
+    const rollupMs = await timeQuery(`SELECT * FROM ${comparison.rollup}`);
+    const mismatches = await compare(comparison, liveQuery);
+
+    const flag = mismatches.length === 0 ? '✓' : '✗';
+    console.log(`   ${flag} ${comparison.rollup}: ${mismatches.length} differing rows ` +
+      `(live ${liveMs}ms, rollup ${rollupMs}ms)`);
+    mismatches.slice(0, parseInt(args.show, 10)).forEach(row => console.log('     ', JSON.stringify(row)));
+    failures += mismatches.length;
+  }
+
+  const { rows: [{ undated }] } = await pool.query(
+    'SELECT COUNT(*)::int AS undated FROM service_logs WHERE total_hours IS NOT NULL AND service_date IS NULL');
+  if (undated > 0) {
+    console.log(`   ⚠️  ${undated} timed service_logs have no service_date (not in rollups)`);
+  }
+
+  return failures;
+}
+
+async function main() {
+  console.log('📊 Service metric rollups\n');
+
+  if (!args.backfill && !args.months && !args.check) {
+    console.log('Nothing to do - pass --backfill, --months=YYYY-MM,... and/or --check');
+    process.exitCode = 1;
+    await pool.end();
+    return;
+  }
+
+  try {
+    if (args.backfill) {
+      const started = Date.now();
+      const { rows: [{ months }] } = await pool.query(
+        'SELECT refresh_service_metric_rollups() AS months');
+      console.log(`✓ Backfilled ${months} months in ${Date.now() - started}ms`);
+    } else if (args.months) {
+      const months = args.months.split(',').map(month => `${month.trim()}-01`);
+      const started = Date.now();
+      const { rows: [{ refreshed }] } = await pool.query(
+        'SELECT refresh_service_metric_rollups($1::date[]) AS refreshed', [months]);
+      console.log(`✓ Recomputed ${refreshed} months in ${Date.now() - started}ms`);
+    }
+
+    if (args.check) {
+      const failures = await check();
+      if (failures > 0) {
+        console.log('\n❌ Rollups differ from the live views - run with --backfill to rebuild');
+        process.exitCode = 1;
+      } else {
+        console.log('\n✅ Rollups match the live views');
+      }
+    }
+  } catch (error) {
+    console.error('❌ Failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await pool.end();
+  }
+}
+
+main();
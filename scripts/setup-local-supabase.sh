@@ -162,3 +162,6 @@ echo ""
 echo "6. Start services with local database:"
 echo "   ${BLUE}./scripts/start-dev.sh all${NC}"
 echo ""
+echo "7. (Optional) Load a synthetic fleet for load testing:"
+echo "   ${BLUE}python scripts/notion-import/generate_fleet.py --scale 100${NC}"
+echo ""
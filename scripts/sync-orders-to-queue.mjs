@@ -3,6 +3,12 @@
  * Sync Service Orders to Scheduling Queue
  *
  * Creates scheduling_queue entries for pending service_orders that don't have them
+ *
+ * New orders are queued by the service_orders_enqueue trigger (migration 044);
+ * this runs the same reconciliation on demand for anything missed.
+ *
+ * Usage:
+ *   node scripts/sync-orders-to-queue.mjs
  */
 
 import { createClient } from '@supabase/supabase-js';
@@ -26,88 +32,30 @@ async function syncToQueue() {
   console.log('\n🔄 Syncing Pending Service Orders to Scheduling Queue\n');
 
   try {
-    // Find pending service_orders without scheduling_queue entries
-    console.log('1️⃣  Finding orphaned service orders...');
-    const { data: orphanedOrders, error: findError } = await supabase
-      .from('service_orders')
-      .select(`
-        id,
-        customer_id,
-        boat_id,
-        service_type,
-        notes,
-        created_at
-      `)
-      .eq('status', 'pending')
-      .is('scheduled_date', null);
-
-    if (findError) {
-      console.error('❌ Error finding orders:', findError.message);
+    // One anti-join INSERT in the database; orders that already have an
+    // entry are skipped, so this is safe to rerun or run concurrently
+    const started = Date.now();
+    const { data: created, error: syncError } = await supabase
+      .rpc('enqueue_pending_service_orders');
+
+    if (syncError) {
+      console.error('❌ Error syncing queue:', syncError.message);
+      console.error('   Is migrations/044_scheduling_queue_reconciliation.sql applied?');
       process.exit(1);
     }
 
-    console.log(`✅ Found ${orphanedOrders.length} pending service orders`);
+    console.log(`✅ Created ${created} queue entries in ${Date.now() - started}ms`);
 
-    if (orphanedOrders.length === 0) {
+    if (created === 0) {
       console.log('\n✨ No orders to sync. Queue is up to date!');
       return;
     }
 
-    // Check which ones already have queue entries
-    console.log('\n2️⃣  Checking existing queue entries...');
-    const { data: existingQueue } = await supabase
-      .from('scheduling_queue')
-      .select('scheduled_service_order_id')
-      .in('scheduled_service_order_id', orphanedOrders.map(o => o.id));
-
-    const existingIds = new Set(existingQueue?.map(q => q.scheduled_service_order_id) || []);
-
-    // Filter to only orders that don't have queue entries
-    const ordersToSync = orphanedOrders.filter(o => !existingIds.has(o.id));
-
-    console.log(`✅ ${ordersToSync.length} orders need queue entries`);
-
-    if (ordersToSync.length === 0) {
-      console.log('\n✨ All orders already in queue!');
-      return;
-    }
-
-    // Create queue entries
-    console.log('\n3️⃣  Creating queue entries...');
-    const queueEntries = ordersToSync.map(order => ({
-      customer_id: order.customer_id,
-      boat_id: order.boat_id,
-      service_type: order.service_type || 'Hull Cleaning',
-      priority: 'normal',
-      notes: order.notes,
-      status: 'pending',
-      added_at: order.created_at,
-      scheduled_service_order_id: null // Will link when scheduled
-    }));
-
-    const { data: inserted, error: insertError } = await supabase
-      .from('scheduling_queue')
-      .insert(queueEntries)
-      .select();
-
-    if (insertError) {
-      console.error('❌ Error creating queue entries:', insertError.message);
-      process.exit(1);
-    }
-
-    console.log(`✅ Created ${inserted.length} queue entries`);
-
-    // Show summary
-    console.log('\n📋 Summary:');
-    inserted.forEach((entry, i) => {
-      console.log(`   ${i + 1}. ${entry.service_type} - ${entry.priority} priority`);
-    });
-
     console.log('\n🎉 Success! Queue synced.');
     console.log('\nNext steps:');
     console.log('1. Go to https://ops.sailorskills.com');
     console.log('2. Click Work → Queue');
-    console.log(`3. You should now see ${inserted.length} items in the queue`);
+    console.log(`3. You should now see ${created} new items in the queue`);
     console.log('');
 
   } catch (error) {
@@ -0,0 +1,303 @@
+#!/usr/bin/env node
+/**
+ * Indexed Service Log Linkage
+ * Replaces the per-log invoice scan of 5-link / 5b-relink with:
+ *   - keyset-paginated loads of uninvoiced logs, invoices and payments
+ *   - a per customer (and customer + boat) index of invoices sorted by issue date
+ *   - one sorted-merge pass: logs and invoices are walked in date order with a
+ *     sliding [date - window, date + window] interval, so each invoice is
+ *     visited a bounded number of times
+ *   - bulk writes grouped by invoice (one UPDATE ... IN (...) per invoice chunk)
+ *
+ * Matches where a second invoice is nearly as close as the best one are not
+ * linked; they are written to ambiguous-service-log-matches.json for
+ * `npm run manual-link -- list-ambiguous`.
+ *
+ * Env: DRY_RUN, INVOICE_PREFIX (ZB-), MATCH_WINDOW_DAYS (30), AMBIGUITY_MARGIN_DAYS (2)
+ */
+
+import { supabase, log, writeJSON, writeCSV, validateEnv, fetchAllRows } from './utils.mjs';
+
+const DRY_RUN = process.env.DRY_RUN === 'true';
+const INVOICE_PREFIX = process.env.INVOICE_PREFIX || 'ZB-';
+const MATCH_WINDOW_DAYS = parseInt(process.env.MATCH_WINDOW_DAYS || '30', 10);
+const AMBIGUITY_MARGIN_DAYS = parseFloat(process.env.AMBIGUITY_MARGIN_DAYS || '2');
+const UPDATE_CHUNK_SIZE = 200;
+const UPDATE_CONCURRENCY = 8;
+const DAY_MS = 1000 * 60 * 60 * 24;
+
+const toDay = (value) => Math.floor(new Date(value).getTime() / DAY_MS);
+
+/**
+ * Group rows by key, each group sorted by `day`
+ */
+function buildIndex(rows, keyFn) {
+  const index = new Map();
+  for (const row of rows) {
+    const key = keyFn(row);
+    if (!key) continue;
+    if (!index.has(key)) index.set(key, []);
+    index.get(key).push(row);
+  }
+  for (const group of index.values()) {
+    group.sort((a, b) => a.day - b.day);
+  }
+  return index;
+}
+
+/**
+ * Sorted-merge of one group of logs against one group of invoices.
+ * Both are sorted by day; lo/hi bound the invoices inside the window.
+ * Returns Map(logId → candidates sorted by distance).
+ */
+function mergeGroup(logs, invoices) {
+  const candidates = new Map();
+  let lo = 0;
+  let hi = 0;
+
+  for (const serviceLog of logs) {
+    while (lo < invoices.length && invoices[lo].day < serviceLog.day - MATCH_WINDOW_DAYS) lo++;
+    if (hi < lo) hi = lo;
+    while (hi < invoices.length && invoices[hi].day <= serviceLog.day + MATCH_WINDOW_DAYS) hi++;
+
+    if (hi > lo) {
+      candidates.set(serviceLog.id, invoices.slice(lo, hi)
+        .map(inv => ({ invoice: inv, daysDiff: Math.abs(inv.day - serviceLog.day) }))
+        .sort((a, b) => a.daysDiff - b.daysDiff));
+    }
+  }
+
+  return candidates;
+}
+
+/**
+ * Pick a match from candidates, or flag as ambiguous
+ */
+function resolve(candidates) {
+  if (!candidates || candidates.length === 0) return { status: 'unlinked' };
+  const [best, second] = candidates;
+  if (second && second.daysDiff - best.daysDiff <= AMBIGUITY_MARGIN_DAYS) {
+    return { status: 'ambiguous', candidates: candidates.slice(0, 5) };
+  }
+  return { status: 'linked', invoice: best.invoice, daysDiff: best.daysDiff };
+}
+
+/**
+ * Apply links grouped by invoice, UPDATE_CONCURRENCY requests at a time
+ */
+async function applyUpdates(updates) {
+  const byInvoice = new Map();
+  for (const update of updates) {
+    if (!byInvoice.has(update.invoice_id)) byInvoice.set(update.invoice_id, []);
+    byInvoice.get(update.invoice_id).push(update.id);
+  }
+
+  const jobs = [];
+  for (const [invoiceId, ids] of byInvoice) {
+    for (let i = 0; i < ids.length; i += UPDATE_CHUNK_SIZE) {
+      jobs.push({ invoiceId, ids: ids.slice(i, i + UPDATE_CHUNK_SIZE) });
+    }
+  }
+
+  let updated = 0;
+  const errors = [];
+
+  const worker = async () => {
+    while (jobs.length > 0) {
+      const job = jobs.shift();
+      // Rows linked since the fetch are skipped by the filter; count only what changed
+      const { data, error } = await supabase
+        .from('service_logs')
+        .update({ invoice_id: job.invoiceId })
+        .in('id', job.ids)
+        .is('invoice_id', null)
+        .select('id');
+
+      if (error) {
+        errors.push({ invoice_id: job.invoiceId, count: job.ids.length, error: error.message });
+      } else {
+        updated += data.length;
+      }
+    }
+  };
+
+  await Promise.all(Array.from({ length: UPDATE_CONCURRENCY }, worker));
+  return { requests: byInvoice.size, updated, errors };
+}
+
+async function indexLinkServiceLogs() {
+  validateEnv();
+  const started = Date.now();
+
+  log('INFO', 'Starting indexed service log linkage', {
+    dryRun: DRY_RUN,
+    matchWindowDays: MATCH_WINDOW_DAYS,
+    ambiguityMarginDays: AMBIGUITY_MARGIN_DAYS
+  });
+
+  if (DRY_RUN) {
+    console.log('\n🔍 DRY RUN MODE - No data will be written\n');
+  }
+
+  const [serviceLogs, invoices, payments] = await Promise.all([
+    fetchAllRows('uninvoiced service logs', () => supabase
+      .from('service_logs')
+      .select('id, customer_id, boat_id, order_id, service_date')
+      .is('invoice_id', null)),
+    fetchAllRows('migrated invoices', () => supabase
+      .from('invoices')
+      .select('id, invoice_number, customer_id, boat_id, amount, issued_at')
+      .like('invoice_number', `${INVOICE_PREFIX}%`)),
+    fetchAllRows('payments', () => supabase
+      .from('payments')
+      .select('id, invoice_id, stripe_payment_intent_id')
+      .not('invoice_id', 'is', null))
+  ]);
+
+  const paymentIntentMap = new Map(
+    payments
+      .filter(p => p.stripe_payment_intent_id)
+      .map(p => [p.stripe_payment_intent_id, p.invoice_id])
+  );
+
+  const results = {
+    total: serviceLogs.length,
+    highConfidence: 0,
+    mediumConfidence: 0,
+    ambiguous: 0,
+    unlinked: 0
+  };
+
+  const updates = [];
+  const ambiguous = [];
+  const unlinkedLogs = [];
+
+  // Strategy 1: payment_intent (HIGH CONFIDENCE)
+  const remaining = [];
+  for (const serviceLog of serviceLogs) {
+    const invoiceId = serviceLog.order_id?.startsWith('pi_')
+      ? paymentIntentMap.get(serviceLog.order_id)
+      : null;
+
+    if (invoiceId) {
+      updates.push({ id: serviceLog.id, invoice_id: invoiceId, match_type: 'payment_intent' });
+      results.highConfidence++;
+    } else if (serviceLog.service_date && serviceLog.customer_id) {
+      remaining.push({ ...serviceLog, day: toDay(serviceLog.service_date) });
+    } else {
+      unlinkedLogs.push(serviceLog);
+    }
+  }
+
+  // Strategy 2: date window merge (MEDIUM CONFIDENCE)
+  // Same boat first; fall back to any invoice of the customer
+  const datedInvoices = invoices
+    .filter(inv => inv.issued_at && inv.customer_id)
+    .map(inv => ({ ...inv, day: toDay(inv.issued_at) }));
+
+  const boatKey = (row) => row.boat_id ? `${row.customer_id}|${row.boat_id}` : null;
+  const invoicesByBoat = buildIndex(datedInvoices, boatKey);
+  const invoicesByCustomer = buildIndex(datedInvoices, row => row.customer_id);
+  const logsByBoat = buildIndex(remaining, boatKey);
+  const logsByCustomer = buildIndex(remaining, row => row.customer_id);
+
+  const boatCandidates = new Map();
+  for (const [key, logs] of logsByBoat) {
+    const group = invoicesByBoat.get(key);
+    if (group) mergeGroup(logs, group).forEach((c, id) => boatCandidates.set(id, c));
+  }
+
+  const customerCandidates = new Map();
+  for (const [key, logs] of logsByCustomer) {
+    const group = invoicesByCustomer.get(key);
+    if (group) mergeGroup(logs, group).forEach((c, id) => customerCandidates.set(id, c));
+  }
+
+  for (const serviceLog of remaining) {
+    const match = boatCandidates.has(serviceLog.id)
+      ? resolve(boatCandidates.get(serviceLog.id))
+      : resolve(customerCandidates.get(serviceLog.id));
+
+    if (match.status === 'linked') {
+      updates.push({ id: serviceLog.id, invoice_id: match.invoice.id, match_type: 'date_window' });
+      results.mediumConfidence++;
+    } else if (match.status === 'ambiguous') {
+      results.ambiguous++;
+      ambiguous.push({
+        service_log_id: serviceLog.id,
+        customer_id: serviceLog.customer_id,
+        boat_id: serviceLog.boat_id,
+        service_date: serviceLog.service_date,
+        candidates: match.candidates.map(c => ({
+          invoice_id: c.invoice.id,
+          invoice_number: c.invoice.invoice_number,
+          issued_at: c.invoice.issued_at,
+          amount: c.invoice.amount,
+          days_diff: c.daysDiff,
+          link_command: `npm run manual-link -- ${serviceLog.id} --link ${c.invoice.id}`
+        }))
+      });
+    } else {
+      unlinkedLogs.push(serviceLog);
+    }
+  }
+
+  results.unlinked = unlinkedLogs.length;
+  const matchMs = Date.now() - started;
+
+  let writeResult = { requests: 0, updated: 0, errors: [] };
+  if (!DRY_RUN && updates.length > 0) {
+    log('INFO', 'Updating service logs...', { count: updates.length });
+    writeResult = await applyUpdates(updates);
+    writeResult.errors.forEach(e => log('ERROR', 'Failed to link service logs', e));
+  }
+
+  writeJSON('service-log-linkage-results.json', {
+    ...results,
+    matchWindowDays: MATCH_WINDOW_DAYS,
+    ambiguityMarginDays: AMBIGUITY_MARGIN_DAYS,
+    updated: writeResult.updated,
+    updateRequests: writeResult.requests,
+    errors: writeResult.errors,
+    durationMs: Date.now() - started,
+    sampleUpdates: updates.slice(0, 10)
+  });
+
+  writeJSON('ambiguous-service-log-matches.json', ambiguous);
+
+  if (unlinkedLogs.length > 0) {
+    writeCSV('unlinked-service-logs.csv', unlinkedLogs,
+      ['id', 'customer_id', 'boat_id', 'service_date', 'order_id']);
+  }
+
+  console.log('\n🔗 INDEXED SERVICE LOG LINKAGE SUMMARY\n');
+  console.log('Total Uninvoiced Service Logs:', results.total);
+  console.log('High Confidence (payment_intent):', results.highConfidence);
+  console.log(`Medium Confidence (±${MATCH_WINDOW_DAYS} days):`, results.mediumConfidence);
+  console.log('Ambiguous (manual review):', results.ambiguous);
+  console.log('Unlinked:', results.unlinked);
+  if (results.total > 0) {
+    console.log('\nLinkage Rate:', ((results.highConfidence + results.mediumConfidence) / results.total * 100).toFixed(1) + '%');
+  }
+  console.log(`Matching: ${matchMs}ms, total: ${Date.now() - started}ms`);
+
+  if (ambiguous.length > 0) {
+    console.log('\n⚠️  Ambiguous matches written to ambiguous-service-log-matches.json');
+    console.log('    Review with: npm run manual-link -- list-ambiguous\n');
+  }
+
+  if (writeResult.errors.length > 0) {
+    console.log('⚠️  Errors:', writeResult.errors.length);
+  }
+
+  if (DRY_RUN) {
+    console.log('\n🔍 DRY RUN - No data written. Set DRY_RUN=false to link.\n');
+  } else {
+    console.log(`\n✅ Linked ${writeResult.updated} service logs in ${writeResult.requests} invoice batches\n`);
+  }
+}
+
+indexLinkServiceLogs().catch(err => {
+  log('ERROR', 'Indexed service log linkage failed', { error: err.message });
+  process.exit(1);
+});
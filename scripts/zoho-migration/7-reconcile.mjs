@@ -0,0 +1,357 @@
+#!/usr/bin/env node
+/**
+ * Hash-Partitioned Reconciliation
+ * Row-level comparison of the Zoho CSV exports against the migrated invoices
+ * and Zoho payments, complementing the aggregate checks in 6-validate.mjs:
+ *
+ *   1. Stream source rows (CSV) and target rows (keyset pages) into a
+ *      canonical form per entity, keyed by invoice number
+ *   2. Hash each canonical row and assign it to one of PARTITIONS partitions
+ *      by key hash; each partition gets an order-independent digest
+ *   3. Only partitions whose digests differ are compared row by row, spread
+ *      over RECONCILE_WORKERS worker threads
+ *
+ * Reports missing (source only), extra (target only) and field-level
+ * mismatches, plus amount totals per customer, in reconciliation-report.json.
+ * Invoices of customers missing from customer-mapping.json are skipped, as
+ * in 3-import-invoices.
+ *
+ * Env: INVOICE_PREFIX (ZB-), PARTITIONS (64), RECONCILE_WORKERS (4)
+ */
+
+import { createHash } from 'crypto';
+import fs from 'fs';
+import csv from 'csv-parser';
+import { Worker, isMainThread, parentPort } from 'worker_threads';
+import { fileURLToPath } from 'url';
+import { supabase, log, writeJSON, CSV_PATHS, validateEnv, fetchAllRows } from './utils.mjs';
+
+const INVOICE_PREFIX = process.env.INVOICE_PREFIX || 'ZB-';
+const PARTITIONS = parseInt(process.env.PARTITIONS || '64', 10);
+const WORKERS = parseInt(process.env.RECONCILE_WORKERS || '4', 10);
+const SAMPLE_SIZE = 25;
+
+// Fields compared per entity, in canonical order
+const ENTITY_FIELDS = {
+  invoices: ['customer_id', 'amount', 'issued_at', 'due_at', 'zoho_status'],
+  payments: ['customer_id', 'invoice_number', 'payment_date', 'amount']
+};
+
+const sha1 = (value) => createHash('sha1').update(value).digest('hex');
+const money = (value) => (Math.round(parseFloat(value || 0) * 100) / 100).toFixed(2);
+const day = (value) => value ? String(value).slice(0, 10) : null;
+
+/**
+ * Compare one partition's rows; runs inside a worker thread
+ */
+function comparePartition({ entity, source, target }) {
+  const fields = ENTITY_FIELDS[entity];
+  const targetByKey = new Map(target.map(row => [row.key, row]));
+  const missing = [];
+  const mismatched = [];
+
+  for (const row of source) {
+    const other = targetByKey.get(row.key);
+    if (!other) {
+      missing.push(row);
+      continue;
+    }
+    targetByKey.delete(row.key);
+    if (other.hash === row.hash) continue;
+
+    const diffs = fields
+      .filter(field => row.values[field] !== other.values[field])
+      .map(field => ({ field, source: row.values[field], target: other.values[field] }));
+    mismatched.push({ key: row.key, customer_id: row.values.customer_id, diffs });
+  }
+
+  return { missing, extra: [...targetByKey.values()], mismatched };
+}
+
+if (!isMainThread) {
+  parentPort.on('message', (task) => {
+    parentPort.postMessage({ id: task.id, result: comparePartition(task) });
+  });
+}
+
+/**
+ * Canonical row: { key, values, hash, partition }
+ */
+function canonical(entity, key, values) {
+  const ordered = {};
+  for (const field of ENTITY_FIELDS[entity]) ordered[field] = values[field] ?? null;
+  return {
+    key,
+    values: ordered,
+    hash: sha1(JSON.stringify(ordered)),
+    partition: parseInt(sha1(key).slice(0, 8), 16) % PARTITIONS
+  };
+}
+
+/**
+ * Stream a CSV file row by row
+ */
+async function streamCSV(filePath, onRow) {
+  await new Promise((resolve, reject) => {
+    fs.createReadStream(filePath)
+      .pipe(csv())
+      .on('data', onRow)
+      .on('end', resolve)
+      .on('error', reject);
+  });
+}
+
+/**
+ * Payments have no shared ID across systems: key on invoice + date + occurrence
+ */
+function keyPayments(rows) {
+  const seen = new Map();
+  rows.sort((a, b) => `${a.invoice_number}|${a.payment_date}|${a.amount}`
+    .localeCompare(`${b.invoice_number}|${b.payment_date}|${b.amount}`));
+  return rows.map(row => {
+    const base = `${row.invoice_number}|${row.payment_date}`;
+    const n = (seen.get(base) || 0) + 1;
+    seen.set(base, n);
+    return canonical('payments', `${base}#${n}`, row);
+  });
+}
+
+async function loadSource() {
+  const customerMapping = JSON.parse(fs.readFileSync('customer-mapping.json'));
+  const customerMap = new Map(customerMapping.map(m => [m.zoho_customer_id, m.sailor_customer_id]));
+
+  // Invoice CSV has one row per line item; first row per invoice (as in 3-import-invoices).
+  // Invoices of unmapped customers were skipped by the import and are counted, not compared
+  const invoices = new Map();
+  const unmapped = new Set();
+  await streamCSV(CSV_PATHS.invoices, (row) => {
+    const number = row['Invoice Number'];
+    if (invoices.has(number) || unmapped.has(number)) return;
+    const customerId = customerMap.get(row['Customer ID']);
+    if (!customerId) {
+      unmapped.add(number);
+      return;
+    }
+    invoices.set(number, canonical('invoices', `${INVOICE_PREFIX}${number}`, {
+      customer_id: customerId,
+      amount: money(row['Total']),
+      issued_at: day(row['Invoice Date']),
+      due_at: day(row['Due Date']),
+      zoho_status: row['Invoice Status'] || null
+    }));
+  });
+
+  // Zoho-only payments (same filter as 4-import-payments)
+  const payments = [];
+  await streamCSV(CSV_PATHS.payments, (row) => {
+    const isZohoOnly = row['Mode'] === 'Zoho Payments' ||
+      (row['Mode'] !== 'Stripe' && !row['Reference Number']?.startsWith('ch_'));
+    const invoice = invoices.get(row['Invoice Number']);
+    if (!isZohoOnly || !invoice) return;
+    payments.push({
+      customer_id: invoice.values.customer_id,
+      invoice_number: `${INVOICE_PREFIX}${row['Invoice Number']}`,
+      payment_date: day(row['Date']),
+      amount: money(row['Amount'])
+    });
+  });
+
+  return {
+    invoices: [...invoices.values()],
+    payments: keyPayments(payments),
+    unmappedInvoices: unmapped.size
+  };
+}
+
+async function loadTarget() {
+  const invoiceRows = await fetchAllRows('migrated invoices', () => supabase
+    .from('invoices')
+    .select('id, invoice_number, customer_id, amount, issued_at, due_at, service_details')
+    .like('invoice_number', `${INVOICE_PREFIX}%`));
+
+  const invoiceNumbers = new Map(invoiceRows.map(inv => [inv.id, inv.invoice_number]));
+
+  const invoices = invoiceRows.map(inv => canonical('invoices', inv.invoice_number, {
+    customer_id: inv.customer_id,
+    amount: money(inv.amount),
+    issued_at: day(inv.issued_at),
+    due_at: day(inv.due_at),
+    zoho_status: inv.service_details?.zoho_status || null
+  }));
+
+  // Zoho payments were inserted without Stripe IDs
+  const paymentRows = await fetchAllRows('Zoho payments', () => supabase
+    .from('payments')
+    .select('id, invoice_id, customer_id, amount, payment_date')
+    .not('invoice_id', 'is', null)
+    .is('stripe_charge_id', null)
+    .is('stripe_payment_intent_id', null));
+
+  const payments = keyPayments(paymentRows
+    .filter(p => invoiceNumbers.has(p.invoice_id))
+    .map(p => ({
+      customer_id: p.customer_id,
+      invoice_number: invoiceNumbers.get(p.invoice_id),
+      payment_date: day(p.payment_date),
+      amount: money(p.amount)
+    })));
+
+  return { invoices, payments };
+}
+
+/**
+ * Group rows by partition with an order-independent digest per partition
+ */
+function partition(rows) {
+  const partitions = Array.from({ length: PARTITIONS }, () => ({ rows: [], digest: 0n }));
+  for (const row of rows) {
+    const p = partitions[row.partition];
+    p.rows.push(row);
+    p.digest = (p.digest + BigInt(`0x${sha1(row.key + row.hash).slice(0, 15)}`)) & ((1n << 64n) - 1n);
+  }
+  return partitions;
+}
+
+/**
+ * Compare differing partitions on a pool of worker threads
+ */
+async function compareInWorkers(tasks) {
+  if (tasks.length === 0) return [];
+
+  const workers = Array.from({ length: Math.min(WORKERS, tasks.length) },
+    () => new Worker(fileURLToPath(import.meta.url)));
+  const results = new Array(tasks.length);
+  let next = 0;
+
+  try {
+    await Promise.all(workers.map(worker => new Promise((resolve, reject) => {
+      const dispatch = () => {
+        if (next >= tasks.length) return resolve();
+        const id = next++;
+        worker.postMessage({ id, ...tasks[id] });
+      };
+      worker.on('message', ({ id, result }) => {
+        results[id] = result;
+        dispatch();
+      });
+      worker.on('error', reject);
+      dispatch();
+    })));
+  } finally {
+    await Promise.all(workers.map(worker => worker.terminate()));
+  }
+
+  return results;
+}
+
+function customerTotals(source, target) {
+  const totals = new Map();
+  const add = (row, side) => {
+    const id = row.values.customer_id || 'unmapped';
+    if (!totals.has(id)) totals.set(id, { customer_id: id, source: 0, target: 0 });
+    totals.get(id)[side] += parseFloat(row.values.amount);
+  };
+  source.forEach(row => add(row, 'source'));
+  target.forEach(row => add(row, 'target'));
+
+  return [...totals.values()]
+    .map(t => ({ ...t, source: money(t.source), target: money(t.target), delta: money(t.target - t.source) }))
+    .filter(t => t.delta !== '0.00')
+    .sort((a, b) => Math.abs(b.delta) - Math.abs(a.delta));
+}
+
+async function reconcileEntity(entity, source, target) {
+  const sourcePartitions = partition(source);
+  const targetPartitions = partition(target);
+
+  const tasks = [];
+  for (let p = 0; p < PARTITIONS; p++) {
+    if (sourcePartitions[p].digest !== targetPartitions[p].digest) {
+      tasks.push({ entity, source: sourcePartitions[p].rows, target: targetPartitions[p].rows });
+    }
+  }
+
+  const results = await compareInWorkers(tasks);
+  const missing = results.flatMap(r => r.missing);
+  const extra = results.flatMap(r => r.extra);
+  const mismatched = results.flatMap(r => r.mismatched);
+
+  const fieldCounts = {};
+  mismatched.forEach(m => m.diffs.forEach(d => {
+    fieldCounts[d.field] = (fieldCounts[d.field] || 0) + 1;
+  }));
+
+  return {
+    sourceRows: source.length,
+    targetRows: target.length,
+    partitionsCompared: tasks.length,
+    partitionsMatched: PARTITIONS - tasks.length,
+    missing: missing.length,
+    extra: extra.length,
+    mismatched: mismatched.length,
+    mismatchedFields: fieldCounts,
+    customerTotals: customerTotals(source, target),
+    samples: {
+      missing: missing.slice(0, SAMPLE_SIZE).map(r => ({ key: r.key, ...r.values })),
+      extra: extra.slice(0, SAMPLE_SIZE).map(r => ({ key: r.key, ...r.values })),
+      mismatched: mismatched.slice(0, SAMPLE_SIZE)
+    }
+  };
+}
+
+async function reconcile() {
+  validateEnv();
+  const started = Date.now();
+
+  log('INFO', 'Starting reconciliation', { partitions: PARTITIONS, workers: WORKERS });
+
+  if (!fs.existsSync('customer-mapping.json')) {
+    log('ERROR', 'customer-mapping.json not found. Run step 2 first.');
+    process.exit(1);
+  }
+
+  const [source, target] = await Promise.all([loadSource(), loadTarget()]);
+
+  const report = {
+    timestamp: new Date().toISOString(),
+    partitions: PARTITIONS,
+    unmappedSourceInvoices: source.unmappedInvoices,
+    entities: {}
+  };
+
+  for (const entity of Object.keys(ENTITY_FIELDS)) {
+    report.entities[entity] = await reconcileEntity(entity, source[entity], target[entity]);
+  }
+
+  report.durationMs = Date.now() - started;
+  report.overallStatus = Object.values(report.entities)
+    .every(e => e.missing === 0 && e.extra === 0 && e.mismatched === 0) ? 'PASS' : 'FAIL';
+
+  writeJSON('reconciliation-report.json', report);
+
+  console.log('\n🧮 RECONCILIATION RESULTS\n');
+  console.log('Overall Status:', report.overallStatus);
+  console.log('Source invoices skipped (customer not mapped):', report.unmappedSourceInvoices);
+
+  for (const [entity, r] of Object.entries(report.entities)) {
+    const icon = r.missing + r.extra + r.mismatched === 0 ? '✅' : '❌';
+    console.log(`\n${icon} ${entity}: ${r.sourceRows} source / ${r.targetRows} target`);
+    console.log(`   Partitions compared: ${r.partitionsCompared} of ${PARTITIONS}`);
+    console.log(`   Missing in target: ${r.missing}, Extra in target: ${r.extra}, Mismatched: ${r.mismatched}`);
+    if (r.mismatched > 0) console.log(`   Mismatched fields: ${JSON.stringify(r.mismatchedFields)}`);
+    if (r.customerTotals.length > 0) console.log(`   Customers with amount differences: ${r.customerTotals.length}`);
+  }
+
+  console.log(`\nDetailed results saved to reconciliation-report.json (${report.durationMs}ms)\n`);
+
+  if (report.overallStatus !== 'PASS') {
+    process.exitCode = 1;
+  }
+}
+
+if (isMainThread) {
+  reconcile().catch(err => {
+    log('ERROR', 'Reconciliation failed', { error: err.message });
+    process.exit(1);
+  });
+}
@@ -18,6 +18,7 @@ Usage:
   npm run manual-link -- <service_log_id> --link <invoice_id> # Link to invoice
   npm run manual-link -- list-recent                          # List recent unlinked
   npm run manual-link -- list-no-zoho                         # List customers with no Zoho invoices
+  npm run manual-link -- list-ambiguous                       # List ambiguous matches from 5c
 
 Examples:
   npm run manual-link -- af9219ef-2173-4722-b0fb-69f2c3f6ea96
@@ -63,6 +64,30 @@ if (command === 'list-recent') {
   process.exit(0);
 }
 
+// List ambiguous matches written by 5c-index-link-service-logs.mjs
+if (command === 'list-ambiguous') {
+  let ambiguous;
+  try {
+    ambiguous = JSON.parse(readFileSync('ambiguous-service-log-matches.json', 'utf8'));
+  } catch (error) {
+    console.error('❌ No ambiguous-service-log-matches.json - run: npm run index-link-service-logs');
+    process.exit(1);
+  }
+
+  console.log(`\n⚖️  Ambiguous Service Log Matches (${ambiguous.length})\n`);
+
+  ambiguous.forEach(match => {
+    console.log(`Service log: ${match.service_log_id} (${match.service_date})`);
+    match.candidates.forEach(c => {
+      console.log(`  ${c.invoice_number} - ${c.issued_at.split('T')[0]} - $${c.amount} - ${c.days_diff} days`);
+      console.log(`    ${c.link_command}`);
+    });
+    console.log('---');
+  });
+
+  process.exit(0);
+}
+
 // List customers with no Zoho invoices
 if (command === 'list-no-zoho') {
   const { data, error } = await supabase.rpc('get_customers_no_zoho_invoices');
@@ -76,6 +76,31 @@ export async function processBatch(items, batchSize, processor) {
   return results;
 }
 
+// Fetch every row of a query with keyset pagination on id
+// buildQuery must return a fresh query builder on each call
+export async function fetchAllRows(label, buildQuery, pageSize = 1000) {
+  const rows = [];
+  let lastId = null;
+
+  while (true) {
+    let query = buildQuery().order('id').limit(pageSize);
+    if (lastId) query = query.gt('id', lastId);
+
+    const { data, error } = await query;
+    if (error) {
+      log('ERROR', `Failed to fetch ${label}`, { error: error.message });
+      process.exit(1);
+    }
+
+    rows.push(...data);
+    if (data.length < pageSize) break;
+    lastId = data[data.length - 1].id;
+  }
+
+  log('INFO', `Loaded ${label}`, { count: rows.length });
+  return rows;
+}
+
 // Validate environment
 export function validateEnv() {
   const required = ['SUPABASE_URL', 'SUPABASE_SERVICE_KEY'];
@@ -0,0 +1,34 @@
+import { supabase } from './supabase-client.js';
+
+// Last snapshot returned by get_cleaning_frequency_matrix (see migration 033)
+let cachedMatrix = null;
+
+/**
+ * Get the cleaning frequency surcharge matrix
+ * Sends the cached version so an unchanged matrix costs no payload
+ */
+export async function getCleaningFrequencyMatrix({ refresh = false } = {}) {
+  const knownVersion = refresh ? null : cachedMatrix?.version ?? null;
+
+  const { data, error } = await supabase
+    .rpc('get_cleaning_frequency_matrix', { p_known_version: knownVersion });
+
+  if (error) throw error;
+
+  if (!data?.unchanged) {
+    cachedMatrix = data;
+  }
+
+  return cachedMatrix;
+}
+
+/**
+ * Look up a single surcharge percentage from a matrix snapshot
+ */
+export function getSurchargePercentage(matrix, intervalKey, paintCondition) {
+  const entry = matrix?.surcharges?.find(s =>
+    s.interval_key === intervalKey && s.paint_condition === paintCondition
+  );
+
+  return entry ? parseFloat(entry.surcharge_percentage) : null;
+}
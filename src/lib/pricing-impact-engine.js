@@ -0,0 +1,177 @@
+/**
+ * Pricing what-if engine
+ *
+ * Loads service log history once into typed-array columns and evaluates any
+ * number of proposed business_pricing_config scenarios against it in a single
+ * pass per scenario. This module is the pricing rule for what-if analysis:
+ * length × the recurring or one-time rate, times (1 + surcharge) for heavy
+ * growth and for catamarans, never below minimum_service_charge. Missing
+ * config values fall back to DEFAULT_PRICING.
+ */
+
+const DEFAULT_PRICING = {
+  recurring_cleaning_rate: 4.50,
+  onetime_cleaning_rate: 4.50,
+  surcharge_heavy_growth: 0.50,
+  surcharge_catamaran: 0.25,
+  minimum_service_charge: 150,
+};
+
+/**
+ * Dictionary-encode a string column, returning codes and the dictionary
+ */
+function encodeColumn(values, fallback) {
+  const dictionary = [];
+  const lookup = new Map();
+  const codes = new Uint16Array(values.length);
+
+  for (let i = 0; i < values.length; i++) {
+    const value = values[i] || fallback;
+    let code = lookup.get(value);
+    if (code === undefined) {
+      code = dictionary.length;
+      dictionary.push(value);
+      lookup.set(value, code);
+    }
+    codes[i] = code;
+  }
+
+  return { codes, dictionary };
+}
+
+/**
+ * Build columnar form of service logs
+ * (id, boat_length, service_type, growth_level, hull_type, total_amount)
+ */
+export function buildServiceColumns(services) {
+  const count = services.length;
+  const length = new Float64Array(count);
+  const amount = new Float64Array(count);
+
+  for (let i = 0; i < count; i++) {
+    length[i] = parseFloat(services[i].boat_length) || 0;
+    amount[i] = parseFloat(services[i].total_amount) || 0;
+  }
+
+  const serviceType = encodeColumn(services.map(s => s.service_type), 'recurring_cleaning');
+  const growthLevel = encodeColumn(services.map(s => s.growth_level), 'clean');
+  const hullType = encodeColumn(services.map(s => s.hull_type), 'sailboat');
+
+  // Combined (service_type, growth_level, hull_type) code - every row in a
+  // combination shares the same price factor under a given scenario
+  const growthCount = growthLevel.dictionary.length;
+  const hullCount = hullType.dictionary.length;
+  const combo = new Uint32Array(count);
+  for (let i = 0; i < count; i++) {
+    combo[i] = (serviceType.codes[i] * growthCount + growthLevel.codes[i]) * hullCount + hullType.codes[i];
+  }
+
+  return {
+    count,
+    ids: services.map(s => s.id),
+    length,
+    amount,
+    serviceType,
+    growthLevel,
+    hullType,
+    combo,
+  };
+}
+
+/**
+ * Read a pricing value from either a plain number or a getPricingConfig() entry
+ */
+function pricingValue(pricing, key) {
+  const entry = pricing[key];
+  const value = entry !== null && typeof entry === 'object' ? entry.value : entry;
+  return Number.isFinite(value) ? value : DEFAULT_PRICING[key];
+}
+
+/**
+ * Price factor per combined code for a single scenario
+ */
+function buildFactorTable(columns, pricing) {
+  const { serviceType, growthLevel, hullType } = columns;
+  const growthCount = growthLevel.dictionary.length;
+  const hullCount = hullType.dictionary.length;
+  const factors = new Float64Array(serviceType.dictionary.length * growthCount * hullCount);
+
+  const recurringRate = pricingValue(pricing, 'recurring_cleaning_rate');
+  const oneTimeRate = pricingValue(pricing, 'onetime_cleaning_rate');
+  const heavyGrowth = 1 + pricingValue(pricing, 'surcharge_heavy_growth');
+  const catamaran = 1 + pricingValue(pricing, 'surcharge_catamaran');
+
+  serviceType.dictionary.forEach((type, s) => {
+    const rate = type === 'one_time' ? oneTimeRate : recurringRate;
+    growthLevel.dictionary.forEach((growth, g) => {
+      const growthFactor = growth === 'heavy' ? heavyGrowth : 1;
+      hullType.dictionary.forEach((hull, h) => {
+        const hullFactor = hull === 'catamaran' ? catamaran : 1;
+        factors[(s * growthCount + g) * hullCount + h] = rate * growthFactor * hullFactor;
+      });
+    });
+  });
+
+  return factors;
+}
+
+/**
+ * Evaluate one or more pricing scenarios against the loaded columns
+ *
+ * Each scenario is a full pricing object (config_key → value). Returns, per
+ * scenario, total current/projected revenue and deltas broken down by
+ * service type and growth level.
+ */
+export function evaluatePricingScenarios(columns, scenarios) {
+  const { count, length, amount, combo, serviceType, growthLevel, hullType } = columns;
+  const growthCount = growthLevel.dictionary.length;
+  const hullCount = hullType.dictionary.length;
+  const bucketCount = serviceType.dictionary.length * growthCount;
+
+  return scenarios.map(pricing => {
+    const factors = buildFactorTable(columns, pricing);
+    const minimum = pricingValue(pricing, 'minimum_service_charge');
+    const prices = new Float64Array(count);
+    const bucketCurrent = new Float64Array(bucketCount);
+    const bucketProjected = new Float64Array(bucketCount);
+    const bucketServices = new Uint32Array(bucketCount);
+
+    let currentRevenue = 0;
+    let projectedRevenue = 0;
+
+    for (let i = 0; i < count; i++) {
+      let price = length[i] * factors[combo[i]];
+      if (price < minimum) price = minimum;
+      prices[i] = price;
+
+      const bucket = (combo[i] / hullCount) | 0;
+      bucketCurrent[bucket] += amount[i];
+      bucketProjected[bucket] += price;
+      bucketServices[bucket]++;
+      currentRevenue += amount[i];
+      projectedRevenue += price;
+    }
+
+    const breakdown = [];
+    for (let b = 0; b < bucketCount; b++) {
+      if (bucketServices[b] === 0) continue;
+      breakdown.push({
+        serviceType: serviceType.dictionary[Math.floor(b / growthCount)],
+        growthLevel: growthLevel.dictionary[b % growthCount],
+        services: bucketServices[b],
+        currentRevenue: bucketCurrent[b],
+        projectedRevenue: bucketProjected[b],
+        delta: bucketProjected[b] - bucketCurrent[b],
+      });
+    }
+
+    return {
+      servicesAnalyzed: count,
+      currentRevenue,
+      projectedRevenue,
+      delta: projectedRevenue - currentRevenue,
+      breakdown,
+      prices,
+    };
+  });
+}
@@ -1,4 +1,5 @@
 import { supabase } from './supabase-client.js';
+import { buildServiceColumns, evaluatePricingScenarios } from './pricing-impact-engine.js';
 
 /**
  * Get all pricing configuration
@@ -65,78 +66,92 @@ export async function updatePricingConfig(configKey, newValue, userId, reason =
   return data;
 }
 
+const SERVICE_LOG_PAGE_SIZE = 1000;
+
+// Columnar service history, keyed by lookback window
+const serviceColumnsCache = new Map();
+
+/**
+ * Load service logs for the lookback window into columnar form (cached)
+ */
+async function loadServiceColumns(days = 30, { refresh = false } = {}) {
+  if (!refresh && serviceColumnsCache.has(days)) {
+    return serviceColumnsCache.get(days);
+  }
+
+  const since = new Date();
+  since.setDate(since.getDate() - days);
+
+  const services = [];
+  for (let offset = 0; ; offset += SERVICE_LOG_PAGE_SIZE) {
+    const { data, error } = await supabase
+      .from('service_logs')
+      .select('id, boat_length, service_type, growth_level, hull_type, total_amount')
+      .gte('completed_at', since.toISOString())
+      .order('id')
+      .range(offset, offset + SERVICE_LOG_PAGE_SIZE - 1);
+
+    if (error) throw error;
+    services.push(...data);
+    if (data.length < SERVICE_LOG_PAGE_SIZE) break;
+  }
+
+  const columns = buildServiceColumns(services);
+  columns.services = services;
+  serviceColumnsCache.set(days, columns);
+  return columns;
+}
+
 /**
  * Calculate pricing impact based on recent services
  */
 export async function calculatePricingImpact(changes) {
-  // Fetch recent service logs (last 30 days)
-  const thirtyDaysAgo = new Date();
-  thirtyDaysAgo.setDate(thirtyDaysAgo.getDate() - 30);
-
-  const { data: services } = await supabase
-    .from('service_logs')
-    .select('id, boat_length, service_type, growth_level, hull_type, total_amount')
-    .gte('completed_at', thirtyDaysAgo.toISOString());
+  // Recent service logs (last 30 days)
+  const columns = await loadServiceColumns(30, { refresh: true });
 
-  if (!services || services.length === 0) {
+  if (columns.count === 0) {
     return {
       servicesAnalyzed: 0,
       averageIncrease: 0,
       projectedMonthlyImpact: 0,
       samples: [],
+      breakdown: [],
     };
   }
 
-  // Calculate impact for each service
-  let totalIncrease = 0;
-  const samples = services.slice(0, 5).map(service => {
-    const currentPrice = parseFloat(service.total_amount) || 0;
-    const newPrice = calculateServicePrice(service, changes);
-    const increase = newPrice - currentPrice;
-    totalIncrease += increase;
+  const [result] = evaluatePricingScenarios(columns, [changes]);
+
+  const samples = columns.services.slice(0, 5).map((service, i) => {
+    const currentPrice = columns.amount[i];
+    const newPrice = result.prices[i];
 
     return {
       description: `${service.boat_length}ft ${service.hull_type || 'sailboat'}, ${service.growth_level || 'clean'}`,
       currentPrice: currentPrice.toFixed(2),
       newPrice: newPrice.toFixed(2),
-      change: increase.toFixed(2),
+      change: (newPrice - currentPrice).toFixed(2),
     };
   });
 
-  const averageIncrease = totalIncrease / services.length;
-  const projectedMonthlyImpact = averageIncrease * services.length;
+  const averageIncrease = result.delta / result.servicesAnalyzed;
 
   return {
-    servicesAnalyzed: services.length,
+    servicesAnalyzed: result.servicesAnalyzed,
     averageIncrease: averageIncrease.toFixed(2),
-    projectedMonthlyImpact: projectedMonthlyImpact.toFixed(2),
+    projectedMonthlyImpact: result.delta.toFixed(2),
     samples,
+    breakdown: result.breakdown,
   };
 }
 
 /**
- * Calculate service price with new pricing
- * (Simplified version - real implementation should match Estimator logic)
+ * Evaluate many proposed pricing configurations against service history
+ * Returns revenue deltas per scenario, by service type and growth level
  */
-function calculateServicePrice(service, newPricing) {
-  const length = parseFloat(service.boat_length) || 0;
-  const serviceType = service.service_type || 'recurring_cleaning';
-
-  // Get base rate
-  const rateKey = serviceType === 'one_time' ? 'onetime_cleaning_rate' : 'recurring_cleaning_rate';
-  const baseRate = newPricing[rateKey] || 4.50;
-
-  let price = length * baseRate;
-
-  // Apply surcharges
-  if (service.growth_level === 'heavy') {
-    price *= (1 + (newPricing.surcharge_heavy_growth || 0.50));
-  }
-  if (service.hull_type === 'catamaran') {
-    price *= (1 + (newPricing.surcharge_catamaran || 0.25));
-  }
+export async function calculatePricingScenarios(scenarios, { days = 30, refresh = false } = {}) {
+  const columns = await loadServiceColumns(days, { refresh });
 
-  return Math.max(price, newPricing.minimum_service_charge || 150);
+  return evaluatePricingScenarios(columns, scenarios).map(({ prices, ...result }) => result);
 }
 
 /**
@@ -45,122 +45,42 @@ serve(async (req) => {
       errors: []
     }
 
+    // Both steps are single set-based RPCs (migration 042) with open-ended
+    // windows, so a missed daily run is caught up on the next one
+
     // ========================================================================
-    // Step 1: Alert for boats at 25 days (expiring in 5 days)
+    // Step 1: Alert for boats at 25+ days (expiring in 5 days or fewer)
     // ========================================================================
-    const alertDate = new Date()
-    alertDate.setDate(alertDate.getDate() - 25)
-
-    const { data: boatsToAlert, error: alertError } = await supabase
-      .from('boats')
-      .select('id, boat_name, name, customer_name, last_service')
-      .eq('plan_status', 'one_time_active')
-      .eq('is_active', true)
-      .lte('last_service', alertDate.toISOString().split('T')[0])
-      .gte('last_service', new Date(alertDate.getTime() - 24 * 60 * 60 * 1000).toISOString().split('T')[0]) // Within 24 hours of 25 days
+    const { data: alertedBoats, error: alertError } = await supabase
+      .rpc('alert_expiring_one_time_boats')
 
     if (alertError) {
-      result.errors.push(`Error querying boats to alert: ${alertError.message}`)
-    } else if (boatsToAlert && boatsToAlert.length > 0) {
-      // Log alerts to history
-      for (const boat of boatsToAlert) {
-        const lastServiceDate = new Date(boat.last_service)
-        const daysSince = Math.floor((Date.now() - lastServiceDate.getTime()) / (1000 * 60 * 60 * 24))
-
-        result.alertedBoats.push({
-          id: boat.id,
-          boat_name: boat.boat_name || boat.name || 'Unknown',
-          customer_name: boat.customer_name || 'Unknown',
-          last_service: boat.last_service,
-          days_since_service: daysSince
-        })
-
-        // Log to boat_status_history
-        await supabase.from('boat_status_history').insert({
-          boat_id: boat.id,
-          old_status: 'one_time_active',
-          new_status: 'one_time_active',
-          old_is_active: true,
-          new_is_active: true,
-          reason: 'Expiration alert - 5 days remaining',
-          notes: `Boat will expire in 5 days. Last service: ${boat.last_service} (${daysSince} days ago)`
-        })
-
-        console.log(`ALERT: Boat ${boat.boat_name} (${boat.customer_name}) expires in 5 days`)
+      result.errors.push(`Error alerting expiring boats: ${alertError.message}`)
+    } else if (alertedBoats && alertedBoats.length > 0) {
+      result.alertedBoats = alertedBoats.map(({ boat_id, ...boat }: any) => ({ id: boat_id, ...boat }))
+
+      for (const boat of result.alertedBoats) {
+        console.log(`ALERT: Boat ${boat.boat_name} (${boat.customer_name}) expires in ${30 - boat.days_since_service} days`)
       }
 
       // TODO: Send email notification to admin
       // This could be integrated with Resend or another email service
-      console.log(`Sent alerts for ${result.alertedBoats.length} boats expiring in 5 days`)
+      console.log(`Sent alerts for ${result.alertedBoats.length} boats expiring within 5 days`)
     }
 
     // ========================================================================
-    // Step 2: Auto-expire boats at 30 days
+    // Step 2: Auto-expire boats at 30+ days
     // ========================================================================
-    const expireDate = new Date()
-    expireDate.setDate(expireDate.getDate() - 30)
-
-    const { data: boatsToExpire, error: expireError } = await supabase
-      .from('boats')
-      .select('id, boat_name, name, customer_name, last_service')
-      .eq('plan_status', 'one_time_active')
-      .eq('is_active', true)
-      .lte('last_service', expireDate.toISOString().split('T')[0])
+    const { data: expiredBoats, error: expireError } = await supabase
+      .rpc('expire_one_time_boats')
 
     if (expireError) {
-      result.errors.push(`Error querying boats to expire: ${expireError.message}`)
-    } else if (boatsToExpire && boatsToExpire.length > 0) {
-      for (const boat of boatsToExpire) {
-        const lastServiceDate = new Date(boat.last_service)
-        const daysSince = Math.floor((Date.now() - lastServiceDate.getTime()) / (1000 * 60 * 60 * 24))
-
-        // Update boat to expired status
-        const { error: updateError } = await supabase
-          .from('boats')
-          .update({
-            is_active: false,
-            plan_status: 'expired',
-            status_changed_at: new Date().toISOString(),
-            status_change_reason: 'Auto-expired after 30 days from one-time service completion',
-            updated_at: new Date().toISOString()
-          })
-          .eq('id', boat.id)
-
-        if (updateError) {
-          result.errors.push(`Error expiring boat ${boat.id}: ${updateError.message}`)
-          continue
-        }
-
-        // Deactivate service schedules for this boat
-        await supabase
-          .from('service_schedules')
-          .update({
-            is_active: false,
-            updated_at: new Date().toISOString()
-          })
-          .eq('boat_id', boat.id)
-          .eq('is_active', true)
-
-        // Log to boat_status_history
-        await supabase.from('boat_status_history').insert({
-          boat_id: boat.id,
-          old_status: 'one_time_active',
-          new_status: 'expired',
-          old_is_active: true,
-          new_is_active: false,
-          reason: 'Auto-expired after 30 days',
-          notes: `One-time service completed ${daysSince} days ago on ${boat.last_service}. No new orders received.`
-        })
-
-        result.expiredBoats.push({
-          id: boat.id,
-          boat_name: boat.boat_name || boat.name || 'Unknown',
-          customer_name: boat.customer_name || 'Unknown',
-          last_service: boat.last_service,
-          days_since_service: daysSince
-        })
-
-        console.log(`EXPIRED: Boat ${boat.boat_name} (${boat.customer_name}) after ${daysSince} days`)
+      result.errors.push(`Error expiring boats: ${expireError.message}`)
+    } else if (expiredBoats && expiredBoats.length > 0) {
+      result.expiredBoats = expiredBoats.map(({ boat_id, ...boat }: any) => ({ id: boat_id, ...boat }))
+
+      for (const boat of result.expiredBoats) {
+        console.log(`EXPIRED: Boat ${boat.boat_name} (${boat.customer_name}) after ${boat.days_since_service} days`)
       }
 
       // TODO: Send email notification to admin about expired boats
@@ -1,10 +1,214 @@
 // YouTube Playlist Videos Edge Function
 // Fetches videos from a YouTube playlist using YouTube Data API v3
+// Responses are cached per playlistId + maxResults (migration 041):
+//   fresh  -> served from cache
+//   stale  -> served from cache, refreshed in the background by one caller
+//   miss   -> fetched once; concurrent requests for the same key wait for it
 
 import { serve } from "https://deno.land/std@0.168.0/http/server.ts"
+import { createClient } from "https://esm.sh/@supabase/supabase-js@2"
 import { corsHeaders } from "../_shared/cors.ts"
 
 const YOUTUBE_API_KEY = Deno.env.get('YOUTUBE_API_KEY')
+const YOUTUBE_API_BASE = Deno.env.get('YOUTUBE_API_BASE') || 'https://www.googleapis.com/youtube/v3'
+
+const CACHE_TTL_SECONDS = parseInt(Deno.env.get('PLAYLIST_CACHE_TTL_SECONDS') || '900')
+const CACHE_STALE_SECONDS = parseInt(Deno.env.get('PLAYLIST_CACHE_STALE_SECONDS') || '86400')
+const REFRESH_LEASE_SECONDS = 30
+const MEMORY_CACHE_MAX_ENTRIES = 500
+
+const supabase = createClient(
+  Deno.env.get('SUPABASE_URL')!,
+  Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!,
+)
+
+interface Video {
+  id: string
+  title: string
+  description: string
+  thumbnail: string
+  url: string
+  publishedAt: string
+}
+
+interface CacheEntry {
+  videos: Video[]
+  freshUntil: number
+  staleUntil: number
+}
+
+class YouTubeApiError extends Error {
+  constructor(public status: number, public details: unknown) {
+    super('Failed to fetch playlist videos from YouTube API')
+  }
+}
+
+// Per-instance layer in front of youtube_playlist_cache
+const memoryCache = new Map<string, CacheEntry>()
+// Fetches in progress in this instance, shared by concurrent misses
+const inFlight = new Map<string, Promise<CacheEntry>>()
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
+function jsonResponse(body: unknown, status = 200, cacheStatus?: string) {
+  return new Response(JSON.stringify(body), {
+    status,
+    headers: {
+      ...corsHeaders,
+      'Content-Type': 'application/json',
+      ...(cacheStatus ? { 'X-Cache': cacheStatus } : {}),
+    },
+  })
+}
+
+function remember(key: string, entry: CacheEntry) {
+  memoryCache.delete(key)
+  memoryCache.set(key, entry)
+  if (memoryCache.size > MEMORY_CACHE_MAX_ENTRIES) {
+    memoryCache.delete(memoryCache.keys().next().value)
+  }
+}
+
+async function fetchFromYouTube(playlistId: string, maxResults: number): Promise<Video[]> {
+  const youtubeUrl = `${YOUTUBE_API_BASE}/playlistItems?` +
+    `part=snippet&playlistId=${encodeURIComponent(playlistId)}&maxResults=${maxResults}&key=${YOUTUBE_API_KEY}&order=date`
+
+  const response = await fetch(youtubeUrl)
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => null)
+    console.error('YouTube API error:', errorData)
+    throw new YouTubeApiError(response.status, errorData)
+  }
+
+  const data = await response.json()
+
+  // Transform YouTube API response to simpler format
+  return data.items.map((item: any) => ({
+    id: item.snippet.resourceId.videoId,
+    title: item.snippet.title,
+    description: item.snippet.description,
+    thumbnail: item.snippet.thumbnails.medium.url,
+    url: `https://www.youtube.com/watch?v=${item.snippet.resourceId.videoId}`,
+    publishedAt: item.snippet.publishedAt,
+  }))
+}
+
+async function readCache(key: string, playlistId: string, maxResults: number): Promise<CacheEntry | null> {
+  const cached = memoryCache.get(key)
+  if (cached && Date.now() < cached.freshUntil) {
+    return cached
+  }
+
+  const { data, error } = await supabase
+    .from('youtube_playlist_cache')
+    .select('videos, fresh_until, stale_until')
+    .eq('playlist_id', playlistId)
+    .eq('max_results', maxResults)
+    .not('fetched_at', 'is', null)
+    .maybeSingle()
+
+  if (error) {
+    console.warn('Playlist cache read failed:', error.message)
+    return cached ?? null
+  }
+  if (!data) {
+    return cached ?? null
+  }
+
+  const entry = {
+    videos: data.videos,
+    freshUntil: Date.parse(data.fresh_until),
+    staleUntil: Date.parse(data.stale_until),
+  }
+  remember(key, entry)
+  return entry
+}
+
+// True if this caller should fetch from YouTube; false if another instance is already on it
+async function claimRefresh(playlistId: string, maxResults: number): Promise<boolean> {
+  const { data, error } = await supabase.rpc('claim_playlist_cache_refresh', {
+    p_playlist_id: playlistId,
+    p_max_results: maxResults,
+    p_lease_seconds: REFRESH_LEASE_SECONDS,
+  })
+  if (error) {
+    console.warn('Playlist cache lease failed:', error.message)
+    return true
+  }
+  return data === true
+}
+
+// Fetch and store one key; concurrent calls in this instance share the fetch
+function refresh(key: string, playlistId: string, maxResults: number): Promise<CacheEntry> {
+  const pending = inFlight.get(key)
+  if (pending) {
+    return pending
+  }
+
+  const request = (async () => {
+    const videos = await fetchFromYouTube(playlistId, maxResults)
+    const now = Date.now()
+    const entry = {
+      videos,
+      freshUntil: now + CACHE_TTL_SECONDS * 1000,
+      staleUntil: now + (CACHE_TTL_SECONDS + CACHE_STALE_SECONDS) * 1000,
+    }
+    remember(key, entry)
+
+    const { error } = await supabase
+      .from('youtube_playlist_cache')
+      .upsert({
+        playlist_id: playlistId,
+        max_results: maxResults,
+        videos,
+        fetched_at: new Date(now).toISOString(),
+        fresh_until: new Date(entry.freshUntil).toISOString(),
+        stale_until: new Date(entry.staleUntil).toISOString(),
+        refresh_lease_until: null,
+      })
+    if (error) {
+      console.warn('Playlist cache write failed:', error.message)
+    }
+    return entry
+  })().finally(() => inFlight.delete(key))
+
+  inFlight.set(key, request)
+  return request
+}
+
+// Cold miss: one instance fetches, the others poll the table briefly for its result
+async function loadMiss(key: string, playlistId: string, maxResults: number): Promise<[CacheEntry, string]> {
+  if (inFlight.has(key)) {
+    return [await inFlight.get(key)!, 'COALESCED']
+  }
+
+  if (!(await claimRefresh(playlistId, maxResults))) {
+    for (let attempt = 0; attempt < 10; attempt++) {
+      await sleep(200)
+      const entry = await readCache(key, playlistId, maxResults)
+      if (entry && Date.now() < entry.staleUntil) {
+        return [entry, 'COALESCED']
+      }
+    }
+  }
+
+  return [await refresh(key, playlistId, maxResults), 'MISS']
+}
+
+function revalidateInBackground(key: string, playlistId: string, maxResults: number) {
+  if (inFlight.has(key)) {
+    return
+  }
+  const task = (async () => {
+    if (await claimRefresh(playlistId, maxResults)) {
+      await refresh(key, playlistId, maxResults)
+    }
+  })().catch((error) => console.error('Playlist revalidation failed:', error.message))
+
+  // @ts-ignore EdgeRuntime is provided by the Supabase edge runtime
+  globalThis.EdgeRuntime?.waitUntil?.(task)
+}
 
 serve(async (req) => {
   // Handle CORS preflight requests
@@ -15,79 +219,40 @@ serve(async (req) => {
   try {
     // Check if API key is configured
     if (!YOUTUBE_API_KEY) {
-      return new Response(
-        JSON.stringify({
-          error: 'YouTube API key not configured. Please add YOUTUBE_API_KEY to Supabase Edge Function secrets.'
-        }),
-        {
-          status: 500,
-          headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-        },
-      )
+      return jsonResponse({
+        error: 'YouTube API key not configured. Please add YOUTUBE_API_KEY to Supabase Edge Function secrets.'
+      }, 500)
     }
 
     // Get playlist ID from query parameters
     const url = new URL(req.url)
     const playlistId = url.searchParams.get('playlistId')
-    const maxResults = parseInt(url.searchParams.get('maxResults') || '4')
+    const maxResults = Math.min(Math.max(parseInt(url.searchParams.get('maxResults') || '4') || 4, 1), 50)
 
     if (!playlistId) {
-      return new Response(
-        JSON.stringify({ error: 'playlistId parameter is required' }),
-        {
-          status: 400,
-          headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-        },
-      )
+      return jsonResponse({ error: 'playlistId parameter is required' }, 400)
+    }
+
+    const key = `${playlistId}:${maxResults}`
+    const cached = await readCache(key, playlistId, maxResults)
+    const now = Date.now()
+
+    if (cached && now < cached.freshUntil) {
+      return jsonResponse({ videos: cached.videos }, 200, 'HIT')
     }
 
-    // Fetch playlist items from YouTube API
-    const youtubeUrl = `https://www.googleapis.com/youtube/v3/playlistItems?` +
-      `part=snippet&playlistId=${playlistId}&maxResults=${maxResults}&key=${YOUTUBE_API_KEY}&order=date`
-
-    const response = await fetch(youtubeUrl)
-
-    if (!response.ok) {
-      const errorData = await response.json()
-      console.error('YouTube API error:', errorData)
-      return new Response(
-        JSON.stringify({
-          error: 'Failed to fetch playlist videos from YouTube API',
-          details: errorData
-        }),
-        {
-          status: response.status,
-          headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-        },
-      )
+    if (cached && now < cached.staleUntil) {
+      revalidateInBackground(key, playlistId, maxResults)
+      return jsonResponse({ videos: cached.videos }, 200, 'STALE')
     }
 
-    const data = await response.json()
-
-    // Transform YouTube API response to simpler format
-    const videos = data.items.map((item: any) => ({
-      id: item.snippet.resourceId.videoId,
-      title: item.snippet.title,
-      description: item.snippet.description,
-      thumbnail: item.snippet.thumbnails.medium.url,
-      url: `https://www.youtube.com/watch?v=${item.snippet.resourceId.videoId}`,
-      publishedAt: item.snippet.publishedAt,
-    }))
-
-    return new Response(
-      JSON.stringify({ videos }),
-      {
-        headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-      },
-    )
+    const [entry, cacheStatus] = await loadMiss(key, playlistId, maxResults)
+    return jsonResponse({ videos: entry.videos }, 200, cacheStatus)
   } catch (error) {
+    if (error instanceof YouTubeApiError) {
+      return jsonResponse({ error: error.message, details: error.details }, error.status)
+    }
     console.error('Error in get-playlist-videos function:', error)
-    return new Response(
-      JSON.stringify({ error: error.message }),
-      {
-        status: 500,
-        headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-      },
-    )
+    return jsonResponse({ error: error.message }, 500)
   }
 })
@@ -4,97 +4,96 @@ import { createClient } from 'https://esm.sh/@supabase/supabase-js@2';
 const supabaseUrl = Deno.env.get('SUPABASE_URL')!;
 const supabaseServiceKey = Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!;
 
+// 'inline' (default): fold pending events after responding
+// 'cron': leave folding to pg_cron / a worker (migration 040)
+const foldMode = Deno.env.get('RESEND_WEBHOOK_FOLD') ?? 'inline';
+const foldBatchSize = parseInt(Deno.env.get('RESEND_WEBHOOK_FOLD_BATCH') ?? '500', 10);
+
 const supabase = createClient(supabaseUrl, supabaseServiceKey);
 
+// Event timestamp field per type (falls back to the envelope's created_at)
+const OCCURRED_AT_FIELD: Record<string, string> = {
+  'email.opened': 'opened_at',
+  'email.clicked': 'clicked_at',
+  'email.bounced': 'bounced_at',
+  'email.complained': 'complained_at',
+};
+
+function jsonResponse(body: unknown, status: number) {
+  return new Response(JSON.stringify(body), {
+    status,
+    headers: { 'Content-Type': 'application/json' },
+  });
+}
+
+// Svix sends a stable svix-id for every delivery attempt of an event;
+// without it, the payload hash makes exact re-sends idempotent
+async function eventId(req: Request, rawBody: string) {
+  const svixId = req.headers.get('svix-id');
+  if (svixId) return svixId;
+
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(rawBody));
+  return 'sha256:' + Array.from(new Uint8Array(digest))
+    .map(b => b.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+async function foldPendingEvents() {
+  const { data, error } = await supabase.rpc('fold_resend_webhook_events', {
+    p_batch_size: foldBatchSize,
+  });
+  if (error) {
+    console.error('Fold failed:', error.message);
+    return;
+  }
+  const [result] = data ?? [];
+  if (result?.events > 0) {
+    console.log(`Folded ${result.events} events into ${result.emails_updated} email logs`);
+  }
+}
+
 serve(async (req) => {
   try {
-    const event = await req.json();
-
-    console.log('Received Resend webhook:', event);
+    const rawBody = await req.text();
+    const event = JSON.parse(rawBody);
 
-    // Extract event data
     const { type, data } = event;
-    const emailId = data.email_id;
+    const emailId = data?.email_id;
 
-    if (!emailId) {
-      throw new Error('Missing email_id in webhook data');
+    if (!type || !emailId) {
+      return jsonResponse({ success: false, error: 'Missing type or email_id in webhook data' }, 400);
     }
 
-    // Find email_logs record by resend_id
-    const { data: emailLog, error: findError } = await supabase
-      .from('email_logs')
-      .select('*')
-      .eq('resend_id', emailId)
-      .single();
-
-    if (findError || !emailLog) {
-      console.warn(`Email log not found for resend_id: ${emailId}`);
-      return new Response(JSON.stringify({ success: false, error: 'Email log not found' }), {
-        status: 404,
-        headers: { 'Content-Type': 'application/json' },
-      });
+    const occurredAt = data[OCCURRED_AT_FIELD[type]] || event.created_at || new Date().toISOString();
+
+    // Append only - duplicates of an already stored event are ignored
+    const { error: insertError } = await supabase
+      .from('resend_webhook_events')
+      .upsert({
+        event_id: await eventId(req, rawBody),
+        event_type: type,
+        resend_id: emailId,
+        occurred_at: occurredAt,
+        payload: event,
+      }, { onConflict: 'event_id', ignoreDuplicates: true });
+
+    if (insertError) {
+      throw insertError;
     }
 
-    // Update email_logs based on event type
-    const updates: any = {};
-
-    switch (type) {
-      case 'email.opened':
-        if (!emailLog.opened_at) {
-          updates.opened_at = data.opened_at || new Date().toISOString();
-        }
-        break;
-
-      case 'email.clicked':
-        if (!emailLog.first_click_at) {
-          updates.first_click_at = data.clicked_at || new Date().toISOString();
-        }
-        updates.click_count = (emailLog.click_count || 0) + 1;
-        break;
-
-      case 'email.bounced':
-        updates.bounced_at = data.bounced_at || new Date().toISOString();
-        updates.status = 'failed';
-        updates.error_message = data.reason || 'Email bounced';
-        break;
-
-      case 'email.complained':
-        updates.complained_at = data.complained_at || new Date().toISOString();
-        break;
-
-      case 'email.delivered':
-        if (emailLog.status === 'pending') {
-          updates.status = 'sent';
-        }
-        break;
-
-      default:
-        console.log(`Unhandled event type: ${type}`);
-    }
-
-    // Apply updates if any
-    if (Object.keys(updates).length > 0) {
-      const { error: updateError } = await supabase
-        .from('email_logs')
-        .update(updates)
-        .eq('id', emailLog.id);
-
-      if (updateError) {
-        throw updateError;
+    if (foldMode === 'inline') {
+      // @ts-ignore EdgeRuntime is provided by the Supabase edge runtime
+      const runtime = globalThis.EdgeRuntime;
+      if (runtime?.waitUntil) {
+        runtime.waitUntil(foldPendingEvents());
+      } else {
+        await foldPendingEvents();
       }
-
-      console.log(`Updated email log ${emailLog.id} for event ${type}`);
     }
 
-    return new Response(JSON.stringify({ success: true }), {
-      status: 200,
-      headers: { 'Content-Type': 'application/json' },
-    });
+    return jsonResponse({ success: true }, 200);
   } catch (error) {
     console.error('Webhook processing error:', error);
-    return new Response(JSON.stringify({ success: false, error: error.message }), {
-      status: 500,
-      headers: { 'Content-Type': 'application/json' },
-    });
+    return jsonResponse({ success: false, error: error.message }, 500);
   }
 });